@@ -0,0 +1,360 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from cluster_protocol import (BATCH, DEFAULT_PORT, ERROR, HELLO, WELCOME, ProtocolError, decode_batch, decode_json,
+                              encode_ack, encode_json, read_frame)
+from collector import MAX_VFS
+from history_store import HistoryRing
+from sample_format import HEADER_SIZE, read_header, record_dtype
+from sample_store import SampleReader, SampleStore
+
+# Agents connect from other hosts; the read API stays on the loopback
+# interface unless told otherwise
+DEFAULT_HOST = "0.0.0.0"
+API_HOST = "127.0.0.1"
+API_PORT = 9751
+
+# Where the per-node sample stores are kept
+DEFAULT_DIR = "cluster"
+
+# Seconds an API call waits for the aggregator, and an agent to say hello
+CONTROL_TIMEOUT = 10
+HELLO_TIMEOUT = 10
+
+# Node total IOPS samples kept for the cluster trend, and sent per status
+NODE_HISTORY = 3600
+STATUS_HISTORY = 300
+
+# Node names double as file names
+NODE_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]{0,63}")
+
+# Per-VF values of the latest valid record that the status reports
+LATEST_FIELDS = ("ts", "iops", "bw_bytes", "lat_mean_ns", "clat_p99_ns")
+
+
+# Count the whole records of a store file, dropping a torn trailing one
+# left by a crash so later appends stay aligned
+def _whole_records(path):
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return 0
+    if size < HEADER_SIZE:
+        # Not even the header made it, the store starts over
+        os.truncate(path, 0)
+        return 0
+    record_size = read_header(path)[1].itemsize
+    records = (size - HEADER_SIZE) // record_size
+    if size != HEADER_SIZE + records * record_size:
+        os.truncate(path, HEADER_SIZE + records * record_size)
+    return records
+
+
+# What the aggregator holds for one node: its copy of the node's sample
+# store, the connection state and running per-VF aggregates
+class ClusterNode:
+    def __init__(self, name, directory):
+        self.name = name
+        self.path = os.path.join(directory, f"{name}.vfs")
+        self.writer = None
+        self.peer = None
+        self.connected_at = None
+        self.last_seen = None
+        self.batches = 0
+        self.bytes = 0
+        self._open()
+
+    def _open(self):
+        self.records = _whole_records(self.path)
+        self.store = SampleStore(self.path)
+        self.total_iops = np.zeros(0)
+        self.samples = np.zeros(0, dtype=np.int64)
+        self.latest = {field: np.zeros(0) for field in LATEST_FIELDS}
+        self.history = HistoryRing(NODE_HISTORY, 1, metrics=("iops",))
+        # Aggregates survive an aggregator restart by replaying the store
+        if self.records:
+            self._fold(SampleReader(self.path).records()[:self.records])
+
+    @property
+    def connected(self):
+        return self.writer is not None
+
+    def attach(self, writer, peer):
+        self.writer = writer
+        self.peer = f"{peer[0]}:{peer[1]}" if isinstance(peer, tuple) else str(peer)
+        self.connected_at = time.time()
+
+    def detach(self):
+        self.writer = None
+
+    # The agent has fewer records than we do, so its store was recreated:
+    # keep the old copy aside and start over
+    def rotate(self):
+        self.store.close()
+        os.replace(self.path, f"{self.path}.{int(time.time())}")
+        self._open()
+
+    def append(self, records):
+        self.store.append(records)
+        self.records += len(records)
+        self._fold(records)
+
+    # Fold records into the per-VF aggregates, vectorized over the batch
+    def _fold(self, records):
+        records = records[records["vf"] < MAX_VFS]
+        if len(records) == 0:
+            return
+        vf_count = max(len(self.total_iops), int(records["vf"].max()) + 1)
+        grow = vf_count - len(self.total_iops)
+        if grow > 0:
+            self.total_iops = np.concatenate([self.total_iops, np.zeros(grow)])
+            self.samples = np.concatenate([self.samples, np.zeros(grow, dtype=np.int64)])
+            self.latest = {field: np.concatenate([values, np.zeros(grow)]) for field, values in self.latest.items()}
+
+        vf = records["vf"].astype(np.intp)
+        valid = np.flatnonzero(records["iops"] > 0)
+        self.total_iops += np.bincount(vf[valid], weights=records["iops"][valid], minlength=vf_count)
+        self.samples += np.bincount(vf[valid], minlength=vf_count)
+
+        last = np.full(vf_count, -1, dtype=np.intp)
+        np.maximum.at(last, vf[valid], valid)
+        seen = last >= 0
+        for field in LATEST_FIELDS:
+            self.latest[field][seen] = records[field][last[seen]]
+        self.history.append(records["ts"][-1], [[self.latest["iops"].sum()]])
+
+    def status(self):
+        avg_iops = np.divide(self.total_iops, self.samples, out=np.zeros(len(self.samples)),
+                             where=self.samples > 0)
+        ts, history = self.history.series("iops", STATUS_HISTORY)
+        return {
+            "node": self.name,
+            "connected": self.connected,
+            "peer": self.peer,
+            "connected_at": self.connected_at,
+            "last_seen": self.last_seen,
+            "records": self.records,
+            "batches": self.batches,
+            "bytes": self.bytes,
+            "current_iops": float(self.latest["iops"].sum()),
+            "avg_iops": float(avg_iops.sum()),
+            "vfs": [
+                {
+                    "vf": vf,
+                    "current_iops": float(self.latest["iops"][vf]),
+                    "avg_iops": float(avg_iops[vf]),
+                    "bw_bytes": float(self.latest["bw_bytes"][vf]),
+                    "lat_mean_ns": float(self.latest["lat_mean_ns"][vf]),
+                    "clat_p99_ns": float(self.latest["clat_p99_ns"][vf]),
+                    "samples": int(self.samples[vf]),
+                    "updated_at": float(self.latest["ts"][vf]) or None,
+                }
+                for vf in range(len(self.samples))
+            ],
+            "history": {"ts": ts.tolist(), "iops": history[:, 0].tolist()},
+        }
+
+
+# Central collection point for every node's samples.
+#
+# Agents connect over TCP, say hello with their node name and are told how
+# many of their records are already here; then they stream batches that
+# are appended to <dir>/<node>.vfs (the regular sample store format) and
+# acknowledged one by one. Like the runner daemon, the network side runs on
+# its own event loop thread; status() is safe to call from any thread.
+class Aggregator:
+    def __init__(self, directory=DEFAULT_DIR, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.nodes = {}
+        for entry in sorted(os.listdir(directory)):
+            name, ext = os.path.splitext(entry)
+            if ext == ".vfs" and NODE_NAME.fullmatch(name):
+                self.nodes[name] = ClusterNode(name, directory)
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="aggregator", daemon=True)
+        self._thread.start()
+        self._server = self._call(asyncio.start_server(self._handle, host, port))
+        self.address = self._server.sockets[0].getsockname()[:2]
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(CONTROL_TIMEOUT)
+
+    # Cluster-wide view: every node with its VFs, plus totals
+    def status(self):
+        return self._call(self._status())
+
+    async def _status(self):
+        nodes = [node.status() for _, node in sorted(self.nodes.items())]
+        return {
+            "updated_at": time.time(),
+            "nodes": nodes,
+            "totals": {
+                "nodes": len(nodes),
+                "connected": sum(node["connected"] for node in nodes),
+                "vfs": sum(len(node["vfs"]) for node in nodes),
+                # Stale figures of disconnected nodes don't count as current
+                "current_iops": sum(node["current_iops"] for node in nodes if node["connected"]),
+                "avg_iops": sum(node["avg_iops"] for node in nodes),
+            },
+        }
+
+    async def _handle(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        node = None
+        try:
+            kind, payload = await asyncio.wait_for(read_frame(reader), HELLO_TIMEOUT)
+            if kind != HELLO:
+                raise ProtocolError(f"expected a hello, got frame type {kind}")
+            hello = decode_json(payload)
+            name = str(hello.get("node", ""))
+            if not NODE_NAME.fullmatch(name):
+                raise ProtocolError(f"invalid node name {name!r}")
+            # Agents send records in their store's format, converted to ours on append
+            try:
+                dtype = record_dtype(int(hello.get("format_version", 1)))
+            except ValueError as e:
+                raise ProtocolError(str(e))
+            if hello.get("record_size") != dtype.itemsize:
+                raise ProtocolError(f"record size {hello.get('record_size')} != {dtype.itemsize}")
+
+            node = self.nodes.get(name)
+            if node is None:
+                node = self.nodes[name] = ClusterNode(name, self.directory)
+            if node.writer is not None:
+                # The agent reconnected before its old connection timed out
+                node.writer.close()
+            if int(hello.get("records", 0)) < node.records:
+                print(f"♻️ {name}: agent has fewer records than stored, starting a new store")
+                node.rotate()
+            node.attach(writer, peer)
+            print(f"🔗 {name} connected from {node.peer} at record {node.records}")
+            writer.write(encode_json(WELCOME, {"offset": node.records}))
+            await writer.drain()
+
+            while True:
+                kind, payload = await read_frame(reader)
+                if kind != BATCH:
+                    raise ProtocolError(f"expected a batch, got frame type {kind}")
+                offset, records = decode_batch(payload, dtype)
+                if offset > node.records:
+                    raise ProtocolError(f"batch starts at record {offset}, only {node.records} received")
+                # A batch resent after a reconnect may overlap what we have
+                records = records[node.records - offset:]
+                if len(records):
+                    node.append(records)
+                node.batches += 1
+                node.bytes += len(payload)
+                node.last_seen = time.time()
+                writer.write(encode_ack(node.records))
+                await writer.drain()
+        except ProtocolError as e:
+            print(f"⚠️ {node.name if node else peer}: {e}")
+            writer.write(encode_json(ERROR, {"error": str(e)}))
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            if node is not None and node.writer is writer:
+                node.detach()
+                print(f"🔌 {node.name} disconnected")
+            writer.close()
+
+    def shutdown(self):
+        async def close():
+            self._server.close()
+            for node in self.nodes.values():
+                if node.writer is not None:
+                    node.writer.close()
+            await self._server.wait_closed()
+        try:
+            self._call(close())
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+            for node in self.nodes.values():
+                node.store.close()
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    aggregator = None
+
+    def _reply(self, code, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/cluster":
+            self._reply(404, {"error": f"unknown endpoint {self.path}"})
+            return
+        self._reply(200, self.aggregator.status())
+
+    # Keep the terminal quiet, dashboards poll constantly
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(directory=DEFAULT_DIR, host=DEFAULT_HOST, port=DEFAULT_PORT, api_host=API_HOST, api_port=API_PORT):
+    aggregator = Aggregator(directory, host, port)
+    handler = type("Handler", (ApiHandler,), {"aggregator": aggregator})
+    server = ThreadingHTTPServer((api_host, api_port), handler)
+    print(f"🛰️ Aggregator accepting agents on {host}:{port}, cluster API on http://{api_host}:{api_port}/cluster "
+          f"({len(aggregator.nodes)} known nodes)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        aggregator.shutdown()
+
+
+# Client side, used by the dashboard
+
+
+# Cluster status from the aggregator API at "host:port", or None when no
+# aggregator answers
+def cluster_status(address=f"{API_HOST}:{API_PORT}", timeout=CONTROL_TIMEOUT):
+    try:
+        with urllib.request.urlopen(f"http://{address}/cluster", timeout=timeout) as response:
+            return json.load(response)
+    except (urllib.error.URLError, OSError, ValueError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect fio samples from node agents across the cluster")
+    parser.add_argument("command", choices=["serve", "status"])
+    parser.add_argument("--dir", default=DEFAULT_DIR, help="directory for the per-node sample stores")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="address agents connect to")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port agents connect to")
+    parser.add_argument("--api-host", default=API_HOST)
+    parser.add_argument("--api-port", type=int, default=API_PORT)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.dir, args.host, args.port, args.api_host, args.api_port)
+        return
+
+    status = cluster_status(f"{args.api_host}:{args.api_port}")
+    if status is None:
+        sys.exit(f"no aggregator on {args.api_host}:{args.api_port}")
+    print(json.dumps(status, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+import json
+import os
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+import warnings
+from collections import namedtuple
+
+import numpy as np
+
+# Samples per VF the rolling baseline (median and MAD) is taken over, and
+# how many it needs before anything is judged against it
+BASELINE_SAMPLES = 64
+MIN_BASELINE = 16
+
+# CUSUM on the robust z-score of IOPS: slack per sample and alarm level.
+# Noise alone practically never reaches the level across hundreds of VFs;
+# a sustained 3 sigma drop (2 per sample past the slack) trips it in five
+# samples, a collapse at once.
+CUSUM_SLACK = 1.0
+CUSUM_LIMIT = 8.0
+
+# ... and only once IOPS are at least this fraction under the baseline, a
+# very steady VF dipping a few percent is no drop worth an alert
+MIN_DROP = 0.1
+
+# A latency sample this many robust sigmas and this factor above the
+# baseline is a spike; it is over once back under half the score
+SPIKE_Z = 6.0
+SPIKE_FACTOR = 1.5
+
+# MAD floor as a fraction of the median, so a very steady VF doesn't alarm
+# on noise
+MIN_SPREAD = 0.02
+
+# Stuck VF: this many zero-IOPS samples in a row, or no sample for this
+# many typical sample intervals (and at least STALL_SECONDS)
+STUCK_SAMPLES = 3
+STALL_INTERVALS = 5
+STALL_SECONDS = 30.0
+
+# Samples older than this (catching up on a store) warm the baseline but
+# raise no events
+EVENT_MAX_AGE = 60.0
+
+# Seconds a webhook call may take
+WEBHOOK_TIMEOUT = 5
+
+# MAD of a normal distribution is this fraction of its standard deviation
+_MAD_SIGMA = 1.4826
+
+# Kinds of event, also the index of their per-VF state
+EVENT_KINDS = ("throughput_drop", "latency_spike", "stuck")
+
+# One detector finding. kind is one of EVENT_KINDS, or "recovered" when the
+# condition `cleared` is over; value and baseline are in the metric's unit
+# (IOPS, ns, or seconds of silence).
+Event = namedtuple("Event", ["ts", "vf", "kind", "value", "baseline", "message", "cleared"])
+
+
+def event_dict(event):
+    return {**event._asdict(), "vf": int(event.vf), "value": float(event.value), "baseline": float(event.baseline)}
+
+
+# Streaming per-VF anomaly detection over the sample store records.
+#
+# Every VF keeps a ring of its latest BASELINE_SAMPLES IOPS and latency
+# values; each new sample is scored against the median and MAD of that
+# ring (a robust z-score, insensitive to the outliers it is looking for).
+# IOPS feed a one-sided CUSUM, which catches both sudden and slow
+# throughput drops; latency (p99 when the runner records it, else the
+# mean) is checked for spikes directly. Runs of zero-IOPS samples and VFs
+# that stopped reporting while others go on are flagged as stuck.
+#
+# A batch is processed one "layer" at a time, the i-th new sample of
+# every VF together, so the cost per tick is a few vectorized operations
+# over (VFs x BASELINE_SAMPLES) whatever the VF count. An event is raised
+# when a condition starts and a "recovered" event when it ends.
+class AnomalyDetector:
+    def __init__(self, vf_count):
+        self.vf_count = 0
+        self._iops = np.zeros((0, BASELINE_SAMPLES))
+        self._latency = np.zeros((0, BASELINE_SAMPLES))
+        self._filled = np.zeros(0, dtype=np.int64)
+        self._cusum = np.zeros(0)
+        self._zero_run = np.zeros(0, dtype=np.int64)
+        self._active = np.zeros((0, len(EVENT_KINDS)), dtype=bool)
+        self._last_ts = np.zeros(0)
+        self._interval = np.zeros(0)
+        self.resize(vf_count)
+
+    def resize(self, vf_count):
+        grow = vf_count - self.vf_count
+        if grow <= 0:
+            return
+        self._iops = np.concatenate([self._iops, np.full((grow, BASELINE_SAMPLES), np.nan)])
+        self._latency = np.concatenate([self._latency, np.full((grow, BASELINE_SAMPLES), np.nan)])
+        self._filled = np.concatenate([self._filled, np.zeros(grow, dtype=np.int64)])
+        self._cusum = np.concatenate([self._cusum, np.zeros(grow)])
+        self._zero_run = np.concatenate([self._zero_run, np.zeros(grow, dtype=np.int64)])
+        self._active = np.concatenate([self._active, np.zeros((grow, len(EVENT_KINDS)), dtype=bool)])
+        self._last_ts = np.concatenate([self._last_ts, np.zeros(grow)])
+        self._interval = np.concatenate([self._interval, np.zeros(grow)])
+        self.vf_count = vf_count
+
+    # (vf, EVENT_KINDS) flags of the conditions raised and not yet recovered
+    def active(self):
+        return self._active.copy()
+
+    # Score a batch of sample store records; returns the new events
+    def add(self, records, now=None):
+        now = time.time() if now is None else now
+        if len(records) == 0:
+            return []
+        vf = records["vf"].astype(np.intp)
+        ts = records["ts"]
+        order = np.lexsort((ts, vf))
+        vf, ts = vf[order], ts[order]
+        iops = records["iops"][order]
+        p99 = records["clat_p99_ns"][order]
+        latency = np.where(p99 > 0, p99, records["lat_mean_ns"][order])
+
+        # Only the last samples of each VF can still matter for its baseline
+        starts = np.flatnonzero(np.append(True, vf[1:] != vf[:-1]))
+        counts = np.diff(np.append(starts, len(vf)))
+        rank = np.arange(len(vf)) - np.repeat(starts, counts)
+        skip = np.repeat(np.maximum(counts - BASELINE_SAMPLES, 0), counts)
+        layer = rank - skip
+
+        events = []
+        for i in range(int(layer.max()) + 1):
+            rows = np.flatnonzero(layer == i)
+            events += self._score(vf[rows], ts[rows], iops[rows], latency[rows], now)
+        return events
+
+    # Robust (median, sigma) of the rings of some VFs
+    def _baseline(self, ring, vfs):
+        values = ring[vfs]
+        # A VF without samples yet has an all-NaN ring, its baseline is NaN
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            median = np.nanmedian(values, axis=1)
+            mad = np.nanmedian(np.abs(values - median[:, None]), axis=1)
+        return median, np.maximum(mad * _MAD_SIGMA, np.abs(median) * MIN_SPREAD)
+
+    def _score(self, vfs, ts, iops, latency, now):
+        events = []
+        fresh = ts >= now - EVENT_MAX_AGE
+        ready = self._filled[vfs] >= MIN_BASELINE
+
+        # Sample intervals, for telling a silent VF from a slow one
+        seen = self._last_ts[vfs] > 0
+        gap = ts - self._last_ts[vfs]
+        self._interval[vfs] = np.where(seen & (gap > 0),
+                                       np.where(self._interval[vfs] > 0, 0.8 * self._interval[vfs] + 0.2 * gap, gap),
+                                       self._interval[vfs])
+        self._last_ts[vfs] = np.maximum(self._last_ts[vfs], ts)
+
+        iops_median, iops_sigma = self._baseline(self._iops, vfs)
+        latency_median, latency_sigma = self._baseline(self._latency, vfs)
+        with np.errstate(all="ignore"):
+            iops_z = np.where(ready & (iops_sigma > 0), (iops - iops_median) / iops_sigma, 0.0)
+            latency_z = np.where(ready & (latency_sigma > 0), (latency - latency_median) / latency_sigma, 0.0)
+
+        # Throughput drop: one-sided CUSUM, reset once IOPS are back
+        recovered = ~ready | (iops_z > -1.0)
+        self._cusum[vfs] = np.where(recovered, 0.0, np.maximum(0.0, self._cusum[vfs] - iops_z - CUSUM_SLACK))
+        dropped = (self._cusum[vfs] > CUSUM_LIMIT) & (iops < iops_median * (1 - MIN_DROP))
+        events += self._transition(0, vfs, dropped, recovered, ts, fresh, iops, iops_median,
+                                   "IOPS dropped to {value:,.0f} from a baseline of {baseline:,.0f}",
+                                   "IOPS back to {value:,.0f}")
+
+        spike = (latency_z > SPIKE_Z) & (latency > latency_median * SPIKE_FACTOR)
+        calm = latency_z < SPIKE_Z / 2
+        events += self._transition(1, vfs, spike, calm, ts, fresh, latency, latency_median,
+                                   "latency spiked to {value_us:,.0f} µs from a baseline of {baseline_us:,.0f} µs",
+                                   "latency back to {value_us:,.0f} µs")
+
+        self._zero_run[vfs] = np.where(iops > 0, 0, self._zero_run[vfs] + 1)
+        stuck = self._zero_run[vfs] >= STUCK_SAMPLES
+        events += self._transition(2, vfs, stuck, iops > 0, ts, fresh, iops, iops_median,
+                                   f"no I/O completed for {STUCK_SAMPLES} samples in a row",
+                                   "I/O flowing again at {value:,.0f} IOPS")
+
+        # The baseline follows the VF, but zeros of a stuck VF stay out of it
+        slot = self._filled[vfs] % BASELINE_SAMPLES
+        self._iops[vfs, slot] = np.where(iops > 0, iops, self._iops[vfs, slot])
+        self._latency[vfs, slot] = np.where(iops > 0, latency, self._latency[vfs, slot])
+        self._filled[vfs] += iops > 0
+        return events
+
+    # Events of one kind for VFs entering (start) or leaving (end) it. Old
+    # samples raise nothing; a condition still on once fresh ones arrive is
+    # raised then.
+    def _transition(self, kind, vfs, start, end, ts, fresh, value, baseline, message, cleared_message):
+        active = self._active[vfs, kind]
+        start = start & fresh
+        starting = start & ~active
+        ending = end & active & ~start
+        self._active[vfs, kind] = (active | start) & ~ending
+        events = []
+        for i in np.flatnonzero(starting | ending):
+            text = (message if starting[i] else cleared_message).format(
+                value=value[i], baseline=baseline[i], value_us=value[i] / 1000, baseline_us=baseline[i] / 1000)
+            events.append(Event(float(ts[i]), int(vfs[i]), EVENT_KINDS[kind] if starting[i] else "recovered",
+                                float(value[i]), float(np.nan_to_num(baseline[i])), f"VF{vfs[i]}: {text}",
+                                None if starting[i] else EVENT_KINDS[kind]))
+        return events
+
+    # VFs that stopped reporting while the others carry on. When every VF
+    # is silent the runner is stopped or paused, which is no anomaly.
+    def check_stalls(self, now=None):
+        now = time.time() if now is None else now
+        known = np.flatnonzero(self._last_ts > 0)
+        if len(known) == 0:
+            return []
+        silence = now - self._last_ts[known]
+        limit = np.maximum(STALL_SECONDS, STALL_INTERVALS * self._interval[known])
+        silent = silence > limit
+        if silent.all():
+            silent[:] = False
+        active = self._active[known, 2]
+        stalled = silent & ~active & (self._zero_run[known] < STUCK_SAMPLES)
+        self._active[known[stalled], 2] = True
+        return [Event(now, int(vf), "stuck", float(seconds), float(self._interval[vf]),
+                      f"VF{vf}: no sample for {seconds:,.0f} s", None)
+                for vf, seconds in zip(known[stalled], silence[stalled])]
+
+
+# Appends every event as one JSON line
+class JsonlSink:
+    def __init__(self, path):
+        self.path = path
+
+    def emit(self, events):
+        with open(self.path, "a") as f:
+            for event in events:
+                f.write(json.dumps(event_dict(event)) + "\n")
+
+
+# POSTs {"events": [...]} to a URL from a background thread, so a slow or
+# unreachable receiver never holds up ingestion. Warns once per outage.
+class WebhookSink:
+    def __init__(self, url, timeout=WEBHOOK_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize=100)
+        self._failing = False
+        threading.Thread(target=self._run, name="alert-webhook", daemon=True).start()
+
+    def emit(self, events):
+        try:
+            self._queue.put_nowait([event_dict(event) for event in events])
+        except queue.Full:
+            pass
+
+    def _run(self):
+        while True:
+            events = self._queue.get()
+            request = urllib.request.Request(self.url, data=json.dumps({"events": events}).encode(),
+                                             headers={"Content-Type": "application/json"}, method="POST")
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout):
+                    pass
+                self._failing = False
+            except (urllib.error.URLError, OSError) as e:
+                if not self._failing:
+                    print(f"⚠️ Alert webhook {self.url} failed: {e}")
+                self._failing = True
+
+
+# Sinks configured through the environment: VF_EVENT_LOG (a JSONL file,
+# "" to disable) and VF_ALERT_WEBHOOK (a URL)
+def default_sinks(result_dir=".", environ=os.environ):
+    sinks = []
+    log = environ.get("VF_EVENT_LOG", os.path.join(result_dir, "events.jsonl"))
+    if log:
+        sinks.append(JsonlSink(log))
+    if environ.get("VF_ALERT_WEBHOOK"):
+        sinks.append(WebhookSink(environ["VF_ALERT_WEBHOOK"]))
+    return sinks
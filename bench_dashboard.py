@@ -0,0 +1,219 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import plotly
+
+from collector import Collector
+from dashboard_figures import (build_bar_figure, build_figures, build_heatmap_figure, build_latency_figure,
+                               build_pie_figure, build_trend_figure, busiest_direction, latency_frame,
+                               raw_data_frame, trend_groups)
+from fio_ingest import FioResultCache
+from fio_synth import synth_records, write_sample_store, write_vf_files
+from sample_store import DEFAULT_STORE_PATH, SampleStore
+
+# VF counts benchmarked by default
+DEFAULT_VF_COUNTS = (4, 64, 512)
+
+# Where results are saved unless --output says otherwise
+RESULTS_DIR = "bench_results"
+
+# A stage counts as regressed when its median grows by more than this factor
+REGRESSION_THRESHOLD = 1.25
+
+
+# Run fn `repeats` times (after one warm-up) and return timings in ms.
+# setup runs before every call and isn't timed; its result is passed to fn.
+def measure(fn, repeats, setup=None):
+    timings = []
+    for i in range(repeats + 1):
+        arg = setup() if setup is not None else None
+        start = time.perf_counter()
+        fn(arg) if setup is not None else fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        if i:
+            timings.append(elapsed)
+    return timings
+
+
+def _summary(vf_count, stage, timings):
+    return {
+        "vfs": vf_count,
+        "stage": stage,
+        "min_ms": min(timings),
+        "median_ms": statistics.median(timings),
+        "mean_ms": statistics.mean(timings),
+        "repeats": len(timings),
+    }
+
+
+# Time every stage of a dashboard refresh for one VF count:
+#   ingest_cold      parse every vfN.json (first refresh / every file changed)
+#   ingest_warm      re-check unchanged files (the common refresh)
+#   aggregate_catchup  collector start-up over the whole stored history
+#   aggregate_round  collector poll folding in one new round
+#   trend_window     whole-run trend query from the history/rollup tiers
+#   dataframe        raw data and latency tables
+#   figure_<name>    building each Plotly figure
+#   figures_json     serializing all figures the way Streamlit ships them
+def bench_vf_count(vf_count, rounds, repeats, json_plus, top_n, workdir, rng):
+    directory = os.path.join(workdir, f"vfs{vf_count}")
+    os.makedirs(directory)
+    paths = write_vf_files(directory, vf_count, rng, json_plus=json_plus, round_id=rounds - 1)
+    store_path = os.path.join(directory, DEFAULT_STORE_PATH)
+    write_sample_store(store_path, vf_count, rounds, rng=rng)
+    results = []
+
+    def read_all(cache):
+        for path in paths:
+            cache.read(path)
+
+    results.append(_summary(vf_count, "ingest_cold", measure(read_all, repeats, setup=FioResultCache)))
+    warm = FioResultCache()
+    read_all(warm)
+    results.append(_summary(vf_count, "ingest_warm", measure(lambda: read_all(warm), repeats)))
+
+    def new_collector():
+        return Collector(vf_files=paths, store_path=store_path, result_dir=directory, event_sinks=[])
+
+    results.append(_summary(vf_count, "aggregate_catchup",
+                            measure(lambda collector: collector.poll(), repeats, setup=new_collector)))
+
+    collector = new_collector()
+    collector.poll()
+    store = SampleStore(store_path)
+    next_round = [rounds]
+
+    def append_round():
+        store.append(synth_records(vf_count, 1, first_round=next_round[0], start=time.time(), rng=rng))
+        next_round[0] += 1
+
+    results.append(_summary(vf_count, "aggregate_round",
+                            measure(lambda _: collector.poll(), repeats, setup=append_round)))
+    store.close()
+
+    snapshot = collector.snapshot()
+    groups = trend_groups(snapshot.avg_iops, top_n)
+    results.append(_summary(vf_count, "trend_window",
+                            measure(lambda: collector.trend("avg_iops", groups), repeats)))
+
+    def build_tables():
+        raw_data_frame(snapshot)
+        direction = busiest_direction(snapshot.latency)
+        if direction is not None:
+            latency_frame(snapshot, direction)
+
+    results.append(_summary(vf_count, "dataframe", measure(build_tables, repeats)))
+
+    display_data = snapshot.avg_iops
+    builders = {
+        "bar": lambda: build_bar_figure(snapshot, display_data, True),
+        "trend": lambda: build_trend_figure(snapshot, display_data, True, top_n),
+        "pie": lambda: build_pie_figure(snapshot, display_data, top_n),
+        "heatmap": lambda: build_heatmap_figure(snapshot, True),
+        "latency": lambda: build_latency_figure(snapshot),
+    }
+    for name, build in builders.items():
+        results.append(_summary(vf_count, f"figure_{name}", measure(build, repeats)))
+
+    figures = build_figures(snapshot, True, top_n)
+
+    def serialize():
+        for fig in figures.values():
+            if fig is not None:
+                fig.to_json()
+
+    results.append(_summary(vf_count, "figures_json", measure(serialize, repeats)))
+    return results
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "plotly": plotly.__version__,
+        "machine": platform.machine(),
+        "node": platform.node(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def print_results(results, baseline=None, threshold=REGRESSION_THRESHOLD):
+    previous = {(r["vfs"], r["stage"]): r for r in baseline["results"]} if baseline else {}
+    print(f"{'VFs':>5}  {'stage':<18} {'median ms':>10} {'min ms':>10}" + ("   vs baseline" if previous else ""))
+    for r in results:
+        line = f"{r['vfs']:>5}  {r['stage']:<18} {r['median_ms']:>10.2f} {r['min_ms']:>10.2f}"
+        before = previous.get((r["vfs"], r["stage"]))
+        if before:
+            ratio = r["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+            flag = "  ⚠️ regression" if ratio > threshold else ""
+            line += f"   {ratio:>6.2f}x{flag}"
+        print(line)
+
+
+# Stages whose median grew beyond threshold compared to a saved run
+def regressions(results, baseline, threshold=REGRESSION_THRESHOLD):
+    previous = {(r["vfs"], r["stage"]): r for r in baseline["results"]}
+    found = []
+    for r in results:
+        before = previous.get((r["vfs"], r["stage"]))
+        if before and before["median_ms"] and r["median_ms"] / before["median_ms"] > threshold:
+            found.append(r)
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard ingest/aggregate/render path")
+    parser.add_argument("--vfs", type=int, nargs="+", default=list(DEFAULT_VF_COUNTS), help="VF counts to test")
+    parser.add_argument("--rounds", type=int, default=1000, help="history rounds in the sample store")
+    parser.add_argument("--repeats", type=int, default=5, help="timed runs per stage")
+    parser.add_argument("--plain-json", action="store_true", help="write results without json+ latency bins")
+    parser.add_argument("--top-n", type=int, default=8, help="VFs drawn individually in trend/pie")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="result file (default: bench_results/<timestamp>.json)")
+    parser.add_argument("--compare", default=None, help="earlier result file to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="slowdown factor that counts as a regression")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="vf-bench-") as workdir:
+        for vf_count in args.vfs:
+            print(f"⏱️ {vf_count} VFs, {args.rounds} rounds of history...", file=sys.stderr)
+            results += bench_vf_count(vf_count, args.rounds, args.repeats, not args.plain_json, args.top_n,
+                                      workdir, rng)
+
+    report = {
+        "created_at": time.time(),
+        "config": {"rounds": args.rounds, "repeats": args.repeats, "json_plus": not args.plain_json,
+                   "top_n": args.top_n, "seed": args.seed},
+        "environment": environment(),
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("bench-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline, args.threshold)
+    print(f"💾 Saved results to {output}")
+
+    if baseline is not None and regressions(results, baseline, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import json
+import struct
+
+import numpy as np
+
+from sample_format import SAMPLE_DTYPE
+
+# TCP port the aggregator accepts agents on
+DEFAULT_PORT = 9750
+
+# Frame header: magic, protocol version, frame type, payload length
+MAGIC = b"VFAG"
+PROTOCOL_VERSION = 1
+FRAME = struct.Struct("<4sBBxxI")
+
+# Largest payload either side accepts, bounds a batch to ~230k records
+MAX_PAYLOAD = 16 << 20
+
+# Frame types
+HELLO = 1    # agent: JSON {"node", "format_version", "record_size", "records"}
+WELCOME = 2  # aggregator: JSON {"offset"}, how many of the node's records it already holds
+BATCH = 3    # agent: offset of the first record, then records in the announced format
+ACK = 4      # aggregator: records held for the node after the batch
+ERROR = 5    # either side: JSON {"error"}, the connection is closed after it
+
+OFFSET = struct.Struct("<Q")
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode_frame(kind, payload=b""):
+    return FRAME.pack(MAGIC, PROTOCOL_VERSION, kind, len(payload)) + payload
+
+
+def encode_json(kind, message):
+    return encode_frame(kind, json.dumps(message).encode())
+
+
+# Records go on the wire exactly as they sit in the sample store
+def encode_batch(offset, records):
+    return encode_frame(BATCH, OFFSET.pack(offset) + np.ascontiguousarray(records).tobytes())
+
+
+def encode_ack(records):
+    return encode_frame(ACK, OFFSET.pack(records))
+
+
+# Next (kind, payload) from an asyncio stream
+async def read_frame(reader):
+    magic, version, kind, length = FRAME.unpack(await reader.readexactly(FRAME.size))
+    if magic != MAGIC:
+        raise ProtocolError("peer doesn't speak the VF agent protocol")
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"unsupported protocol version {version}")
+    if length > MAX_PAYLOAD:
+        raise ProtocolError(f"frame of {length} bytes exceeds the {MAX_PAYLOAD} byte limit")
+    return kind, await reader.readexactly(length)
+
+
+def decode_json(payload):
+    try:
+        message = json.loads(payload)
+    except ValueError as e:
+        raise ProtocolError(f"bad JSON frame: {e}")
+    if not isinstance(message, dict):
+        raise ProtocolError("JSON frame is not an object")
+    return message
+
+
+# (offset, records) of a BATCH payload of dtype records (see
+# sample_format.record_dtype); records are a read-only view
+def decode_batch(payload, dtype=SAMPLE_DTYPE):
+    if len(payload) < OFFSET.size or (len(payload) - OFFSET.size) % dtype.itemsize:
+        raise ProtocolError("truncated batch")
+    offset, = OFFSET.unpack_from(payload)
+    return offset, np.frombuffer(payload, dtype=dtype, offset=OFFSET.size)
+
+
+def decode_ack(payload):
+    if len(payload) != OFFSET.size:
+        raise ProtocolError("malformed ack")
+    return OFFSET.unpack(payload)[0]
@@ -0,0 +1,515 @@
+import fnmatch
+import os
+import threading
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+
+from anomaly import AnomalyDetector
+from fairness import SOLO_PATH, WEIGHTS_PATH, FairnessEngine
+from fio_ingest import FioResultCache
+from history_store import HistoryRing
+from latency import LatencyEngine
+from result_watcher import OVERFLOW, open_watcher
+from rollup import RawTier, Rollups, choose_source, minmax_downsample
+from sample_format import make_record
+from sample_store import DEFAULT_STORE_PATH, SampleReader
+from stats_engine import StatsEngine
+from vf_discovery import RESULT_PATTERN, discover_result_files
+
+# Metrics kept per VF in the history ring
+HISTORY_METRICS = ("avg_iops", "iops")
+
+# Upper bound on VF numbers accepted from the store, guards against garbage
+MAX_VFS = 4096
+
+# How often the result directory is re-scanned for new VFs
+DISCOVERY_INTERVAL = 5.0
+
+# Memory cap for the history ring; with many VFs it keeps fewer samples
+HISTORY_BUDGET_BYTES = 256 << 20
+
+# Anomaly events kept for the dashboard, newest last
+EVENT_BACKLOG = 200
+
+# With an inotify watcher the collector only polls when a result lands,
+# plus this often for stall checks, and never twice within WATCH_MIN_GAP
+WATCH_TICK = 5.0
+WATCH_MIN_GAP = 0.02
+
+# Immutable view of the collector state handed to every dashboard session.
+# Arrays are read-only copies, so a session can render from a snapshot while
+# the collector keeps ingesting.
+Snapshot = namedtuple("Snapshot", [
+    "version",        # Bumped whenever new data was ingested
+    "updated_at",     # Epoch seconds of the last ingest
+    "vf_count",
+    "vf_labels",      # Tuple of display names, VF0 ... VFn
+    "current_iops",   # (vf,) latest valid IOPS per VF
+    "avg_iops",       # (vf,) I/Os over seconds of runtime since start per VF
+    "total_iops",     # (vf,) sum of per-round IOPS
+    "samples",        # (vf,) rounds folded in per VF
+    "latest_metrics",  # Tuple of per-VF fio_ingest metric dicts (or None)
+    "history_ts",     # (n,) timestamps of the latest history samples
+    "history",        # (n, vf, metric) values, see HISTORY_METRICS
+    "warnings",       # Tuple of messages about unreadable result files
+    "latency",        # LatencyEngine.summary() of the json+ clat histograms
+    "stats",          # StatsEngine.summary(): windowed, EWMA and weighted rates
+    "events",         # Tuple of the latest anomaly.Event, oldest first
+    "alerts_active",  # (vf, anomaly.EVENT_KINDS) conditions currently raised
+    "fairness",       # FairnessEngine.summary(): cross-VF fairness series
+])
+
+# Trend data drawn from the history or one of its rollup tiers
+TrendWindow = namedtuple("TrendWindow", [
+    "tier",           # Bucket width in seconds of the source, 0 for raw samples
+    "ts",             # (n,) epoch seconds
+    "values",         # (n, group) summed metric per VF group
+    "downsampled",    # True if min-max downsampling was applied
+])
+
+
+def _frozen(array):
+    array = np.array(array, copy=True)
+    array.flags.writeable = False
+    return array
+
+
+# (n, group) sums of an (n, vf) block over each group of VF indexes
+def _group_sums(values, groups):
+    sums = np.zeros((len(values), len(groups)))
+    for g, group in enumerate(groups):
+        sums[:, g] = values[:, group].sum(axis=1)
+    return sums
+
+
+# Mean IOPS as total I/Os over total runtime; VFs whose records carry no
+# runtime fall back to the mean of their per-round IOPS
+def _weighted_average(ios, runtime, total_iops, samples):
+    unweighted = np.divide(total_iops, samples, out=np.zeros_like(total_iops), where=samples > 0)
+    return np.divide(ios, runtime, out=unweighted, where=runtime > 0)
+
+
+# Process-wide ingestion of fio results.
+#
+# One collector serves every dashboard session: it owns the result cache,
+# the running aggregates and the history, polls the sample store (or the
+# vfN.json files when no runner maintains a store) from a single background
+# thread, and publishes a fresh Snapshot only when something changed.
+# Sessions just call snapshot() and render.
+#
+# Without an explicit vf_files list the VFs are discovered from the vfN.json
+# files in result_dir and from the VF numbers seen in the store, and all
+# per-VF state grows as new VFs show up.
+class Collector:
+    def __init__(self, vf_files=None, store_path=DEFAULT_STORE_PATH, history_capacity=100_000,
+                 snapshot_points=1000, poll_interval=0.5, result_dir=".", event_sinks=(), watch=True):
+        self.discover = vf_files is None
+        self.result_dir = result_dir
+        self.vf_files = [] if vf_files is None else list(vf_files)
+        self.vf_count = len(self.vf_files)
+        self.snapshot_points = snapshot_points
+        self.poll_interval = poll_interval
+        self.store_path = store_path
+        self.watch = watch
+        self._watcher = None
+        self._discovered_at = 0.0
+
+        self._cache = FioResultCache()
+        self._reader = SampleReader(store_path)
+        self._store_offset = 0
+        self.history_capacity = history_capacity
+        self._history = HistoryRing(self._history_capacity(self.vf_count), self.vf_count,
+                                    metrics=HISTORY_METRICS)
+        self._rollups = Rollups(self.vf_count, HISTORY_METRICS)
+
+        self._total_iops = np.zeros(self.vf_count)
+        self._samples = np.zeros(self.vf_count, dtype=np.int64)
+        self._total_ios = np.zeros(self.vf_count)
+        self._total_runtime = np.zeros(self.vf_count)
+        self._last_valid = np.zeros(self.vf_count)
+        self._data_valid = np.zeros(self.vf_count, dtype=bool)
+        self._last_round = [None] * self.vf_count
+        self._latest_metrics = [None] * self.vf_count
+        self._warnings = {}
+        self._latency = LatencyEngine(self.vf_count)
+        self._latency_summary = self._latency.summary()
+        self._latency_changed = False
+        self._stats = StatsEngine(self.vf_count)
+        self._anomaly = AnomalyDetector(self.vf_count)
+        self._events = deque(maxlen=EVENT_BACKLOG)
+        self._event_sinks = list(event_sinks)
+        self._new_events = False
+        self._fairness = FairnessEngine(self.vf_count, os.path.join(result_dir, WEIGHTS_PATH),
+                                        os.path.join(result_dir, SOLO_PATH))
+
+        self._version = 0
+        self._lock = threading.Lock()
+        self._updated = threading.Condition(self._lock)
+        self._thread = None
+        self._stop = threading.Event()
+        self._snapshot = self._build_snapshot()
+
+    # Latest published snapshot, cheap enough to call on every rerun
+    def snapshot(self):
+        return self._snapshot
+
+    # Skip all but about the last `records` records of the sample store, so
+    # the first poll only replays that tail. Starts at a round boundary.
+    # Call before the first poll.
+    def start_at_tail(self, records):
+        with self._lock:
+            if not self._reader.exists():
+                return
+            stored = self._reader.records()
+            offset = max(0, len(stored) - records)
+            if offset:
+                rounds = stored["round_id"][offset - 1:]
+                changes = np.flatnonzero(rounds[1:] != rounds[0])
+                if len(changes):
+                    offset += int(changes[0])
+            self._store_offset = offset
+
+    # Snapshot once its version differs from `version`, or the current one
+    # after `timeout` seconds; lets a session sleep until new data arrives
+    def wait_for_update(self, version, timeout=None):
+        with self._updated:
+            self._updated.wait_for(lambda: self._version != version, timeout)
+            return self._snapshot
+
+    # True while the background thread is woken by inotify rather than
+    # polling every poll_interval
+    @property
+    def watching(self):
+        return self._watcher is not None
+
+    # Start the background polling thread (idempotent)
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self.watch and self._watcher is None:
+                self._watcher = self._open_watcher()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="fio-collector", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.wake()
+        if self._thread is not None:
+            self._thread.join()
+        if self._watcher is not None:
+            self._watcher.close()
+            self._watcher = None
+
+    # Watcher over the result directory and the sample store: result files
+    # and the fairness configuration count once written, the store on
+    # every append
+    def _open_watcher(self):
+        directories = [os.path.dirname(self.store_path)]
+        if self.discover:
+            directories.append(self.result_dir)
+            patterns = [RESULT_PATTERN]
+        else:
+            directories += [os.path.dirname(path) for path in self.vf_files]
+            patterns = [os.path.basename(path) for path in self.vf_files]
+        directories.append(self.result_dir)
+        patterns += [WEIGHTS_PATH, SOLO_PATH]
+        return open_watcher(directories, patterns, appended=[os.path.basename(self.store_path)])
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"⚠️ Collector poll failed: {e}")
+            if self._watcher is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            # Writes during the gap queue up and are taken in one poll
+            self._stop.wait(WATCH_MIN_GAP)
+            changed = self._watcher.wait(WATCH_TICK)
+            # A result file not seen before: look for new VFs right away
+            known = {os.path.basename(path) for path in self.vf_files}
+            if OVERFLOW in changed or any(fnmatch.fnmatchcase(name, RESULT_PATTERN) and name not in known
+                                          for name in changed):
+                self._discovered_at = 0.0
+
+    # History samples that fit the memory budget for a given number of VFs
+    def _history_capacity(self, vf_count):
+        # Every sample is stored twice (see HistoryRing)
+        sample_bytes = 2 * 8 * (1 + max(vf_count, 1) * len(HISTORY_METRICS))
+        return max(1, min(self.history_capacity, HISTORY_BUDGET_BYTES // sample_bytes))
+
+    # Grow every per-VF structure to hold vf_count VFs
+    def _resize(self, vf_count):
+        grow = vf_count - self.vf_count
+        if grow <= 0:
+            return
+        self._history = self._history.resized(vf_count, self._history_capacity(vf_count))
+        self._rollups = self._rollups.resized(vf_count)
+        self._total_iops = np.concatenate([self._total_iops, np.zeros(grow)])
+        self._samples = np.concatenate([self._samples, np.zeros(grow, dtype=np.int64)])
+        self._total_ios = np.concatenate([self._total_ios, np.zeros(grow)])
+        self._total_runtime = np.concatenate([self._total_runtime, np.zeros(grow)])
+        self._last_valid = np.concatenate([self._last_valid, np.zeros(grow)])
+        self._data_valid = np.concatenate([self._data_valid, np.zeros(grow, dtype=bool)])
+        self._last_round += [None] * grow
+        self._latest_metrics += [None] * grow
+        self._latency.resize(vf_count)
+        self._latency_changed = True
+        self._stats.resize(vf_count)
+        self._anomaly.resize(vf_count)
+        self._fairness.resize(vf_count)
+        self.vf_count = vf_count
+
+    # Pick up vfN.json files that appeared since the last scan
+    def _discover(self):
+        now = time.time()
+        if not self.discover or now - self._discovered_at < DISCOVERY_INTERVAL:
+            return False
+        self._discovered_at = now
+        files = discover_result_files(self.result_dir)
+        if len(files) <= len(self.vf_files):
+            return False
+        self.vf_files = files
+        self._resize(len(files))
+        return True
+
+    # One ingestion tick. Returns True if a new snapshot was published.
+    def poll(self):
+        with self._lock:
+            resized = self._discover()
+            if self._reader.exists():
+                new_records, self._store_offset = self._reader.read_since(self._store_offset)
+                changed = self._ingest_records(new_records)
+                # Fixed-size store records can't carry histograms, latency
+                # still comes from the published vfN.json results
+                self._ingest_latency()
+            else:
+                changed = self._ingest_files()
+            self._raise(self._anomaly.check_stalls())
+            if self._new_events:
+                self._new_events = False
+                changed = True
+            if self._fairness.reload():
+                changed = True
+            if self._latency_changed:
+                self._latency_summary = self._latency.summary()
+                self._latency_changed = False
+                changed = True
+            if changed or resized:
+                self._version += 1
+                self._snapshot = self._build_snapshot()
+                self._updated.notify_all()
+            return changed
+
+    # One metric over [start, end] (epoch seconds, None leaves a side open)
+    # at about `points` points, summed over each group of VF indexes.
+    # Served from the raw history or the finest rollup tier that holds the
+    # range, so the cost depends on `points`, not on the length of the run.
+    def trend(self, metric, groups, start=None, end=None, points=1000):
+        with self._lock:
+            source = choose_source([RawTier(self._history)] + self._rollups.tiers, start, end, points)
+            if source is None:
+                return TrendWindow(0, np.zeros(0), np.zeros((0, len(groups))), False)
+            ts, low, mean, high = source.window(metric, start, end)
+            # Sums of the per-VF extremes bound the extremes of a group's sum
+            low, mean, high = (_group_sums(stat, groups) for stat in (low, mean, high))
+        x, values = minmax_downsample(ts, low, mean, high, points)
+        return TrendWindow(source.width, x, values, len(x) != len(ts))
+
+    # Latency histograms per VF and direction, see LatencyEngine.group_counts()
+    def latency_histograms(self):
+        with self._lock:
+            return self._latency.group_counts()
+
+    # Per-VF share and latency inflation over the latest `points` fairness
+    # intervals, as (ts, (n, vf, fairness.VF_FAIRNESS_METRICS))
+    def fairness_series(self, points=1000):
+        with self._lock:
+            return self._fairness.vf_series(points)
+
+    def _build_snapshot(self):
+        ts, values = self._history.window(self.snapshot_points)
+        return Snapshot(
+            version=self._version,
+            updated_at=time.time(),
+            vf_count=self.vf_count,
+            vf_labels=tuple(f"VF{i}" for i in range(self.vf_count)),
+            current_iops=_frozen(self._last_valid),
+            avg_iops=_frozen(self._avg_iops()),
+            total_iops=_frozen(self._total_iops),
+            samples=_frozen(self._samples),
+            latest_metrics=tuple(self._latest_metrics),
+            history_ts=_frozen(ts),
+            history=_frozen(values),
+            warnings=tuple(self._warnings.values()),
+            latency=self._latency_summary,
+            stats=self._stats.summary(),
+            events=tuple(self._events),
+            alerts_active=_frozen(self._anomaly.active()),
+            fairness=self._fairness.summary(self.snapshot_points),
+        )
+
+    def _avg_iops(self):
+        return _weighted_average(self._total_ios, self._total_runtime, self._total_iops, self._samples)
+
+    # Read one result file through the change-aware cache.
+    # Returns (metrics, new_round) where new_round is True only the first time
+    # a fio round is seen. Every new round's latency histograms are merged
+    # into the latency engine.
+    def _read_file(self, vf, path):
+        try:
+            metrics, changed = self._cache.read(path)
+        except FileNotFoundError:
+            self._warnings[path] = f"{path} does not exist"
+            return None, False
+        except Exception as e:
+            self._warnings[path] = f"Error reading {path}: {str(e)}"
+            return None, False
+        self._warnings.pop(path, None)
+
+        if metrics is None:
+            if changed:
+                print(f"⚠️ {path} is empty")
+            return None, False
+
+        # Runners stamp every published result with a round id. Files written
+        # by older runners have none, so a new file version counts as a new round.
+        round_id = metrics["round_id"]
+        if round_id is not None:
+            new_round = round_id != self._last_round[vf]
+            self._last_round[vf] = round_id
+        else:
+            new_round = changed
+
+        self._latest_metrics[vf] = metrics
+        if new_round and self._latency.update(vf, metrics):
+            self._latency_changed = True
+        return metrics, new_round
+
+    # Merge the latency histograms of any new rounds in the vfN.json files
+    def _ingest_latency(self):
+        for vf, path in enumerate(self.vf_files):
+            self._read_file(vf, path)
+
+    # Poll the vfN.json files and fold every new round in exactly once
+    def _ingest_files(self):
+        warnings_before = dict(self._warnings)
+        new_rounds = np.zeros(self.vf_count, dtype=bool)
+        for vf, path in enumerate(self.vf_files):
+            metrics, new_round = self._read_file(vf, path)
+            iops = metrics["iops"] if metrics is not None else None
+            if iops is not None and iops > 0:
+                # Only update last valid if we got a positive value
+                self._last_valid[vf] = iops
+                self._data_valid[vf] = True
+                new_rounds[vf] = new_round
+
+        self._total_iops[new_rounds] += self._last_valid[new_rounds]
+        self._samples[new_rounds] += 1
+
+        if new_rounds.any():
+            now = time.time()
+            records = np.concatenate([make_record(vf, self._latest_metrics[vf], ts=now)
+                                      for vf in np.flatnonzero(new_rounds)])
+            timed = records["runtime_ms"] > 0
+            self._total_ios[records["vf"][timed]] += records["total_ios"][timed]
+            self._total_runtime[records["vf"][timed]] += records["runtime_ms"][timed] / 1000
+            self._stats.add(records)
+            self._raise(self._anomaly.add(records, now))
+            self._fairness.add(records, [len(records) - 1])
+            self._append_history(now, np.column_stack([self._avg_iops(), self._last_valid])[None])
+            return True
+        return self._warnings != warnings_before
+
+    # Fold a batch of sample store records into the running totals and the
+    # history ring. One history sample is kept per fio round; a round ends
+    # where the next record belongs to another round. Returns True if
+    # anything new was ingested.
+    def _ingest_records(self, records):
+        records = records[records["vf"] < MAX_VFS]
+        if len(records) == 0:
+            return False
+        self._resize(int(records["vf"].max()) + 1)
+
+        round_id = records["round_id"]
+        ends = np.flatnonzero(np.append((round_id[1:] != round_id[:-1]) | (round_id[1:] < 0), True))
+
+        # Bound the (rounds x VFs) scratch arrays when catching up on a long log
+        chunk_size = max(1, (1 << 22) // self.vf_count)
+        first = 0
+        for start in range(0, len(ends), chunk_size):
+            chunk_ends = ends[start:start + chunk_size]
+            self._ingest_rounds(records[first:chunk_ends[-1] + 1], chunk_ends - first)
+            first = chunk_ends[-1] + 1
+        return True
+
+    # Fold consecutive rounds in, `ends` being the index of each round's last
+    # record. Sums are built per (round, VF) cell, so the work is
+    # O(records + rounds x VFs) rather than O(records x VFs).
+    def _ingest_rounds(self, records, ends):
+        rounds = len(ends)
+        round_index = np.repeat(np.arange(rounds), np.diff(np.append(-1, ends)))
+        cell = round_index * self.vf_count + records["vf"].astype(np.intp)
+        iops = records["iops"]
+        valid = np.flatnonzero(iops > 0)
+        cells = rounds * self.vf_count
+
+        added = np.bincount(cell[valid], weights=iops[valid], minlength=cells).reshape(rounds, self.vf_count)
+        counted = np.bincount(cell[valid], minlength=cells).reshape(rounds, self.vf_count)
+        running_total = self._total_iops + np.cumsum(added, axis=0)
+        running_samples = self._samples + np.cumsum(counted, axis=0)
+        # The average weighs every record by its runtime: I/Os over seconds
+        timed = valid[records["runtime_ms"][valid] > 0]
+        running_ios = self._total_ios + np.cumsum(np.bincount(
+            cell[timed], weights=records["total_ios"][timed], minlength=cells).reshape(rounds, self.vf_count), axis=0)
+        running_runtime = self._total_runtime + np.cumsum(np.bincount(
+            cell[timed], weights=records["runtime_ms"][timed] / 1000, minlength=cells).reshape(rounds, self.vf_count),
+            axis=0)
+        running_avg = _weighted_average(running_ios, running_runtime, running_total, running_samples)
+
+        # Current IOPS per VF is the last valid value seen up to each round end
+        last_row = np.full(cells, -1, dtype=np.intp)
+        np.maximum.at(last_row, cell[valid], valid)
+        last_row = np.maximum.accumulate(last_row.reshape(rounds, self.vf_count), axis=0)
+        running_current = np.where(last_row >= 0, iops[np.maximum(last_row, 0)], self._last_valid)
+
+        self._append_history(records["ts"][ends], np.stack([running_avg, running_current], axis=-1))
+
+        self._total_iops = running_total[-1]
+        self._samples = running_samples[-1]
+        self._total_ios = running_ios[-1]
+        self._total_runtime = running_runtime[-1]
+        self._stats.add(records)
+        self._raise(self._anomaly.add(records))
+        self._fairness.add(records, ends)
+        self._last_valid = running_current[-1]
+        self._data_valid |= counted.any(axis=0)
+
+    # Keep new anomaly events for the dashboard and hand them to the sinks.
+    # Sinks are opt-in: only the process that owns alerting (the dashboard)
+    # logs, prints and webhooks them, other collectors just keep them.
+    def _raise(self, events):
+        if not events:
+            return
+        self._events.extend(events)
+        self._new_events = True
+        if not self._event_sinks:
+            return
+        for event in events:
+            print(f"🚨 {event.message}")
+        for sink in self._event_sinks:
+            try:
+                sink.emit(events)
+            except OSError as e:
+                print(f"⚠️ Event sink failed: {e}")
+
+    # Record history samples in the ring and every rollup tier
+    def _append_history(self, ts, values):
+        self._history.append(ts, values)
+        self._rollups.add(ts, values)
@@ -0,0 +1,520 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from collector import HISTORY_METRICS
+from fio_ingest import DIRECTIONS
+from latency import BUCKET_VALUES_NS
+
+DARK_COLORS = ['#081075', '#801d0b', '#08a608', '#f2dc49']
+OTHERS_COLOR = '#606060'
+
+
+# Per-VF colors: the classic four first, then evenly spread hues
+def vf_colors(count):
+    extra = [f"hsl({(i * 137.508) % 360:.0f}, 65%, 50%)" for i in range(len(DARK_COLORS), count)]
+    return (DARK_COLORS + extra)[:count]
+
+
+# Indexes of the n largest values (in VF order) and of everything else
+def top_n_split(values, n):
+    order = np.argsort(values, kind="stable")[::-1]
+    return np.sort(order[:n]), order[n:]
+
+
+# Share of the total average IOPS per VF, zeros until there is data
+def iops_percentages(avg_iops):
+    total = avg_iops.sum()
+    if total > 0:
+        return avg_iops / total * 100
+    return np.zeros(len(avg_iops))
+
+
+# Epoch seconds to local wall-clock datetimes for the time axis
+def to_local_datetimes(ts):
+    utc_offset = datetime.now().astimezone().utcoffset().total_seconds()
+    return ((np.asarray(ts) + utc_offset) * 1000).astype("datetime64[ms]")
+
+
+# Inverse of to_local_datetimes for a time axis value such as
+# "2024-05-01 12:30:00.5", as Plotly reports zoom ranges
+def from_local_datetime(text):
+    utc_offset = datetime.now().astimezone().utcoffset().total_seconds()
+    local = np.datetime64(str(text).strip().replace(" ", "T"), "ms")
+    return local.astype(np.int64) / 1000 - utc_offset
+
+
+# VF index groups drawn as trend lines: the top_n busiest VFs one by one,
+# then everything else as a single Others group
+def trend_groups(display_data, top_n):
+    top, rest = top_n_split(display_data, top_n)
+    return [[i] for i in top] + ([list(rest)] if len(rest) else [])
+
+
+# Bar chart of average or current IOPS per VF, one trace for all VFs
+def build_bar_figure(snapshot, display_data, show_avg_data):
+    vf_count = snapshot.vf_count
+    # Per-bar labels only while they still fit
+    if vf_count <= 16:
+        if show_avg_data:
+            percentages = iops_percentages(display_data)
+            text = [f"{v:,.0f}<br>({p:.1f}%)" for v, p in zip(display_data, percentages)]
+        else:
+            text = [f"{v:,.0f}" for v in display_data]
+    else:
+        text = None
+
+    fig = go.Figure(go.Bar(
+        x=list(snapshot.vf_labels),
+        y=display_data,
+        marker_color=vf_colors(vf_count),
+        text=text,
+        textposition='auto',
+        textfont=dict(size=20 if vf_count <= 8 else 12),
+        hovertemplate=f"<b>%{{x}}</b><br>{'Avg' if show_avg_data else 'Current'} IOPS: %{{y:,.0f}}<extra></extra>"
+    ))
+
+    fig.update_layout(
+        height=500,
+        template='plotly_dark',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        showlegend=False,
+        margin=dict(t=30, b=30),
+        yaxis_title="IOPS",
+        xaxis_title="Virtual Function",
+        font=dict(color='#E0E0E0')
+    )
+    return fig
+
+
+# Line chart of the running average history, None until there is history.
+# The top_n busiest VFs get their own line, the rest are summed as Others.
+# The lines come from `window` (a collector TrendWindow over trend_groups())
+# when given, else from the latest samples the snapshot carries. x_range
+# pins the time axis to (start, end) epoch seconds.
+def build_trend_figure(snapshot, display_data, show_avg_data, top_n, window=None, x_range=None):
+    if len(snapshot.history_ts) == 0:
+        return None
+
+    vf_labels = snapshot.vf_labels
+    colors = vf_colors(snapshot.vf_count)
+    top, rest = top_n_split(display_data, top_n)
+    if window is None:
+        avg_series = snapshot.history[:, :, HISTORY_METRICS.index("avg_iops")]
+        groups = trend_groups(display_data, top_n)
+        lines = np.column_stack([avg_series[:, group].sum(axis=1) for group in groups])
+        times = to_local_datetimes(snapshot.history_ts)
+    else:
+        lines = window.values
+        times = to_local_datetimes(window.ts)
+    latest = to_local_datetimes(snapshot.history_ts[-1:])
+
+    fig = go.Figure()
+    for line, i in enumerate(top):
+        fig.add_trace(go.Scatter(
+            x=times,
+            y=lines[:, line],
+            name=vf_labels[i],
+            line=dict(color=colors[i], width=2.5),
+            mode='lines',
+            hovertemplate=f"<b>{vf_labels[i]}</b><br>Avg IOPS: %{{y:,.0f}}<extra></extra>"
+        ))
+
+        # Add current value as a separate trace if showing current data
+        if not show_avg_data:
+            fig.add_trace(go.Scatter(
+                x=latest,
+                y=[snapshot.current_iops[i]],
+                name=f"{vf_labels[i]} (Current)",
+                mode='markers',
+                marker=dict(color=colors[i], size=10),
+                hovertemplate=f"<b>{vf_labels[i]}</b><br>Current IOPS: %{{y:,.0f}}<extra></extra>"
+            ))
+
+    if len(rest):
+        fig.add_trace(go.Scatter(
+            x=times,
+            y=lines[:, -1],
+            name=f"Others ({len(rest)} VFs)",
+            line=dict(color=OTHERS_COLOR, width=2.5, dash='dot'),
+            mode='lines',
+            hovertemplate="<b>Others</b><br>Avg IOPS (sum): %{y:,.0f}<extra></extra>"
+        ))
+
+    fig.update_layout(
+        height=500,
+        template='plotly_dark',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        margin=dict(t=30, b=30),
+        yaxis_title="IOPS",
+        xaxis_title="Time",
+        hovermode="x unified"
+    )
+    if x_range is not None:
+        fig.update_xaxes(range=list(to_local_datetimes(np.array(x_range))))
+    return fig
+
+
+# Donut chart of the IOPS share per VF, None when there is nothing to share.
+# Beyond top_n VFs the remainder is one Others slice.
+def build_pie_figure(snapshot, pie_data, top_n):
+    if pie_data.sum() <= 0:
+        return None
+
+    colors = vf_colors(snapshot.vf_count)
+    top, rest = top_n_split(pie_data, top_n)
+    labels = [snapshot.vf_labels[i] for i in top]
+    values = list(pie_data[top])
+    slice_colors = [colors[i] for i in top]
+    if len(rest):
+        labels.append(f"Others ({len(rest)})")
+        values.append(pie_data[rest].sum())
+        slice_colors.append(OTHERS_COLOR)
+
+    fig = go.Figure(go.Pie(
+        labels=labels,
+        values=values,
+        marker_colors=slice_colors,
+        textinfo='percent+value',
+        texttemplate='%{label}<br>%{value:,.0f} IOPS<br>(%{percent})',
+        hole=.4
+    ))
+
+    fig.update_layout(
+        height=500,
+        showlegend=False,
+        margin=dict(t=30, b=30),
+        font=dict(color='#E0E0E0')
+    )
+    return fig
+
+
+# VF x time heatmap of IOPS, a single trace no matter how many VFs there are
+def build_heatmap_figure(snapshot, show_avg_data):
+    if len(snapshot.history_ts) == 0:
+        return None
+
+    metric = "avg_iops" if show_avg_data else "iops"
+    series = snapshot.history[:, :, HISTORY_METRICS.index(metric)]
+
+    fig = go.Figure(go.Heatmap(
+        z=series.T,
+        x=to_local_datetimes(snapshot.history_ts),
+        y=list(snapshot.vf_labels),
+        colorscale='Viridis',
+        colorbar=dict(title="IOPS"),
+        hovertemplate="<b>%{y}</b><br>%{x}<br>IOPS: %{z:,.0f}<extra></extra>"
+    ))
+
+    fig.update_layout(
+        height=max(400, min(1200, 14 * snapshot.vf_count)),
+        template='plotly_dark',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        margin=dict(t=30, b=30),
+        xaxis_title="Time",
+        yaxis=dict(title="Virtual Function", autorange="reversed"),
+        font=dict(color='#E0E0E0')
+    )
+    return fig
+
+
+# Direction (read/write/trim) with the most latency samples, or None
+def busiest_direction(latency):
+    per_direction = latency["samples"].sum(axis=0) if len(latency["samples"]) else np.zeros(len(DIRECTIONS))
+    if per_direction.max() <= 0:
+        return None
+    return int(np.argmax(per_direction))
+
+
+# Exceedance curve (share of I/Os slower than x) of the histogram merged
+# across every VF and round, the honest picture of tail latency
+def build_latency_figure(snapshot):
+    latency = snapshot.latency
+    d = busiest_direction(latency)
+    if d is None:
+        return None
+
+    counts = latency["merged_total_counts"][d]
+    nonzero = np.flatnonzero(counts)
+    exceedance = 1.0 - np.cumsum(counts) / counts.sum()
+    last = nonzero[-1]
+
+    fig = go.Figure(go.Scatter(
+        x=BUCKET_VALUES_NS[:last + 1] / 1000,
+        y=np.maximum(exceedance[:last + 1], 1e-7),
+        mode='lines',
+        line=dict(color='#AB63FA', width=2.5, shape='hv'),
+        hovertemplate="%{x:,.1f} µs<br>P(latency > x) = %{y:.2e}<extra></extra>"
+    ))
+    for p, value in zip(latency["percentiles"], latency["all_total"][d]):
+        fig.add_vline(x=value / 1000, line=dict(color='#808080', dash='dot'),
+                      annotation_text=f"p{p:g}", annotation_position="top")
+
+    fig.update_layout(
+        height=500,
+        template='plotly_dark',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        margin=dict(t=40, b=30),
+        xaxis=dict(title=f"{DIRECTIONS[d]} completion latency (µs)", type="log"),
+        yaxis=dict(title="Fraction of I/Os slower", type="log"),
+        font=dict(color='#E0E0E0')
+    )
+    return fig
+
+
+# Every dashboard figure for one snapshot and view
+def build_figures(snapshot, show_avg_data, top_n):
+    # Use average or current data based on toggle
+    display_data = snapshot.avg_iops if show_avg_data else snapshot.current_iops
+    return {
+        "bar": build_bar_figure(snapshot, display_data, show_avg_data),
+        "trend": build_trend_figure(snapshot, display_data, show_avg_data, top_n),
+        "pie": build_pie_figure(snapshot, display_data, top_n),
+        "heatmap": build_heatmap_figure(snapshot, show_avg_data),
+        "latency": build_latency_figure(snapshot),
+    }
+
+
+# Current and average total IOPS per node of an aggregator cluster status;
+# disconnected nodes are greyed out
+def build_cluster_figure(cluster):
+    nodes = cluster["nodes"]
+    if not nodes:
+        return None
+    names = [node["node"] for node in nodes]
+    colors = vf_colors(len(nodes))
+    fig = go.Figure(go.Bar(
+        x=names,
+        y=[node["current_iops"] for node in nodes],
+        marker_color=[color if node["connected"] else OTHERS_COLOR for color, node in zip(colors, nodes)],
+        name="Current",
+        hovertemplate="<b>%{x}</b><br>Current IOPS: %{y:,.0f}<extra></extra>"
+    ))
+    fig.add_trace(go.Scatter(
+        x=names,
+        y=[node["avg_iops"] for node in nodes],
+        mode='markers',
+        marker=dict(color='#E0E0E0', size=10, symbol='line-ew-open', line=dict(width=3)),
+        name="Average",
+        hovertemplate="<b>%{x}</b><br>Avg IOPS: %{y:,.0f}<extra></extra>"
+    ))
+
+    fig.update_layout(
+        height=450,
+        template='plotly_dark',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        margin=dict(t=30, b=30),
+        yaxis_title="IOPS",
+        xaxis_title="Node",
+        font=dict(color='#E0E0E0')
+    )
+    return fig
+
+
+# Total IOPS per node over the recent batches the aggregator received
+def build_cluster_trend_figure(cluster):
+    nodes = [node for node in cluster["nodes"] if node["history"]["ts"]]
+    if not nodes:
+        return None
+    colors = vf_colors(len(cluster["nodes"]))
+    fig = go.Figure()
+    for color, node in zip(colors, cluster["nodes"]):
+        if not node["history"]["ts"]:
+            continue
+        fig.add_trace(go.Scatter(
+            x=to_local_datetimes(np.array(node["history"]["ts"])),
+            y=node["history"]["iops"],
+            name=node["node"],
+            line=dict(color=color, width=2),
+            mode='lines',
+            hovertemplate=f"<b>{node['node']}</b><br>IOPS: %{{y:,.0f}}<extra></extra>"
+        ))
+
+    fig.update_layout(
+        height=450,
+        template='plotly_dark',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        margin=dict(t=30, b=30),
+        yaxis_title="IOPS",
+        xaxis_title="Time",
+        hovermode="x unified"
+    )
+    return fig
+
+
+# Saturation curves of a sweep (fio_sweep.saturation_curves): total IOPS
+# above and worst p99 latency below, against queue depth, knees marked
+def build_saturation_figure(curves):
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.06)
+    for color, curve in zip(vf_colors(len(curves)), curves):
+        name = f"{curve.rw} {curve.bs} ×{curve.numjobs}"
+        fig.add_trace(go.Scatter(
+            x=curve.iodepth, y=curve.iops, name=name, legendgroup=name,
+            line=dict(color=color, width=2), mode='lines+markers',
+            hovertemplate=f"<b>{name}</b><br>iodepth %{{x}}<br>IOPS: %{{y:,.0f}}<extra></extra>"
+        ), row=1, col=1)
+        fig.add_trace(go.Scatter(
+            x=curve.iodepth, y=curve.clat_p99_ns / 1000, name=name, legendgroup=name, showlegend=False,
+            line=dict(color=color, width=2, dash='dot'), mode='lines+markers',
+            hovertemplate=f"<b>{name}</b><br>iodepth %{{x}}<br>p99: %{{y:,.1f}} µs<extra></extra>"
+        ), row=2, col=1)
+        if curve.knee is not None:
+            fig.add_trace(go.Scatter(
+                x=[curve.iodepth[curve.knee]], y=[curve.iops[curve.knee]], legendgroup=name, showlegend=False,
+                mode='markers', marker=dict(color=color, size=14, symbol='diamond-open', line=dict(width=3)),
+                hovertemplate=f"<b>{name}</b><br>knee at iodepth %{{x}}<extra></extra>"
+            ), row=1, col=1)
+
+    fig.update_layout(
+        height=700,
+        template='plotly_dark',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        margin=dict(t=30, b=30),
+        font=dict(color='#E0E0E0')
+    )
+    depths = sorted({float(depth) for curve in curves for depth in curve.iodepth})
+    fig.update_xaxes(type="log", tickvals=depths, ticktext=[f"{depth:g}" for depth in depths])
+    fig.update_xaxes(title_text="iodepth per job", row=2, col=1)
+    fig.update_yaxes(title_text="IOPS", row=1, col=1)
+    fig.update_yaxes(title_text="p99 latency (µs)", type="log", row=2, col=1)
+    return fig
+
+
+# Fairness over time: Jain's index and the deviation from the weights on
+# top, the max/min ratio in the middle and latency inflation below, with
+# the `top_n` most inflated VFs of (vf_ts, vf_inflation) drawn on their own.
+# None until there is a series.
+def build_fairness_figure(fairness, vf_labels, vf_ts, vf_inflation, top_n):
+    if len(fairness["ts"]) == 0:
+        return None
+    series = {name: fairness["series"][:, i] for i, name in enumerate(fairness["metrics"])}
+    times = to_local_datetimes(fairness["ts"])
+    fig = make_subplots(rows=3, cols=1, shared_xaxes=True, vertical_spacing=0.05)
+    for row, name, label, color, unit in (
+            (1, "jain", "Jain's index", "#00CC96", ".3f"),
+            (1, "weight_deviation", "Off-weight share", "#EF553B", ".1%"),
+            (2, "max_min", "Max / min ratio", "#AB63FA", ",.2f"),
+            (3, "inflation_max", "Worst inflation", "#FFA15A", ",.2f"),
+            (3, "inflation_mean", "Mean inflation", "#4A90E2", ",.2f")):
+        fig.add_trace(go.Scatter(
+            x=times, y=np.where(np.isinf(series[name]), np.nan, series[name]), name=label,
+            line=dict(color=color, width=2.5), mode='lines',
+            hovertemplate=f"<b>{label}</b><br>%{{x}}<br>%{{y:{unit}}}<extra></extra>"
+        ), row=row, col=1)
+
+    if len(vf_ts):
+        worst = np.where(np.isnan(vf_inflation), -np.inf, vf_inflation).max(axis=0)
+        ranked = [i for i in np.argsort(worst, kind="stable")[::-1][:top_n] if np.isfinite(worst[i])]
+        colors = vf_colors(len(vf_labels))
+        for i in ranked:
+            fig.add_trace(go.Scatter(
+                x=to_local_datetimes(vf_ts), y=vf_inflation[:, i], name=f"{vf_labels[i]} inflation",
+                line=dict(color=colors[i], width=1.5, dash='dot'), mode='lines',
+                hovertemplate=f"<b>{vf_labels[i]}</b><br>%{{x}}<br>%{{y:,.2f}}× solo<extra></extra>"
+            ), row=3, col=1)
+
+    fig.update_layout(
+        height=750,
+        template='plotly_dark',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        margin=dict(t=30, b=30),
+        hovermode="x unified",
+        font=dict(color='#E0E0E0')
+    )
+    fig.update_yaxes(title_text="Fairness", range=[0, 1.05], row=1, col=1)
+    fig.update_yaxes(title_text="Max / min", row=2, col=1)
+    fig.update_yaxes(title_text="× solo latency", row=3, col=1)
+    fig.update_xaxes(title_text="Time", row=3, col=1)
+    return fig
+
+
+# One row per node of an aggregator cluster status
+def cluster_node_frame(cluster):
+    now = cluster["updated_at"]
+    return pd.DataFrame([{
+        "Node": node["node"],
+        "Connected": node["connected"],
+        "Peer": node["peer"],
+        "VFs": len(node["vfs"]),
+        "Current IOPS": node["current_iops"],
+        "Average IOPS": node["avg_iops"],
+        "Records": node["records"],
+        "Last batch (s ago)": None if node["last_seen"] is None else round(now - node["last_seen"], 1),
+    } for node in cluster["nodes"]])
+
+
+# One row per VF of every node, busiest first
+def cluster_vf_frame(cluster):
+    rows = [{
+        "Node": node["node"],
+        "VF": f"VF{vf['vf']}",
+        "Current IOPS": vf["current_iops"],
+        "Average IOPS": vf["avg_iops"],
+        "BW (MB/s)": vf["bw_bytes"] / 1e6,
+        "Mean lat (µs)": vf["lat_mean_ns"] / 1000,
+        "p99 (µs)": vf["clat_p99_ns"] / 1000,
+    } for node in cluster["nodes"] for vf in node["vfs"]]
+    frame = pd.DataFrame(rows, columns=["Node", "VF", "Current IOPS", "Average IOPS", "BW (MB/s)",
+                                        "Mean lat (µs)", "p99 (µs)"])
+    return frame.sort_values("Current IOPS", ascending=False)
+
+
+# Table behind the "Show raw data" section
+def raw_data_frame(snapshot):
+    return pd.DataFrame({
+        "VF": list(snapshot.vf_labels),
+        "Current IOPS": snapshot.current_iops,
+        "Average IOPS": snapshot.avg_iops,
+        "IOPS std dev": snapshot.stats["iops_std"],
+        "Percentage": [f"{p:.1f}%" for p in iops_percentages(snapshot.avg_iops)]
+    })
+
+
+# Per-VF merged-histogram percentiles of one direction in µs, VFs without
+# json+ bins left out, slowest p99 first
+def latency_frame(snapshot, direction):
+    latency = snapshot.latency
+    per_vf = pd.DataFrame(latency["vf_total"][:, direction, :] / 1000,
+                          columns=[f"p{p:g} (µs)" for p in latency["percentiles"]])
+    per_vf.insert(0, "VF", list(snapshot.vf_labels[:len(per_vf)]))
+    per_vf = per_vf[latency["has_bins"]]
+    return per_vf.sort_values(per_vf.columns[2], ascending=False)
+
+
+# Anomaly events of a snapshot, newest first
+def events_frame(snapshot):
+    return pd.DataFrame([{
+        "Time": datetime.fromtimestamp(event.ts).strftime("%H:%M:%S"),
+        "VF": f"VF{event.vf}",
+        "Event": event.kind if event.cleared is None else f"{event.cleared} recovered",
+        "Message": event.message,
+    } for event in reversed(snapshot.events)])
+
+
+# Per-VF fairness of the latest interval, most inflated latency first
+def fairness_frame(snapshot):
+    fairness = snapshot.fairness
+    count = len(fairness["share"])
+    frame = pd.DataFrame({
+        "VF": list(snapshot.vf_labels[:count]),
+        "Weight": fairness["weights"],
+        "Share (%)": fairness["share"] * 100,
+        "Weighted share (%)": fairness["expected_share"] * 100,
+        "Mean lat (µs)": fairness["latency_ns"] / 1000,
+        "Solo lat (µs)": np.where(fairness["solo_ns"] > 0, fairness["solo_ns"] / 1000, np.nan),
+        "Solo baseline": np.where(fairness["solo_configured"], "measured",
+                                  np.where(fairness["solo_ns"] > 0, "learned", "—")),
+        "Inflation (×)": fairness["inflation"],
+    })
+    return frame.sort_values("Inflation (×)", ascending=False, na_position="last")
@@ -0,0 +1,321 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from fio_orchestrator import FioOrchestrator
+from history_store import HistoryRing
+from runner_daemon import PROFILES, fio_command
+from sample_format import record_from_fio
+from vf_discovery import discover_devices
+
+# Configured per-VF QoS weights, {"<vf>": weight}; VFs not listed weigh 1
+WEIGHTS_PATH = "vf_weights.json"
+
+# Per-VF latency measured with the VF running alone, written by
+# `python fairness.py solo`
+SOLO_PATH = "solo_baseline.json"
+
+# Device-wide series, one sample per interval:
+#   jain              Jain's index of the weight-normalized IOPS, 1 = fair,
+#                     1/n = one VF gets everything
+#   max_min           largest over smallest weight-normalized IOPS
+#   weight_deviation  share of the IOPS that went to the wrong VFs compared
+#                     to the weights, 0 = exactly as configured
+#   inflation_max     worst mean-latency inflation over the solo baseline
+#   inflation_mean    IOPS-weighted mean inflation
+#   active            VFs taking part in the interval
+FAIRNESS_METRICS = ("jain", "max_min", "weight_deviation", "inflation_max", "inflation_mean", "active")
+
+# Per-VF series: share of the device IOPS and latency inflation
+VF_FAIRNESS_METRICS = ("share", "inflation")
+
+# Intervals kept, and the memory cap of the per-VF series
+FAIRNESS_SAMPLES = 100_000
+FAIRNESS_BUDGET_BYTES = 64 << 20
+
+# A VF takes part in an interval if it reported within this many seconds;
+# a VF whose runner stopped doesn't count as starved
+STALE_SECONDS = 30.0
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Ignoring {path}: {e}")
+        return None
+
+
+# {vf: weight} from a weights file, either {"<vf>": weight} or a list.
+# Entries that aren't a VF number and a weight are skipped with a warning.
+def load_weights(path):
+    data = _read_json(path)
+    if isinstance(data, list):
+        data = dict(enumerate(data))
+    if data is not None and not isinstance(data, dict):
+        print(f"⚠️ Ignoring {path}: expected an object or a list of weights")
+        data = None
+    weights = {}
+    for vf, weight in (data or {}).items():
+        try:
+            vf, weight = int(vf), float(weight)
+        except (TypeError, ValueError):
+            print(f"⚠️ Ignoring weight {weight!r} for VF {vf!r} in {path}")
+            continue
+        if weight > 0:
+            weights[vf] = weight
+    return weights
+
+
+# {vf: mean latency in ns} from a solo baseline file
+def load_solo(path):
+    data = _read_json(path) or {}
+    return {int(vf): float(entry["lat_mean_ns"]) for vf, entry in data.get("vfs", {}).items()
+            if entry.get("lat_mean_ns", 0) > 0}
+
+
+# Cross-VF fairness of the device, computed incrementally per interval.
+#
+# An interval is one round as the collector splits the sample stream (a
+# fio round, or a single sample in streaming mode). Within it every VF's
+# IOPS is its I/Os over its runtime; VFs without a record in the interval
+# carry their previous value, so intervals of VFs reporting at different
+# moments still compare all of them. The whole batch is evaluated at once,
+# (intervals x VFs), whatever the number of VFs.
+#
+# Latency inflation is a VF's mean latency over its solo baseline: the
+# latency measured with the VF alone (solo_baseline.json), else learned
+# from the intervals where it was the only VF reporting.
+class FairnessEngine:
+    def __init__(self, vf_count, weights_path=None, solo_path=None, capacity=FAIRNESS_SAMPLES):
+        self.weights_path = weights_path
+        self.solo_path = solo_path
+        self.capacity = capacity
+        self._mtimes = None
+        self._configured_weights = {}
+        self._configured_solo = {}
+        self.vf_count = 0
+        self._series = HistoryRing(capacity, 1, FAIRNESS_METRICS)
+        self._per_vf = HistoryRing(1, 0, VF_FAIRNESS_METRICS)
+        self._rate = np.zeros(0)
+        self._latency = np.zeros(0)
+        self._last_ts = np.zeros(0)
+        self._solo_ios = np.zeros(0)
+        self._solo_latency = np.zeros(0)
+        self.weights = np.zeros(0)
+        self.solo_ns = np.zeros(0)
+        self.resize(vf_count)
+        self.reload()
+
+    def _vf_capacity(self, vf_count):
+        sample_bytes = 2 * 8 * (1 + max(vf_count, 1) * len(VF_FAIRNESS_METRICS))
+        return max(1, min(self.capacity, FAIRNESS_BUDGET_BYTES // sample_bytes))
+
+    def resize(self, vf_count):
+        grow = vf_count - self.vf_count
+        if grow <= 0:
+            return
+        self._per_vf = self._per_vf.resized(vf_count, self._vf_capacity(vf_count))
+        self._rate = np.concatenate([self._rate, np.zeros(grow)])
+        self._latency = np.concatenate([self._latency, np.zeros(grow)])
+        self._last_ts = np.concatenate([self._last_ts, np.zeros(grow)])
+        self._solo_ios = np.concatenate([self._solo_ios, np.zeros(grow)])
+        self._solo_latency = np.concatenate([self._solo_latency, np.zeros(grow)])
+        self.vf_count = vf_count
+        self._apply_config()
+
+    # Re-read the weights and solo baseline files when they changed.
+    # Returns True if they did.
+    def reload(self):
+        mtimes = tuple(os.path.getmtime(path) if path and os.path.exists(path) else None
+                       for path in (self.weights_path, self.solo_path))
+        if mtimes == self._mtimes:
+            return False
+        self._mtimes = mtimes
+        self._configured_weights = load_weights(self.weights_path) if self.weights_path else {}
+        self._configured_solo = load_solo(self.solo_path) if self.solo_path else {}
+        self._apply_config()
+        return True
+
+    def _apply_config(self):
+        self.weights = np.ones(self.vf_count)
+        self.solo_ns = np.zeros(self.vf_count)
+        for vf, weight in self._configured_weights.items():
+            if vf < self.vf_count:
+                self.weights[vf] = weight
+        for vf, latency in self._configured_solo.items():
+            if vf < self.vf_count:
+                self.solo_ns[vf] = latency
+
+    # Solo latency per VF: configured, else learned, else 0 (unknown)
+    def _baseline(self):
+        learned = np.divide(self._solo_latency, self._solo_ios, out=np.zeros(self.vf_count),
+                            where=self._solo_ios > 0)
+        return np.where(self.solo_ns > 0, self.solo_ns, learned)
+
+    # Fold consecutive intervals of sample store records in, `ends` being
+    # the index of each interval's last record. VFs must fit vf_count.
+    def add(self, records, ends):
+        rounds, vf_count = len(ends), self.vf_count
+        if rounds == 0:
+            return
+        round_index = np.repeat(np.arange(rounds), np.diff(np.append(-1, ends)))
+        cell = round_index * vf_count + records["vf"].astype(np.intp)
+        runtime = records["runtime_ms"] / 1000.0
+        timed = np.flatnonzero(runtime > 0)
+        cell, ios = cell[timed], records["total_ios"][timed].astype(np.float64)
+        cells = rounds * vf_count
+
+        def per_cell(weights):
+            return np.bincount(cell, weights=weights, minlength=cells).reshape(rounds, vf_count)
+        seconds = per_cell(runtime[timed])
+        ios_sum = per_cell(ios)
+        latency_sum = per_cell(records["lat_mean_ns"][timed] * ios)
+        reported_at = np.zeros(cells)
+        np.maximum.at(reported_at, cell, records["ts"][timed])
+        reported_at = reported_at.reshape(rounds, vf_count)
+
+        # Carry every VF's latest values forward to the intervals it skipped
+        columns = np.arange(vf_count)
+
+        def carried(has, values, previous):
+            last = np.maximum.accumulate(np.where(has, np.arange(rounds)[:, None], -1), axis=0)
+            return np.where(last >= 0, values[np.maximum(last, 0), columns], previous)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rate = carried(seconds > 0, ios_sum / seconds, self._rate)
+            latency = carried(ios_sum > 0, latency_sum / ios_sum, self._latency)
+        last_ts = carried(seconds > 0, reported_at, self._last_ts)
+        ts = records["ts"][ends]
+        active = (last_ts > 0) & (ts[:, None] - last_ts <= STALE_SECONDS)
+
+        # Learn solo baselines from intervals with one VF of several running
+        known = (last_ts > 0).sum(axis=1)
+        solo = active & ((active.sum(axis=1) == 1) & (known >= 2))[:, None] & (ios_sum > 0)
+        self._solo_ios += np.where(solo, ios_sum, 0).sum(axis=0)
+        self._solo_latency += np.where(solo, latency_sum, 0).sum(axis=0)
+
+        self._append(ts, rate, latency, active)
+        self._rate, self._latency, self._last_ts = rate[-1], latency[-1], last_ts[-1]
+
+    def _append(self, ts, rate, latency, active):
+        count = active.sum(axis=1)
+        pair = count >= 2
+        normalized = np.where(active, rate / self.weights, 0.0)
+        total = normalized.sum(axis=1)
+        squares = (normalized ** 2).sum(axis=1)
+        largest = np.where(active, normalized, -np.inf).max(axis=1)
+        smallest = np.where(active, normalized, np.inf).min(axis=1)
+        busy = np.where(active, rate, 0.0)
+        busy_total = busy.sum(axis=1)
+        weight = np.where(active, self.weights, 0.0)
+        baseline = self._baseline()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            jain = np.where(pair & (squares > 0), total ** 2 / (count * squares), np.nan)
+            max_min = np.where(pair & (largest > 0), largest / smallest, np.nan)
+            share = np.where(active, busy / busy_total[:, None], np.nan)
+            expected = weight / weight.sum(axis=1)[:, None]
+            deviation = np.where(pair & (busy_total > 0),
+                                 0.5 * np.abs(np.nan_to_num(share) - expected).sum(axis=1), np.nan)
+            inflation = np.where(active & (baseline > 0) & (latency > 0), latency / baseline, np.nan)
+        measured = ~np.isnan(inflation)
+        inflation_max = np.where(measured.any(axis=1), np.where(measured, inflation, -np.inf).max(axis=1), np.nan)
+        inflation_weight = np.where(measured, busy, 0.0).sum(axis=1)
+        inflation_mean = np.divide(np.where(measured, inflation * busy, 0.0).sum(axis=1), inflation_weight,
+                                   out=np.full(len(ts), np.nan), where=inflation_weight > 0)
+
+        series = np.stack([jain, max_min, deviation, inflation_max, inflation_mean, count], axis=-1)
+        self._series.append(ts, series[:, None, :])
+        self._per_vf.append(ts, np.stack([share, inflation], axis=-1))
+
+    # Latest `points` intervals of the per-VF series as (ts, (n, vf,
+    # VF_FAIRNESS_METRICS)) copies
+    def vf_series(self, points=None):
+        ts, values = self._per_vf.window(points)
+        return ts.copy(), values.copy()
+
+    # What the dashboard shows: the device series over the latest `points`
+    # intervals plus the per-VF state of the latest one
+    def summary(self, points=1000):
+        ts, values = self._series.window(points)
+        last = self._per_vf.last()
+        if last is None:
+            share, inflation = np.full(self.vf_count, np.nan), np.full(self.vf_count, np.nan)
+        else:
+            share, inflation = last[1].T.copy()
+        # Share each active VF would get if the device followed the weights
+        active = ~np.isnan(share)
+        expected = np.full(self.vf_count, np.nan)
+        expected[active] = self.weights[active] / self.weights[active].sum()
+        return {
+            "metrics": FAIRNESS_METRICS,
+            "ts": ts.copy(),
+            "series": values[:, 0, :].copy(),
+            "weights": self.weights.copy(),
+            "weighted": bool(self._configured_weights),
+            "expected_share": expected,
+            "share": share,
+            "inflation": inflation,
+            "latency_ns": self._latency.copy(),
+            "solo_ns": self._baseline(),
+            "solo_configured": self.solo_ns > 0,
+        }
+
+
+# Measure every VF's solo baseline: each VF runs alone, one after another
+async def measure_solo(devices, fio_args, fio_cmd, runtime):
+    baselines = {}
+    with tempfile.TemporaryDirectory(prefix="fio-solo-") as workdir:
+        orchestrator = FioOrchestrator(devices, fio_args, fio_cmd=fio_cmd, runtime=runtime, retries=1,
+                                       output_pattern=os.path.join(workdir, "vf{vf}.json"))
+        try:
+            for vf, device in enumerate(devices):
+                result = await orchestrator.run_job(vf, device)
+                if result.data is None:
+                    print(f"❌ VF{vf} ({device}): fio failed, no baseline")
+                    continue
+                record = record_from_fio(result.data, vf)[0]
+                baselines[str(vf)] = {"device": device, "iops": float(record["iops"]),
+                                      "lat_mean_ns": float(record["lat_mean_ns"]),
+                                      "clat_p99_ns": float(record["clat_p99_ns"])}
+                print(f"⏱️ VF{vf} alone: {record['iops']:,.0f} IOPS, mean {record['lat_mean_ns'] / 1000:,.1f} µs, "
+                      f"p99 {record['clat_p99_ns'] / 1000:,.1f} µs")
+        finally:
+            await orchestrator.terminate_live()
+    return baselines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cross-VF fairness: solo latency baselines for the dashboard")
+    commands = parser.add_subparsers(dest="command", required=True)
+    solo = commands.add_parser("solo", help="run every VF alone and save its latency baseline")
+    solo.add_argument("--profile", choices=sorted(PROFILES), default="throughput",
+                      help="runner profile the fio arguments come from, use the one the VFs run under load")
+    solo.add_argument("--runtime", type=int, default=10, help="seconds per VF")
+    solo.add_argument("--output", default=SOLO_PATH)
+    args = parser.parse_args()
+
+    devices = discover_devices()
+    if not devices:
+        sys.exit("❌ no devices found")
+    print(f"🧍 Measuring {len(devices)} VFs alone, about {len(devices) * args.runtime / 60:.0f} min")
+    try:
+        baselines = asyncio.run(measure_solo(devices, PROFILES[args.profile]["fio_args"], fio_command(args.profile),
+                                             args.runtime))
+    except KeyboardInterrupt:
+        sys.exit("\n⏹️ Interrupted")
+    with open(args.output, "w") as f:
+        json.dump({"profile": args.profile, "measured_at": time.time(), "vfs": baselines}, f, indent=2)
+    print(f"💾 Saved {len(baselines)} solo baselines to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
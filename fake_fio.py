@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+import json
+import os
+import signal
+import sys
+import time
+import zlib
+
+import numpy as np
+
+from fio_ingest import DIRECTIONS, PERCENTILES
+from fio_publish import atomic_write
+from fio_synth import direction_section, direction_shares, fio_document, job_entry, latency_counts
+from latency import BUCKET_VALUES_NS, FIO_IO_U_PLAT_NR, percentiles_from_counts
+from sample_store import DEFAULT_STORE_PATH, SAMPLE_DTYPE, SampleStore
+
+# Drop-in stand-in for fio, for exercising the runners and the dashboard
+# without NVMe hardware. It takes the command lines the runners build
+# (--filename, --rw, --bs, --iodepth, --numjobs, --runtime, --time_based,
+# --size, --status-interval, --output-format=json|json+, --output, ...),
+# never touches the target file, and prints schema-correct fio JSON.
+#
+# Point the runners at it with FIO_BIN=/path/to/fake_fio.py. The simulated
+# devices are tuned through environment variables:
+#
+#   FAKE_FIO_IOPS          peak IOPS of one VF (200000)
+#   FAKE_FIO_BW_MBPS       peak bandwidth of one VF in MB/s (3000)
+#   FAKE_FIO_LAT_US        median completion latency at queue depth 1 (80)
+#   FAKE_FIO_LAT_SIGMA     lognormal spread of the latency distribution (0.35)
+#   FAKE_FIO_SPREAD        speed difference between VFs, +-fraction (0.2)
+#   FAKE_FIO_JITTER        interval-to-interval IOPS noise, fraction (0.05)
+#   FAKE_FIO_NOISY         comma separated filename parts of noisy neighbors
+#   FAKE_FIO_NOISY_PERIOD  seconds between noisy-neighbor bursts (30)
+#   FAKE_FIO_NOISY_DUTY    fraction of the period a burst lasts (0.3)
+#   FAKE_FIO_NOISY_IMPACT  slowdown of the other VFs during a burst (2.0)
+#   FAKE_FIO_FAIL_RATE     chance a run dies with an I/O error (0)
+#   FAKE_FIO_HANG_RATE     chance a run hangs until it is killed (0)
+#   FAKE_FIO_SPEED         simulated seconds per wall-clock second (1)
+#   FAKE_FIO_SEED          random seed, defaults to a fresh one per run
+#
+# Noisy-neighbor bursts follow the wall clock, so every simulated VF sees
+# the same bursts even though each runs in its own process.
+#
+# `fake_fio.py --swarm=N --swarm-dir=DIR [--status-interval=S]` simulates N
+# streaming VFs in one process, writing vfN.json and the sample store the
+# way the streaming runner does, for stress-testing the dashboard with
+# hundreds of VFs at high update rates. --swarm-json-interval=S publishes
+# the vfN.json reports less often than the store records.
+
+# Seconds a run without --runtime or --size lasts
+DEFAULT_RUNTIME = 10
+
+# Latency draws per VF and interval in swarm mode
+SWARM_DRAWS = 2000
+
+# Seconds between "falling behind" warnings in swarm mode
+LAG_WARNING_INTERVAL = 10
+
+
+def _env(name, default):
+    return type(default)(os.environ.get(name, default))
+
+
+# Simulated device parameters, see the environment variables above
+class DeviceModel:
+    def __init__(self):
+        self.iops = _env("FAKE_FIO_IOPS", 200_000.0)
+        self.bw_bytes = _env("FAKE_FIO_BW_MBPS", 3000.0) * 1e6
+        self.lat_ns = _env("FAKE_FIO_LAT_US", 80.0) * 1000
+        self.lat_sigma = _env("FAKE_FIO_LAT_SIGMA", 0.35)
+        self.spread = _env("FAKE_FIO_SPREAD", 0.2)
+        self.jitter = _env("FAKE_FIO_JITTER", 0.05)
+        self.noisy = [part for part in os.environ.get("FAKE_FIO_NOISY", "").split(",") if part]
+        self.noisy_period = _env("FAKE_FIO_NOISY_PERIOD", 30.0)
+        self.noisy_duty = _env("FAKE_FIO_NOISY_DUTY", 0.3)
+        self.noisy_impact = _env("FAKE_FIO_NOISY_IMPACT", 2.0)
+        self.fail_rate = _env("FAKE_FIO_FAIL_RATE", 0.0)
+        self.hang_rate = _env("FAKE_FIO_HANG_RATE", 0.0)
+        self.speed = max(_env("FAKE_FIO_SPEED", 1.0), 1e-3)
+
+    # Stable per-device speed factor, so a VF is consistently fast or slow
+    def device_factor(self, filename):
+        unit = zlib.crc32(filename.encode()) / 0xFFFFFFFF
+        return 1 + self.spread * (2 * unit - 1)
+
+    def is_noisy(self, filename):
+        return any(part in filename for part in self.noisy)
+
+    def burst_active(self, now):
+        if not self.noisy:
+            return False
+        return (now % self.noisy_period) < self.noisy_period * self.noisy_duty
+
+
+# Parse fio-style "--key=value" / "--flag" arguments
+def parse_args(argv):
+    options = {}
+    for arg in argv:
+        if arg.startswith("--"):
+            key, _, value = arg[2:].partition("=")
+            options[key] = value if value else True
+        else:
+            print(f"fake_fio: ignoring job file {arg}", file=sys.stderr)
+    return options
+
+
+_SIZE_UNITS = {"": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30, "t": 1 << 40}
+_TIME_UNITS = {"": 1.0, "s": 1.0, "ms": 1e-3, "us": 1e-6, "m": 60.0, "h": 3600.0}
+
+
+# fio sizes: 4k, 128K, 1G, 1GiB ... as bytes
+def parse_size(value):
+    text = str(value).strip().lower().replace("ib", "").rstrip("b")
+    number = text.rstrip("kmgt")
+    return int(float(number) * _SIZE_UNITS[text[len(number):]])
+
+
+# fio times: 10, 10s, 500ms, 2m ... as seconds
+def parse_time(value):
+    text = str(value).strip().lower()
+    number = text.rstrip("smuh")
+    return float(number) * _TIME_UNITS[text[len(number):]]
+
+
+# Mean IOPS and median latency (ns) of jobs keeping `outstanding` I/Os in
+# flight. factor and noisy may be per-VF arrays.
+def operating_point(model, factor, noisy, bs, outstanding, write_share, now):
+    peak = min(model.iops, model.bw_bytes / bs) * np.asarray(factor, dtype=np.float64)
+    lat = np.full_like(peak, model.lat_ns * (1 + bs / (128 << 10)) * (1 + 0.5 * write_share))
+    if model.burst_active(now):
+        peak = np.where(noisy, peak * 1.5, peak / model.noisy_impact)
+        lat = np.where(noisy, lat, lat * model.noisy_impact)
+    iops = np.minimum(peak, outstanding / (lat / 1e9))
+    # Queueing: at the limit extra depth only adds waiting time
+    return iops, np.maximum(lat, outstanding / iops * 1e9)
+
+
+# One simulated fio job on one file.
+#
+# Latency follows Little's law: the job keeps iodepth x numjobs I/Os in
+# flight, so IOPS grows with queue depth until the device's IOPS or
+# bandwidth limit is hit, after which latency grows instead. Completed I/Os
+# accumulate in fio's latency buckets, so cumulative and per-interval
+# reports come out exactly like fio's.
+class SimulatedJob:
+    def __init__(self, options, model, rng):
+        self.options = options
+        self.model = model
+        self.rng = rng
+        self.filename = str(options.get("filename", "/dev/null"))
+        self.name = str(options.get("name", "fake"))
+        self.rw = str(options.get("rw", options.get("readwrite", "read")))
+        self.bs = parse_size(options.get("bs", "4k"))
+        self.iodepth = int(options.get("iodepth", 1))
+        self.numjobs = int(options.get("numjobs", 1))
+        self.rwmixread = int(options.get("rwmixread", 50))
+        self.shares = direction_shares(self.rw, self.rwmixread)
+        self.factor = model.device_factor(self.filename)
+        self.noisy = model.is_noisy(self.filename)
+        self.counts = {d: np.zeros(FIO_IO_U_PLAT_NR, dtype=np.int64) for d in DIRECTIONS}
+        self.runtime_ms = 0.0
+
+    # Mean IOPS and median latency (ns) at simulated time `now`
+    def operating_point(self, now):
+        return operating_point(self.model, self.factor, self.noisy, self.bs, self.iodepth * self.numjobs,
+                               self.shares.get("write", 0.0), now)
+
+    # Simulate `seconds` of I/O ending at simulated time `now`
+    def advance(self, seconds, now):
+        iops, lat = self.operating_point(now)
+        iops = float(iops) * max(self.rng.normal(1.0, self.model.jitter), 0.0)
+        for direction, share in self.shares.items():
+            ios = int(self.rng.poisson(iops * share * seconds))
+            self.counts[direction] += latency_counts(self.rng, ios, float(lat), self.model.lat_sigma)
+        self.runtime_ms += seconds * 1000
+
+    # fio "jobs" entries for the I/O since `since` (cumulative by default)
+    def jobs(self, json_plus, since=None, runtime_ms=None):
+        runtime_ms = self.runtime_ms if runtime_ms is None else runtime_ms
+        counts = self.counts if since is None else {d: self.counts[d] - since[d] for d in DIRECTIONS}
+        options = {k: str(v) for k, v in self.options.items() if k not in ("output", "output-format")}
+        group = self.numjobs == 1 or "group_reporting" in self.options
+        if group:
+            sections = {d: direction_section(counts[d], runtime_ms, self.bs, json_plus) for d in DIRECTIONS}
+            return [job_entry(sections, runtime_ms, self.name, options)]
+        # Without group_reporting fio reports every clone separately
+        entries = []
+        for clone in range(self.numjobs):
+            sections = {d: direction_section(counts[d] // self.numjobs, runtime_ms, self.bs, json_plus)
+                        for d in DIRECTIONS}
+            entries.append(job_entry(sections, runtime_ms, self.name, options))
+        return entries
+
+
+def _emit(document, output):
+    text = json.dumps(document, indent=2) + "\n"
+    if output:
+        with open(output, "w") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+
+def _fail(job):
+    print(f"fio: io_u error on file {job.filename}: Input/output error: read offset=0, buflen={job.bs}",
+          file=sys.stderr)
+    print(f"{job.name}: (groupid=0, jobs=1): err= 5 (file:io_u.c:1889, func=io_u error, "
+          "error=Input/output error)", file=sys.stderr)
+    sys.exit(1)
+
+
+# Run one fake fio invocation, returns the exit code
+def run(options):
+    model = DeviceModel()
+    seed = os.environ.get("FAKE_FIO_SEED")
+    rng = np.random.default_rng(int(seed) if seed else None)
+    job = SimulatedJob(options, model, rng)
+
+    output_format = str(options.get("output-format", "normal"))
+    json_plus = "json+" in output_format
+    if "json" not in output_format:
+        print("fake_fio: only --output-format=json and json+ are simulated", file=sys.stderr)
+        return 1
+    if "readonly" in options and (job.shares.get("write") or job.shares.get("trim")):
+        print(f"fio: job <{job.name}> has write or trim bit set, but fio is in read-only mode", file=sys.stderr)
+        return 1
+
+    runtime = parse_time(options["runtime"]) if "runtime" in options else None
+    if "time_based" not in options and "size" in options:
+        iops, _ = job.operating_point(time.time())
+        size_time = parse_size(options["size"]) / (iops * job.bs)
+        runtime = size_time if runtime is None else min(runtime, size_time)
+    runtime = DEFAULT_RUNTIME if runtime is None else runtime
+    interval = parse_time(options["status-interval"]) if "status-interval" in options else None
+    output = options.get("output")
+
+    fail_at = runtime * rng.uniform(0.1, 0.9) if rng.random() < model.fail_rate else None
+    hang_at = runtime * rng.uniform(0.1, 0.9) if rng.random() < model.hang_rate else None
+
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+
+    started = time.time()
+    simulated = 0.0
+    next_report = interval
+    step = min(interval or 1.0, 1.0, runtime)
+    while simulated < runtime and not stopping:
+        seconds = min(step, runtime - simulated)
+        if next_report is not None:
+            seconds = min(seconds, next_report - simulated)
+        time.sleep(seconds / model.speed)
+        simulated += seconds
+        job.advance(seconds, started + simulated)
+
+        if fail_at is not None and simulated >= fail_at:
+            _fail(job)
+        if hang_at is not None and simulated >= hang_at:
+            while not stopping:
+                time.sleep(1)
+            return 1
+        if next_report is not None and simulated >= next_report - 1e-9:
+            _emit(fio_document(job.jobs(json_plus)), None)
+            next_report += interval
+
+    _emit(fio_document(job.jobs(json_plus)), output)
+    return 0
+
+
+# Many streaming VFs simulated in one process.
+#
+# The device model runs on per-VF arrays: one batch of latency draws and one
+# multinomial per direction cover every VF, and the per-interval sample
+# store records come straight from the bucket count increments. Only the
+# cumulative vfN.json reports are built per VF.
+class Swarm:
+    def __init__(self, vf_count, options, model, rng):
+        self.vf_count = vf_count
+        self.options = options
+        self.model = model
+        self.rng = rng
+        self.template = SimulatedJob(options, model, rng)
+        filenames = [f"/tmp/fake-nvme{vf}n1" for vf in range(vf_count)]
+        self.factor = np.array([model.device_factor(name) for name in filenames])
+        self.noisy = np.array([model.is_noisy(name) for name in filenames])
+        self.counts = np.zeros((vf_count, len(DIRECTIONS), FIO_IO_U_PLAT_NR), dtype=np.int64)
+        self.runtime_ms = 0.0
+
+    # Latency bucket counts for ios[v] I/Os around median[v] ns
+    def _latency_counts(self, ios, median):
+        draws = self.rng.lognormal(np.log(median)[:, None], self.model.lat_sigma, (self.vf_count, SWARM_DRAWS))
+        idx = np.clip(np.searchsorted(BUCKET_VALUES_NS, draws, side="right") - 1, 0, FIO_IO_U_PLAT_NR - 1)
+        flat = idx + (np.arange(self.vf_count) * FIO_IO_U_PLAT_NR)[:, None]
+        shape = np.bincount(flat.ravel(), minlength=self.vf_count * FIO_IO_U_PLAT_NR)
+        shape = shape.reshape(self.vf_count, FIO_IO_U_PLAT_NR) / SWARM_DRAWS
+        return self.rng.multinomial(ios, shape)
+
+    # Simulate `seconds` of I/O on every VF, returns the bucket increments
+    def advance(self, seconds, now):
+        job = self.template
+        iops, lat = operating_point(self.model, self.factor, self.noisy, job.bs, job.iodepth * job.numjobs,
+                                    job.shares.get("write", 0.0), now)
+        iops = iops * np.maximum(self.rng.normal(1.0, self.model.jitter, self.vf_count), 0.0)
+        step = np.zeros_like(self.counts)
+        for d, direction in enumerate(DIRECTIONS):
+            share = job.shares.get(direction)
+            if share:
+                step[:, d] = self._latency_counts(self.rng.poisson(iops * share * seconds), lat)
+        self.counts += step
+        self.runtime_ms += seconds * 1000
+        return step
+
+    # Cumulative fio report of one VF
+    def document(self, vf, json_plus, now):
+        job = self.template
+        sections = {d: direction_section(self.counts[vf, i], self.runtime_ms, job.bs, json_plus)
+                    for i, d in enumerate(DIRECTIONS)}
+        options = dict(job.options, filename=f"/tmp/fake-nvme{vf}n1")
+        return fio_document([job_entry(sections, self.runtime_ms, job.name, options)], now)
+
+    # Sample store records for one interval's bucket increments
+    def records(self, step, seconds, round_id, now):
+        ios = step.sum(axis=-1)
+        total_ios = ios.sum(axis=1)
+        latency = (step * BUCKET_VALUES_NS).sum(axis=-1)
+        latency_sum = latency.sum(axis=1)
+        percentiles = np.nan_to_num(percentiles_from_counts(step, PERCENTILES))
+        p99 = percentiles[..., PERCENTILES.index(99)].max(axis=1)
+        records = np.zeros(self.vf_count, dtype=SAMPLE_DTYPE)
+        records["ts"] = now
+        records["round_id"] = round_id
+        records["vf"] = np.arange(self.vf_count)
+        records["runtime_ms"] = int(seconds * 1000)
+        records["total_ios"] = total_ios
+        records["iops"] = total_ios / seconds
+        records["bw_bytes"] = total_ios * self.template.bs / seconds
+        records["lat_mean_ns"] = np.divide(latency_sum, total_ios, out=np.zeros(self.vf_count),
+                                           where=total_ios > 0)
+        records["clat_p99_ns"] = p99
+        for d, direction in enumerate(DIRECTIONS):
+            section = records[direction]
+            section["total_ios"] = ios[:, d]
+            section["iops"] = ios[:, d] / seconds
+            section["bw_bytes"] = ios[:, d] * self.template.bs / seconds
+            section["lat_mean_ns"] = np.divide(latency[:, d], ios[:, d], out=np.zeros(self.vf_count),
+                                               where=ios[:, d] > 0)
+            section["clat_pct_ns"] = percentiles[:, d]
+        return records
+
+
+# Simulate vf_count streaming VFs in one process. Every interval each VF
+# publishes its cumulative report to vfN.json and a per-interval record to
+# the sample store, like fio_stream.StreamingFio.
+def run_swarm(vf_count, directory, options):
+    model = DeviceModel()
+    seed = os.environ.get("FAKE_FIO_SEED")
+    rng = np.random.default_rng(int(seed) if seed else None)
+    interval = parse_time(options.get("status-interval", 1))
+    runtime = parse_time(options["runtime"]) if "runtime" in options else float("inf")
+    json_plus = options.get("output-format", "json+") != "json"
+    json_interval = parse_time(options.pop("swarm-json-interval", interval))
+    os.makedirs(directory, exist_ok=True)
+
+    swarm = Swarm(vf_count, options, model, rng)
+    store = SampleStore(os.path.join(directory, DEFAULT_STORE_PATH))
+    stream_id = time.time_ns()
+
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+
+    print(f"🐝 Simulating {vf_count} streaming VFs every {interval}s in {directory}", file=sys.stderr)
+    simulated = 0.0
+    published = -float("inf")
+    warned_at = 0.0
+    deadline = time.time()
+    while simulated < runtime and not stopping:
+        deadline += interval / model.speed
+        time.sleep(max(deadline - time.time(), 0))
+        now = time.time()
+        simulated += interval
+        round_id = int(now // interval)
+        step = swarm.advance(interval, now)
+        store.append(swarm.records(step, interval, round_id, now))
+        if simulated - published >= json_interval - 1e-9:
+            published = simulated
+            for vf in range(vf_count):
+                document = swarm.document(vf, json_plus, now)
+                document["round_id"] = round_id
+                document["stream_id"] = stream_id
+                # Losing a report to a crash is harmless here, skip the fsync
+                atomic_write(os.path.join(directory, f"vf{vf}.json"), json.dumps(document), fsync=False)
+
+        lag = time.time() - deadline
+        if lag > interval and now - warned_at > LAG_WARNING_INTERVAL:
+            warned_at = now
+            print(f"⚠️ Swarm is {lag:.1f}s behind, lower --swarm or raise --status-interval", file=sys.stderr)
+    store.close()
+    return 0
+
+
+def main(argv=None):
+    options = parse_args(sys.argv[1:] if argv is None else argv)
+    if "version" in options:
+        print("fio-3.36")
+        return 0
+    if "swarm" in options:
+        return run_swarm(int(options.pop("swarm")), str(options.pop("swarm-dir", ".")), options)
+    return run(options)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import namedtuple
+
+from fio_orchestrator import FioOrchestrator
+from fio_sweep import READ_ONLY_RW, base_args
+from runner_daemon import PROFILES, fio_command
+from sample_format import record_from_fio
+from vf_discovery import discover_devices
+
+# Search space: queue depths are powers of two up to this, job counts
+# double from 1 up to this
+MAX_IODEPTH = 256
+MAX_NUMJOBS = 16
+
+# Seconds of a probe run and of a full measurement
+PROBE_RUNTIME = 2
+RUNTIME = 10
+
+# A probe whose p99 exceeds the SLO by this factor marks the point as
+# infeasible without spending a full measurement on it
+ABORT_FACTOR = 1.5
+
+# More jobs are only worth it if they gain at least this much IOPS
+MIN_GAIN = 0.03
+
+# Among feasible points within this fraction of the best IOPS the lowest
+# queue depth wins, past the knee extra depth only adds latency
+TIE_TOLERANCE = 0.02
+
+# One measured configuration of a VF. aborted means only the probe ran.
+Trial = namedtuple("Trial", ["iodepth", "numjobs", "iops", "clat_p99_ns", "aborted"])
+
+
+# Powers of two from 1 up to limit: the queue depths and job counts tried
+def depth_ladder(limit):
+    depths = [1]
+    while depths[-1] * 2 <= limit:
+        depths.append(depths[-1] * 2)
+    return depths
+
+
+# Trials no other trial beats on both IOPS and p99, by falling IOPS
+def pareto_frontier(trials):
+    frontier = []
+    for trial in sorted((t for t in trials if not t.aborted), key=lambda t: (-t.iops, t.clat_p99_ns)):
+        if not frontier or trial.clat_p99_ns < frontier[-1].clat_p99_ns:
+            frontier.append(trial)
+    return frontier
+
+
+# Adaptive search for the configuration of one VF that gives the most IOPS
+# with p99 completion latency under the SLO.
+#
+# For a job count, p99 grows with queue depth, so the deepest feasible
+# queue is found by bisection over the depth ladder. Job counts are then
+# hill-climbed by doubling while that still gains IOPS; a run with more
+# jobs never needs a deeper queue per job than the previous best, which
+# bounds each new bisection. Every point is probed briefly first and
+# dropped when the probe already blows the SLO.
+class VfTuner:
+    def __init__(self, vf, device, probe, full, slo_ns, max_iodepth=MAX_IODEPTH, max_numjobs=MAX_NUMJOBS):
+        self.vf = vf
+        self.device = device
+        self.probe = probe
+        self.full = full
+        self.slo_ns = slo_ns
+        self.depths = depth_ladder(max_iodepth)
+        self.max_numjobs = max_numjobs
+        self.trials = {}  # (iodepth, numjobs) -> Trial
+        self.runs = 0
+        self.failures = 0
+
+    def feasible(self, trial):
+        return trial is not None and not trial.aborted and trial.clat_p99_ns <= self.slo_ns
+
+    async def _run(self, orchestrator, iodepth, numjobs):
+        self.runs += 1
+        result = await orchestrator.run_job(self.vf, self.device, (f"--iodepth={iodepth}", f"--numjobs={numjobs}"))
+        if result.data is None:
+            self.failures += 1
+            return None
+        record = record_from_fio(result.data, self.vf)[0]
+        return float(record["iops"]), float(record["clat_p99_ns"])
+
+    # Measure one configuration, at most once. None when fio failed.
+    async def measure(self, iodepth, numjobs):
+        key = (iodepth, numjobs)
+        if key not in self.trials:
+            trial = None
+            if self.probe is not None:
+                probed = await self._run(self.probe, iodepth, numjobs)
+                if probed is not None and probed[1] > self.slo_ns * ABORT_FACTOR:
+                    trial = Trial(iodepth, numjobs, *probed, aborted=True)
+            if trial is None:
+                measured = await self._run(self.full, iodepth, numjobs)
+                trial = None if measured is None else Trial(iodepth, numjobs, *measured, aborted=False)
+            self.trials[key] = trial
+            state = "—" if trial is None else ("aborted" if trial.aborted else
+                                               f"{trial.iops:,.0f} IOPS, p99 {trial.clat_p99_ns / 1000:,.0f} µs")
+            print(f"🔍 VF{self.vf} iodepth={iodepth} numjobs={numjobs}: {state}")
+        return self.trials[key]
+
+    # Best feasible trial for a job count with queue depths up to
+    # depths[limit], or None if even depth 1 misses the SLO
+    async def best_iodepth(self, numjobs, limit):
+        if not self.feasible(await self.measure(self.depths[0], numjobs)):
+            return None
+        low, high = 0, limit + 1
+        while high - low > 1:
+            middle = (low + high) // 2
+            if self.feasible(await self.measure(self.depths[middle], numjobs)):
+                low = middle
+            else:
+                high = middle
+        feasible = [t for t in self.trials.values() if t is not None and t.numjobs == numjobs and self.feasible(t)]
+        best = max(t.iops for t in feasible)
+        return min((t for t in feasible if t.iops >= best * (1 - TIE_TOLERANCE)), key=lambda t: t.iodepth)
+
+    async def tune(self):
+        numjobs = 1
+        best = await self.best_iodepth(numjobs, len(self.depths) - 1)
+        while best is not None and numjobs * 2 <= self.max_numjobs:
+            candidate = await self.best_iodepth(numjobs * 2, self.depths.index(best.iodepth))
+            if candidate is None or candidate.iops < best.iops * (1 + MIN_GAIN):
+                break
+            best, numjobs = candidate, numjobs * 2
+        return best
+
+    def grid_size(self):
+        return len(self.depths) * len(depth_ladder(self.max_numjobs))
+
+    def report(self, best):
+        return {
+            "vf": self.vf,
+            "device": self.device,
+            "best": None if best is None else best._asdict(),
+            "frontier": [trial._asdict() for trial in pareto_frontier(t for t in self.trials.values() if t)],
+            "trials": [trial._asdict() for trial in self.trials.values() if trial],
+            "runs": self.runs,
+            "failures": self.failures,
+            "grid_points": self.grid_size(),
+        }
+
+
+# Tune the VFs one after another, the others idle meanwhile. Searches
+# running side by side on one drive would load it with unrelated points,
+# so one VF's p99 would depend on what the others probed at the time: p99
+# would no longer grow with depth alone, which the bisection relies on, and
+# no result could be reproduced. Each VF's best is its optimum on an
+# otherwise quiet drive; fio_sweep.py measures all VFs loaded together.
+async def autotune(devices, fio_args, fio_cmd, slo_ns, runtime=RUNTIME, probe_runtime=PROBE_RUNTIME,
+                   max_iodepth=MAX_IODEPTH, max_numjobs=MAX_NUMJOBS):
+    with tempfile.TemporaryDirectory(prefix="fio-autotune-") as workdir:
+        def orchestrator(seconds):
+            return FioOrchestrator(devices, fio_args, fio_cmd=fio_cmd, runtime=seconds, retries=1,
+                                   output_pattern=os.path.join(workdir, "vf{vf}.json"))
+        full = orchestrator(runtime)
+        probe = orchestrator(probe_runtime) if probe_runtime else None
+        tuners = [VfTuner(vf, device, probe, full, slo_ns, max_iodepth, max_numjobs)
+                  for vf, device in enumerate(devices)]
+        best = []
+        try:
+            for tuner in tuners:
+                best.append(await tuner.tune())
+        finally:
+            for runner in (full, probe):
+                if runner is not None:
+                    await runner.terminate_live()
+        return [tuner.report(result) for tuner, result in zip(tuners, best)]
+
+
+def print_report(reports, slo_ns):
+    for report in reports:
+        best = report["best"]
+        print(f"\n🎯 VF{report['vf']} ({report['device']}), {report['runs']} runs "
+              f"instead of {report['grid_points']} grid points")
+        if best is None:
+            print(f"  ❌ no configuration meets p99 ≤ {slo_ns / 1000:,.0f} µs")
+        else:
+            print(f"  ✅ iodepth={best['iodepth']} numjobs={best['numjobs']}: {best['iops']:,.0f} IOPS, "
+                  f"p99 {best['clat_p99_ns'] / 1000:,.0f} µs")
+        print("  Pareto frontier:")
+        for trial in report["frontier"]:
+            mark = "✓" if trial["clat_p99_ns"] <= slo_ns else " "
+            print(f"   {mark} iodepth={trial['iodepth']:<4} numjobs={trial['numjobs']:<3} "
+                  f"{trial['iops']:>12,.0f} IOPS  p99 {trial['clat_p99_ns'] / 1000:>10,.0f} µs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the iodepth and numjobs with the most IOPS under a p99 SLO")
+    parser.add_argument("--slo", type=float, required=True, help="p99 completion latency target in µs")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="throughput",
+                        help="runner profile the other fio arguments come from")
+    parser.add_argument("--rw", default="randread")
+    parser.add_argument("--bs", default="4k")
+    parser.add_argument("--allow-writes", action="store_true",
+                        help="allow an rw mode that writes to the VFs (drops the profile's --readonly)")
+    parser.add_argument("--runtime", type=int, default=RUNTIME, help="seconds of a full measurement")
+    parser.add_argument("--probe", type=int, default=PROBE_RUNTIME, help="seconds of a probe run, 0 to skip probes")
+    parser.add_argument("--max-iodepth", type=int, default=MAX_IODEPTH)
+    parser.add_argument("--max-numjobs", type=int, default=MAX_NUMJOBS)
+    parser.add_argument("--output", default="autotune.json", help="report with every trial and frontier")
+    args = parser.parse_args()
+    if args.rw not in READ_ONLY_RW and not args.allow_writes:
+        parser.error(f"--rw {args.rw} overwrites data on the VFs, pass --allow-writes to run it")
+
+    devices = discover_devices()
+    if not devices:
+        sys.exit("❌ no devices found")
+    slo_ns = args.slo * 1000
+    fio_args = base_args(PROFILES[args.profile]["fio_args"], args.allow_writes) + [f"--rw={args.rw}", f"--bs={args.bs}"]
+    print(f"🧭 Tuning {len(devices)} VFs for {args.rw} {args.bs} with p99 ≤ {args.slo:,.0f} µs")
+    started = time.monotonic()
+    try:
+        reports = asyncio.run(autotune(devices, fio_args, fio_command(args.profile), slo_ns, args.runtime,
+                                       args.probe, args.max_iodepth, args.max_numjobs))
+    except KeyboardInterrupt:
+        sys.exit("\n⏹️ Interrupted")
+    print_report(reports, slo_ns)
+    with open(args.output, "w") as f:
+        json.dump({"slo_ns": slo_ns, "rw": args.rw, "bs": args.bs, "profile": args.profile,
+                   "elapsed": time.monotonic() - started, "vfs": reports}, f, indent=2)
+    print(f"\n💾 Saved report to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import json
+import os
+
+# fio reports these I/O directions for every job
+DIRECTIONS = ("read", "write", "trim")
+
+# Completion latency percentiles surfaced by the dashboard
+PERCENTILES = (50.0, 99.0, 99.9, 99.99)
+
+
+# Safe division function
+def _safe_divide(numerator, denominator):
+    return numerator / denominator if denominator != 0 else 0
+
+
+# Empty metric set for one direction
+def _empty_direction():
+    return {
+        "iops": 0.0,
+        "bw": 0.0,
+        "bw_bytes": 0.0,
+        "io_bytes": 0,
+        "total_ios": 0,
+        "runtime": 0,
+        "lat_mean_ns": 0.0,
+        "lat_min_ns": 0,
+        "lat_max_ns": 0,
+        "clat_mean_ns": 0.0,
+        "slat_mean_ns": 0.0,
+        "clat_percentiles": {},
+        "clat_bins": None,
+    }
+
+
+# Fold one job's direction section into the running per-direction metrics.
+# Rates and counters add up across jobs; latency means are weighted by the
+# number of samples behind them.
+def _merge_direction(out, section):
+    lat = section.get("lat_ns", {})
+    clat = section.get("clat_ns", {})
+    slat = section.get("slat_ns", {})
+    prev_n = out["total_ios"]
+    n = section.get("total_ios", 0)
+
+    out["iops"] += section.get("iops", 0.0)
+    out["bw"] += section.get("bw", 0)
+    out["bw_bytes"] += section.get("bw_bytes", 0)
+    out["io_bytes"] += section.get("io_bytes", 0)
+    out["total_ios"] += n
+    out["runtime"] = max(out["runtime"], section.get("runtime", 0))
+
+    for key, stats in (("lat_mean_ns", lat), ("clat_mean_ns", clat), ("slat_mean_ns", slat)):
+        out[key] = _safe_divide(out[key] * prev_n + stats.get("mean", 0.0) * n, prev_n + n)
+
+    if lat.get("N", 0):
+        out["lat_min_ns"] = lat["min"] if not out["lat_min_ns"] else min(out["lat_min_ns"], lat["min"])
+        out["lat_max_ns"] = max(out["lat_max_ns"], lat.get("max", 0))
+
+    # Percentiles can't be merged across jobs, keep the first job that has them
+    if not out["clat_percentiles"] and "percentile" in clat:
+        out["clat_percentiles"] = {float(p): v for p, v in clat["percentile"].items()}
+
+    # json+ output carries the raw latency histogram, which does merge exactly
+    if "bins" in clat:
+        bins = out["clat_bins"] if out["clat_bins"] is not None else {}
+        for value, count in clat["bins"].items():
+            bins[int(value)] = bins.get(int(value), 0) + count
+        out["clat_bins"] = bins
+
+
+# Extract the full metric set from one parsed fio JSON document.
+# Besides regular fio output this also accepts the bare {"iops": ...} and
+# {"read": {"iops": ...}} shapes the dashboard has always tolerated.
+def extract_metrics(data):
+    if "jobs" in data:
+        jobs = data["jobs"]
+    elif "read" in data:
+        jobs = [data]
+    elif "iops" in data:
+        jobs = [{"read": {"iops": data["iops"]}}]
+    else:
+        raise ValueError("No 'jobs', 'iops', or 'read' key found")
+    if not jobs:
+        raise ValueError("fio output contains no jobs")
+
+    metrics = {
+        "fio_version": data.get("fio version"),
+        "timestamp_ms": data.get("timestamp_ms"),
+        "round_id": data.get("round_id"),
+        "stream_id": data.get("stream_id"),
+        "usr_cpu": 0.0,
+        "sys_cpu": 0.0,
+        "job_options": jobs[0].get("job options", {}),
+    }
+    for direction in DIRECTIONS:
+        metrics[direction] = _empty_direction()
+
+    for job in jobs:
+        for direction in DIRECTIONS:
+            if direction in job:
+                _merge_direction(metrics[direction], job[direction])
+        metrics["usr_cpu"] += job.get("usr_cpu", 0.0)
+        metrics["sys_cpu"] += job.get("sys_cpu", 0.0)
+
+    metrics["iops"] = sum(metrics[d]["iops"] for d in DIRECTIONS)
+    metrics["bw"] = sum(metrics[d]["bw"] for d in DIRECTIONS)
+    return metrics
+
+
+# Cache key that changes whenever fio rewrites or replaces the file
+def _stat_key(st):
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+# Change-aware reader for fio result files.
+#
+# Each file is parsed at most once per version: a refresh only pays for one
+# os.stat() per file unless fio has written something new. Parse failures are
+# cached too, so a broken file isn't re-parsed on every refresh either.
+class FioResultCache:
+    def __init__(self):
+        self._entries = {}
+
+    # Returns (metrics, changed). metrics is None for an empty file, changed
+    # is True only the first time a new version of the file is seen.
+    # Raises FileNotFoundError for a missing file and ValueError for a file
+    # that isn't valid fio output.
+    def read(self, path):
+        st = os.stat(path)
+        key = _stat_key(st)
+
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] == key:
+            if isinstance(entry[1], Exception):
+                raise entry[1]
+            return entry[1], False
+
+        if st.st_size == 0:
+            metrics = None
+        else:
+            try:
+                with open(path) as f:
+                    metrics = extract_metrics(json.load(f))
+            except (ValueError, KeyError, TypeError, IndexError) as e:
+                error = ValueError(str(e))
+                self._entries[path] = (key, error)
+                raise error
+
+        self._entries[path] = (key, metrics)
+        return metrics, True
+
+    # Drop cached state for a path (or everything)
+    def forget(self, path=None):
+        if path is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(path, None)
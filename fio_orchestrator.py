@@ -0,0 +1,276 @@
+import asyncio
+import os
+import signal
+import time
+from collections import namedtuple
+
+from fio_publish import publish_result, staging_path
+from sample_format import record_from_fio
+
+# Seconds a job may overrun its --runtime before it counts as hung
+TIMEOUT_GRACE = 30
+
+# Seconds between SIGTERM and SIGKILL when stopping a job
+KILL_GRACE = 5
+
+# Why pause() is refused when fio runs through sudo
+PAUSE_NEEDS_ROOT = ("can't pause: fio runs through sudo, SIGSTOP would only stop sudo while fio keeps "
+                    "doing I/O; run the runner daemon as root (it then starts fio without sudo)")
+
+# Outcome of one fio job: data is the published fio document (None on
+# failure), error describes the last failure
+JobResult = namedtuple("JobResult", ["vf", "device", "round_id", "data", "attempts", "elapsed", "error"])
+
+
+# Signal a fio process and everything in its process group. fio is started
+# in its own session, so this also reaches fio behind a sudo wrapper when the
+# caller is allowed to signal it; otherwise only the direct child is hit.
+def signal_process(pid, sig):
+    try:
+        os.killpg(os.getpgid(pid), sig)
+    except PermissionError:
+        os.kill(pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+# Whether SIGSTOP/SIGCONT reach fio itself. Through sudo an unprivileged
+# caller only reaches sudo, which doesn't relay SIGSTOP, so fio (running as
+# root) would keep doing I/O while reported paused.
+def pausable(fio_cmd):
+    return os.path.basename(fio_cmd[0]) != "sudo" or os.geteuid() == 0
+
+
+# Asynchronous fio pipelines, one per VF.
+#
+# Every VF runs its own sequence of fio jobs, so a slow or hung VF never
+# holds the others back: there is no round barrier. Each job is bounded by a
+# timeout, killed and retried when it hangs or fails, and results are
+# published (and appended to the sample store and the run archive) the
+# moment the job finishes.
+# A semaphore caps how many fio processes run at once.
+#
+# pause() freezes the running fio processes with SIGSTOP and holds back new
+# jobs until resume(); time spent paused doesn't count against job timeouts.
+class FioOrchestrator:
+    def __init__(self, devices, fio_args, fio_cmd=("fio",), runtime=3, rounds=None, store=None,
+                 output_pattern="vf{vf}.json", timeout=None, retries=2, max_concurrency=None,
+                 pause_between=0.0, on_result=None, archive=None):
+        self.devices = list(devices)
+        self.fio_args = list(fio_args)
+        self.fio_cmd = list(fio_cmd)
+        self.runtime = runtime
+        self.rounds = rounds
+        self.store = store
+        self.output_pattern = output_pattern
+        self.timeout = runtime + TIMEOUT_GRACE if timeout is None else timeout
+        self.retries = retries
+        self.max_concurrency = max_concurrency or len(self.devices) or 1
+        self.pause_between = pause_between
+        self.on_result = on_result
+        self.archive = archive
+        self.live = {}  # pid -> running fio process
+        self.paused = False
+        self._paused_at = 0.0
+        self._paused_total = 0.0
+        self._stop = None
+        self._queue = None
+        self._semaphore = None
+        self._resume = None
+
+    def output_file(self, vf):
+        return self.output_pattern.format(vf=vf)
+
+    def command(self, device, output_file, extra_args=()):
+        return self.fio_cmd + [
+            f"--filename={device}",
+            *self.fio_args,
+            *extra_args,
+            f"--runtime={self.runtime}",
+            "--time_based",
+            "--output-format=json+",
+            f"--output={staging_path(output_file)}",
+        ]
+
+    # Ask every pipeline to finish after its current job
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+            self._resume.set()
+
+    # Freeze running fio processes and hold back new jobs. Raises ValueError
+    # when fio runs through sudo and can't be frozen.
+    def pause(self):
+        if self.paused:
+            return
+        if not pausable(self.fio_cmd):
+            raise ValueError(PAUSE_NEEDS_ROOT)
+        self.paused = True
+        self._paused_at = time.monotonic()
+        if self._resume is not None:
+            self._resume.clear()
+        for pid in list(self.live):
+            signal_process(pid, signal.SIGSTOP)
+
+    def resume(self):
+        if not self.paused:
+            return
+        self._paused_total += time.monotonic() - self._paused_at
+        self.paused = False
+        for pid in list(self.live):
+            signal_process(pid, signal.SIGCONT)
+        if self._resume is not None:
+            self._resume.set()
+
+    # Total seconds spent paused so far
+    def _paused_seconds(self):
+        current = time.monotonic() - self._paused_at if self.paused else 0.0
+        return self._paused_total + current
+
+    # SIGTERM first (sudo relays it to fio), SIGKILL if fio doesn't go.
+    # SIGCONT makes sure a paused fio actually gets to handle the SIGTERM.
+    async def _terminate(self, process):
+        if process.returncode is not None:
+            return
+        try:
+            signal_process(process.pid, signal.SIGTERM)
+            signal_process(process.pid, signal.SIGCONT)
+            await asyncio.wait_for(process.wait(), KILL_GRACE)
+        except asyncio.TimeoutError:
+            signal_process(process.pid, signal.SIGKILL)
+            await process.wait()
+
+    # Stop every fio process still running, e.g. after run_job was cancelled.
+    # All at once, so stopping takes one KILL_GRACE however many VFs hang.
+    async def terminate_live(self):
+        await asyncio.gather(*(self._terminate(process) for process in list(self.live.values())))
+
+    # Wait for a job while draining its stderr. Returns (exit code, stderr),
+    # the exit code is None when the job timed out and was killed. The
+    # timeout clock stops while the orchestrator is paused.
+    async def _wait(self, process):
+        communicate = asyncio.ensure_future(process.communicate())
+        started = time.monotonic()
+        paused_before = self._paused_seconds()
+        try:
+            while True:
+                elapsed = time.monotonic() - started - (self._paused_seconds() - paused_before)
+                remaining = self.timeout - elapsed
+                if remaining <= 0 and not self.paused:
+                    await self._terminate(process)
+                    return None, ""
+                done, _ = await asyncio.wait({communicate}, timeout=min(max(remaining, 0.05), 1.0))
+                if done:
+                    _, stderr = communicate.result()
+                    return process.returncode, stderr.decode(errors="replace").strip()
+        finally:
+            communicate.cancel()
+
+    # Run one fio job with timeout, kill and retry. Publishes the result under
+    # a fresh round id and returns a JobResult.
+    async def run_job(self, vf, device, extra_args=()):
+        if self._stop is None:
+            self._prepare()
+        output_file = self.output_file(vf)
+        staging = staging_path(output_file)
+        started = time.monotonic()
+        error = None
+        try:
+            for attempt in range(1, self.retries + 2):
+                await self._resume.wait()
+                async with self._semaphore:
+                    process = await asyncio.create_subprocess_exec(
+                        *self.command(device, output_file, extra_args),
+                        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+                        start_new_session=True)
+                    self.live[process.pid] = process
+                    try:
+                        code, stderr = await self._wait(process)
+                    finally:
+                        # When cancelled, fio goes first so it can't write
+                        # its output after the cleanup below
+                        await self._terminate(process)
+                        self.live.pop(process.pid, None)
+
+                if code == 0:
+                    round_id = self.rounds.next() if self.rounds is not None else None
+                    data = publish_result(staging, output_file, round_id)
+                    if data is not None:
+                        if self.store is not None:
+                            self.store.append(record_from_fio(data, vf, round_id, ts=time.time()))
+                        if self.archive is not None:
+                            self.archive.add(data, vf, device, round_id)
+                        return JobResult(vf, device, round_id, data, attempt, time.monotonic() - started, None)
+                    error = "fio produced no usable output"
+                elif code is None:
+                    error = f"timed out after {self.timeout}s"
+                else:
+                    error = f"fio exited with {code}" + (f": {stderr.splitlines()[-1]}" if stderr else "")
+
+                print(f"⚠️ VF{vf} attempt {attempt} failed: {error}")
+                if self._stop.is_set():
+                    break
+                # Back off a little before retrying a sick VF
+                await asyncio.sleep(min(2 ** attempt, 30))
+            return JobResult(vf, device, None, None, attempt, time.monotonic() - started, error)
+        finally:
+            # Output of a failed or cancelled job never gets published
+            if os.path.exists(staging):
+                os.remove(staging)
+
+    async def _pipeline(self, vf, device, jobs):
+        done = 0
+        while not self._stop.is_set() and (jobs is None or done < jobs):
+            result = await self.run_job(vf, device)
+            done += 1
+            await self._queue.put(result)
+            if self.on_result is not None:
+                self.on_result(result)
+            if self.pause_between:
+                try:
+                    await asyncio.wait_for(self._stop.wait(), self.pause_between)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _prepare(self):
+        self._stop = asyncio.Event()
+        self._queue = asyncio.Queue()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._resume = asyncio.Event()
+        if not self.paused:
+            self._resume.set()
+
+    # Run `jobs` jobs per VF (forever when None) and return all results
+    async def run(self, jobs=None):
+        results = []
+        async for result in self.results(jobs):
+            results.append(result)
+        return results
+
+    # Async generator of JobResults in completion order
+    async def results(self, jobs=None):
+        self._prepare()
+        pipelines = [asyncio.create_task(self._pipeline(vf, device, jobs))
+                     for vf, device in enumerate(self.devices)]
+        finished = asyncio.gather(*pipelines)
+        getter = None
+        try:
+            while True:
+                getter = asyncio.create_task(self._queue.get())
+                await asyncio.wait({getter, finished}, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    yield getter.result()
+                    continue
+                getter.cancel()
+                while not self._queue.empty():
+                    yield self._queue.get_nowait()
+                await finished
+                return
+        finally:
+            self.stop()
+            if getter is not None:
+                getter.cancel()
+            for task in pipelines:
+                task.cancel()
+            await self.terminate_live()
+            await asyncio.gather(finished, return_exceptions=True)
@@ -0,0 +1,67 @@
+import json
+import os
+import time
+
+# File that keeps the round counter alive across runner restarts
+ROUND_SEQ_FILE = ".round_seq"
+
+
+# Where fio writes while a round is still running. Readers never look here.
+def staging_path(path):
+    return path + ".partial"
+
+
+# Write a file so readers see either the old or the new content, never a mix.
+# fsync=False still keeps readers safe but skips surviving a power loss.
+def atomic_write(path, text, fsync=True):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# fio sometimes prints warnings ahead of its JSON document, skip them
+def _load_fio_output(path):
+    with open(path) as f:
+        text = f.read()
+    start = text.find("{")
+    if start < 0:
+        raise ValueError(f"{path} contains no fio JSON output")
+    return json.loads(text[start:])
+
+
+# Stamp a finished fio result with its round id and atomically move it into
+# place. Returns the published document, or None if fio left nothing usable
+# behind (the previously published round then stays visible).
+def publish_result(staging, final, round_id):
+    try:
+        data = _load_fio_output(staging)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Not publishing round {round_id} for {final}: {e}")
+        return None
+
+    data["round_id"] = round_id
+    data["published_at_ms"] = int(time.time() * 1000)
+    atomic_write(final, json.dumps(data, indent=2))
+    os.remove(staging)
+    return data
+
+
+# Monotonically increasing round ids, persisted next to the results so a
+# restarted runner never reuses an id the dashboard has already ingested.
+class RoundSequence:
+    def __init__(self, directory="."):
+        self.path = os.path.join(directory, ROUND_SEQ_FILE)
+        try:
+            with open(self.path) as f:
+                self.current = int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            self.current = 0
+
+    def next(self):
+        self.current += 1
+        atomic_write(self.path, str(self.current))
+        return self.current
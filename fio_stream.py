@@ -0,0 +1,194 @@
+import json
+import signal
+import subprocess
+import threading
+import time
+
+import numpy as np
+
+from fio_ingest import DIRECTIONS, PERCENTILES, extract_metrics
+from fio_orchestrator import signal_process
+from fio_publish import atomic_write
+from latency import bins_to_counts, percentiles_from_counts
+from sample_format import make_record
+
+# How long a streaming fio job runs before it has to be restarted
+STREAM_RUNTIME = 7 * 24 * 3600
+
+
+# Splits the concatenated JSON documents fio prints with --status-interval.
+#
+# fio pretty-prints every report and closes it with a "}" on its own line, so
+# parsing is only attempted at those boundaries instead of after every read.
+# Anything between reports that isn't JSON (warnings, eta lines) is skipped.
+class JsonStreamSplitter:
+    def __init__(self):
+        self._parts = []
+        self._last = ""
+        self._search_from = 0
+        self._decoder = json.JSONDecoder()
+
+    # Feed more output, returns the list of documents completed by it. Text
+    # is only collected until a closing brace can have arrived; the buffer
+    # is then joined once and scanned from where the last scan stopped.
+    def feed(self, text):
+        documents = []
+        if not self._parts:
+            start = text.find("{")
+            if start < 0:
+                return documents
+            text = text[start:]
+        closes = "\n}" in self._last + text
+        self._parts.append(text)
+        self._last = text[-1:]
+        if not closes:
+            return documents
+
+        buffer = "".join(self._parts)
+        while True:
+            end = buffer.find("\n}", self._search_from)
+            if end < 0:
+                break
+            try:
+                document, length = self._decoder.raw_decode(buffer)
+            except ValueError:
+                # Closing brace of a nested object, keep looking
+                self._search_from = end + 2
+                continue
+            documents.append(document)
+            start = buffer.find("{", length)
+            buffer = buffer[start:] if start >= 0 else ""
+            self._search_from = 0
+        self._parts = [buffer] if buffer else []
+        self._last = buffer[-1:]
+        return documents
+
+
+# Turns fio's cumulative status reports into per-interval metric sets.
+#
+# Every --status-interval report covers the job since it started, so rates
+# and latency means for the last interval come from the difference between
+# consecutive reports. With json+ output the clat histograms are diffed too,
+# which gives exact per-interval percentiles; otherwise they stay cumulative.
+class IntervalDiffer:
+    def __init__(self):
+        self._previous = None
+
+    def update(self, metrics):
+        previous, self._previous = self._previous, metrics
+        if previous is None:
+            return metrics
+
+        interval = dict(metrics)
+        for direction in DIRECTIONS:
+            now, before = metrics[direction], previous[direction]
+            seconds = (now["runtime"] - before["runtime"]) / 1000
+            ios = now["total_ios"] - before["total_ios"]
+            io_bytes = now["io_bytes"] - before["io_bytes"]
+            section = dict(now)
+            section["total_ios"] = ios
+            section["io_bytes"] = io_bytes
+            section["runtime"] = now["runtime"] - before["runtime"]
+            section["iops"] = ios / seconds if seconds > 0 else 0.0
+            section["bw_bytes"] = io_bytes / seconds if seconds > 0 else 0.0
+            section["bw"] = section["bw_bytes"] / 1024
+            if ios > 0:
+                for key in ("lat_mean_ns", "clat_mean_ns", "slat_mean_ns"):
+                    section[key] = (now[key] * now["total_ios"] - before[key] * before["total_ios"]) / ios
+            if now["clat_bins"] is not None and before["clat_bins"] is not None:
+                counts = np.maximum(bins_to_counts(now["clat_bins"]) - bins_to_counts(before["clat_bins"]), 0)
+                values = percentiles_from_counts(counts, PERCENTILES)
+                section["clat_percentiles"] = {p: v for p, v in zip(PERCENTILES, values) if v == v}
+            interval[direction] = section
+
+        interval["iops"] = sum(interval[d]["iops"] for d in DIRECTIONS)
+        interval["bw"] = sum(interval[d]["bw"] for d in DIRECTIONS)
+        return interval
+
+
+# Long-running fio job on one VF.
+#
+# fio is started once with --status-interval and json+ on stdout. A reader
+# thread splits the stream, converts each report into per-interval metrics,
+# appends them to the sample store and keeps vfN.json pointing at the latest
+# report, so the dashboard sees new data every interval without fio ever
+# being restarted.
+class StreamingFio:
+    def __init__(self, vf, device, fio_args, output_file, store, interval=1, fio_cmd=("fio",)):
+        self.vf = vf
+        self.device = device
+        self.fio_args = list(fio_args)
+        self.output_file = output_file
+        self.store = store
+        self.interval = interval
+        self.fio_cmd = list(fio_cmd)
+        self.samples = 0
+        self.stream_id = None
+        self.process = None
+        self._thread = None
+
+    def command(self):
+        return self.fio_cmd + [
+            f"--filename={self.device}",
+            *self.fio_args,
+            "--time_based",
+            f"--runtime={STREAM_RUNTIME}",
+            f"--status-interval={self.interval}",
+            "--output-format=json+",
+        ]
+
+    def start(self):
+        self.stream_id = time.time_ns()
+        self.process = subprocess.Popen(self.command(), stdout=subprocess.PIPE, text=True, bufsize=1,
+                                        start_new_session=True)
+        self._thread = threading.Thread(target=self._read, name=f"fio-stream-vf{self.vf}", daemon=True)
+        self._thread.start()
+
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    # Freeze / thaw fio in place; the job resumes where it stopped
+    def pause(self):
+        if self.running():
+            signal_process(self.process.pid, signal.SIGSTOP)
+
+    def resume(self):
+        if self.running():
+            signal_process(self.process.pid, signal.SIGCONT)
+
+    def stop(self):
+        if self.running():
+            signal_process(self.process.pid, signal.SIGTERM)
+            signal_process(self.process.pid, signal.SIGCONT)
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                signal_process(self.process.pid, signal.SIGKILL)
+                self.process.wait()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _read(self):
+        splitter = JsonStreamSplitter()
+        differ = IntervalDiffer()
+        for line in self.process.stdout:
+            for document in splitter.feed(line):
+                self._publish(document, differ)
+
+    def _publish(self, document, differ):
+        try:
+            metrics = extract_metrics(document)
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"⚠️ Skipping bad fio report for VF{self.vf}: {e}")
+            return
+
+        # All VFs reporting within the same interval share a round id
+        now = time.time()
+        round_id = int(now // self.interval)
+        document["round_id"] = round_id
+        # Reports of one fio run are cumulative, the stream id tells
+        # consumers which reports to diff against each other
+        document["stream_id"] = self.stream_id
+        atomic_write(self.output_file, json.dumps(document))
+        self.store.append(make_record(self.vf, differ.update(metrics), round_id, ts=now))
+        self.samples += 1
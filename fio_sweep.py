@@ -0,0 +1,256 @@
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import tempfile
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from fio_ingest import PERCENTILES
+from fio_orchestrator import TIMEOUT_GRACE, FioOrchestrator
+from runner_daemon import PROFILES, fio_command
+from sample_format import record_from_fio
+from vf_discovery import discover_devices
+
+# Parameters a sweep varies, in cube axis order; the VF and metric axes follow
+AXES = ("rw", "bs", "iodepth", "numjobs")
+
+# Measured per run and VF, the last axis of the cube. Latency percentiles
+# are the worst of the read/write/trim directions.
+CUBE_METRICS = ("iops", "bw_bytes", "lat_mean_ns") + tuple(f"clat_p{p:g}_ns" for p in PERCENTILES) + (
+    "usr_cpu", "sys_cpu")
+
+# A queue-depth characterization of one workload
+DEFAULT_GRID = {
+    "rw": ["randread"],
+    "bs": ["4k"],
+    "iodepth": [1, 2, 4, 8, 16, 32, 64, 128, 256],
+    "numjobs": [1],
+}
+
+# rw modes that leave the devices' data alone; every other one writes or
+# trims and needs --allow-writes
+READ_ONLY_RW = ("read", "randread")
+
+# Seconds of every run fio leaves out of its figures, so each point is
+# measured in steady state rather than while the queues fill
+DEFAULT_RAMP = 2
+
+# The knee is only reported where the normalized curve bends at least this
+# far away from a straight line (Kneedle), else the curve is still climbing
+KNEE_MIN_BEND = 0.05
+
+# IOPS and latency of one workload against queue depth, summed (IOPS,
+# bandwidth) or worst-case (p99) over the VFs. knee is an index into
+# iodepth or None.
+SaturationCurve = namedtuple("SaturationCurve", ["rw", "bs", "numjobs", "iodepth", "iops", "bw_bytes",
+                                                 "lat_mean_ns", "clat_p99_ns", "knee"])
+
+
+# Results of a sweep as a labeled cube: values[rw, bs, iodepth, numjobs,
+# vf, metric], NaN where a run failed or hasn't happened yet
+class ResultCube:
+    def __init__(self, coords, devices, values=None, created=None):
+        self.coords = {axis: list(coords[axis]) for axis in AXES}
+        self.devices = list(devices)
+        self.shape = tuple(len(self.coords[axis]) for axis in AXES) + (len(self.devices), len(CUBE_METRICS))
+        self.values = np.full(self.shape, np.nan) if values is None else values
+        self.created = time.time() if created is None else created
+
+    # Every grid point as a {axis: label} dict, in run order
+    def points(self):
+        for labels in itertools.product(*(self.coords[axis] for axis in AXES)):
+            yield dict(zip(AXES, labels))
+
+    def index(self, point):
+        return tuple(self.coords[axis].index(point[axis]) for axis in AXES)
+
+    # Store the fio result of one point and VF
+    def set(self, point, vf, data):
+        record = record_from_fio(data, vf)[0]
+        percentiles = np.max([record[d]["clat_pct_ns"] for d in ("read", "write", "trim")], axis=0)
+        row = [record["iops"], record["bw_bytes"], record["lat_mean_ns"], *percentiles,
+               record["usr_cpu"], record["sys_cpu"]]
+        self.values[self.index(point) + (vf,)] = row
+
+    # Values of one metric, (rw, bs, iodepth, numjobs, vf)
+    def metric(self, name):
+        return self.values[..., CUBE_METRICS.index(name)]
+
+    def completed(self):
+        return int(np.any(~np.isnan(self.values[..., 0]), axis=-1).sum())
+
+    def save(self, path):
+        axes = {f"axis_{axis}": np.array(self.coords[axis]) for axis in AXES}
+        partial = f"{path}.partial.npz"
+        np.savez_compressed(partial, values=self.values, metrics=np.array(CUBE_METRICS),
+                            devices=np.array(self.devices), created=self.created, **axes)
+        os.replace(partial, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as archive:
+            metrics = tuple(archive["metrics"].tolist())
+            if metrics != CUBE_METRICS:
+                raise ValueError(f"{path} holds metrics {metrics}, expected {CUBE_METRICS}")
+            coords = {axis: archive[f"axis_{axis}"].tolist() for axis in AXES}
+            return cls(coords, archive["devices"].tolist(), archive["values"], float(archive["created"]))
+
+
+# Knee of a rising curve that flattens out (Kneedle): with both axes scaled
+# to [0, 1] it is the point furthest above the straight line from the first
+# to the last point. x is taken on a log scale, queue depths being doublings.
+def find_knee(x, y):
+    x = np.log2(np.asarray(x, dtype=np.float64))
+    y = np.asarray(y, dtype=np.float64)
+    valid = np.flatnonzero(~np.isnan(y))
+    if len(valid) < 3 or x[valid[-1]] == x[valid[0]] or np.ptp(y[valid]) == 0:
+        return None
+    xs = (x[valid] - x[valid[0]]) / (x[valid[-1]] - x[valid[0]])
+    ys = (y[valid] - y[valid].min()) / np.ptp(y[valid])
+    bend = ys - xs
+    best = int(np.argmax(bend))
+    if bend[best] < KNEE_MIN_BEND:
+        return None
+    return int(valid[best])
+
+
+def _nan_reduce(reduce, values, axis):
+    valid = ~np.isnan(values)
+    result = reduce(np.where(valid, values, 0), axis=axis)
+    return np.where(valid.any(axis=axis), result, np.nan)
+
+
+# One saturation curve per (rw, bs, numjobs) of the cube
+def saturation_curves(cube):
+    iodepth = np.array(cube.coords["iodepth"], dtype=np.float64)
+    iops, bw = cube.metric("iops"), cube.metric("bw_bytes")
+    lat, p99 = cube.metric("lat_mean_ns"), cube.metric("clat_p99_ns")
+    curves = []
+    for (r, rw), (b, bs), (n, numjobs) in itertools.product(
+            enumerate(cube.coords["rw"]), enumerate(cube.coords["bs"]), enumerate(cube.coords["numjobs"])):
+        total = _nan_reduce(np.sum, iops[r, b, :, n], axis=-1)
+        curves.append(SaturationCurve(
+            rw, bs, numjobs, iodepth,
+            total,
+            _nan_reduce(np.sum, bw[r, b, :, n], axis=-1),
+            # I/O-weighted over the VFs, what an average request saw
+            np.divide(_nan_reduce(np.sum, lat[r, b, :, n] * iops[r, b, :, n], axis=-1), total),
+            _nan_reduce(np.max, p99[r, b, :, n], axis=-1),
+            find_knee(iodepth, total),
+        ))
+    return curves
+
+
+def print_report(cube):
+    print(f"📦 {cube.completed()} of {int(np.prod(cube.shape[:4]))} points, {len(cube.devices)} VFs")
+    for curve in saturation_curves(cube):
+        print(f"\n📈 {curve.rw} bs={curve.bs} numjobs={curve.numjobs}")
+        print(f"  {'iodepth':>8} {'IOPS':>12} {'MB/s':>10} {'mean µs':>10} {'p99 µs':>10}")
+        for i, depth in enumerate(curve.iodepth):
+            marker = "  ← knee" if i == curve.knee else ""
+            print(f"  {depth:>8.0f} {curve.iops[i]:>12,.0f} {curve.bw_bytes[i] / 1e6:>10,.1f} "
+                  f"{curve.lat_mean_ns[i] / 1000:>10,.1f} {curve.clat_p99_ns[i] / 1000:>10,.1f}{marker}")
+        if curve.knee is None:
+            print("  no knee: IOPS still scaling, extend the iodepth range")
+
+
+# Write the saturation curves as a standalone HTML page. Plotly is only
+# needed here, not to run a sweep on a runner host.
+def write_plot(cube, path):
+    from dashboard_figures import build_saturation_figure
+    build_saturation_figure(saturation_curves(cube)).write_html(path, include_plotlyjs=True)
+    print(f"💾 Saved saturation curves to {path}")
+
+
+# fio arguments of a profile without the parameters the sweep sets, and
+# without --readonly when writes are allowed
+def base_args(fio_args, allow_writes=False):
+    swept = tuple(f"--{axis}=" for axis in AXES)
+    return [arg for arg in fio_args if not arg.startswith(swept) and not (allow_writes and arg == "--readonly")]
+
+
+# Run every point of the cube's grid. All VFs run the same point at the
+# same time, so each point measures the drive under one uniform load and
+# the per-VF values add up to the drive's; points run one after another.
+# The cube is saved after every point, an interrupted sweep keeps what it
+# measured.
+async def run_sweep(cube, fio_args, fio_cmd, runtime, ramp, output):
+    with tempfile.TemporaryDirectory(prefix="fio-sweep-") as workdir:
+        points = list(cube.points())
+        for number, point in enumerate(points, 1):
+            point_args = [f"--{axis}={point[axis]}" for axis in AXES]
+            # fio runs the ramp ahead of --runtime, only the timeout allows for it
+            if ramp:
+                point_args.append(f"--ramp_time={ramp}")
+            orchestrator = FioOrchestrator(cube.devices, fio_args + point_args, fio_cmd=fio_cmd,
+                                           runtime=runtime, timeout=runtime + ramp + TIMEOUT_GRACE, retries=1,
+                                           output_pattern=os.path.join(workdir, "vf{vf}.json"))
+            started = time.monotonic()
+            results = await orchestrator.run(jobs=1)
+            for result in results:
+                if result.data is not None:
+                    cube.set(point, result.vf, result.data)
+            cube.save(output)
+            failed = sum(result.data is None for result in results)
+            total = np.nansum(cube.metric("iops")[cube.index(point)])
+            print(f"🔬 [{number}/{len(points)}] {' '.join(point_args[:len(AXES)])}: {total:,.0f} IOPS"
+                  f"{f', {failed} VFs failed' if failed else ''} ({time.monotonic() - started:.1f}s)")
+
+
+def _values(text, kind=str):
+    return [kind(value) for value in text.split(",") if value]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep fio parameters across all VFs and find saturation knees")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="run a parameter grid")
+    run.add_argument("--profile", choices=sorted(PROFILES), default="throughput",
+                     help="runner profile the non-swept fio arguments come from")
+    for axis in AXES:
+        kind = int if axis in ("iodepth", "numjobs") else str
+        run.add_argument(f"--{axis}", type=lambda text, kind=kind: _values(text, kind),
+                         default=DEFAULT_GRID[axis], help=f"comma separated values (default {DEFAULT_GRID[axis]})")
+    run.add_argument("--allow-writes", action="store_true",
+                     help="allow rw modes that write to the VFs (drops the profile's --readonly)")
+    run.add_argument("--runtime", type=int, default=10, help="measured seconds per point")
+    run.add_argument("--ramp", type=int, default=DEFAULT_RAMP, help="unmeasured warm-up seconds per point")
+    run.add_argument("--output", default="sweep.npz", help="result cube")
+    run.add_argument("--plot", default=None, help="also write the saturation curves to this HTML file")
+    report = commands.add_parser("report", help="print saturation curves and knees of a result cube")
+    report.add_argument("cube")
+    report.add_argument("--plot", default=None, help="also write the saturation curves to this HTML file")
+    args = parser.parse_args()
+
+    if args.command == "report":
+        cube = ResultCube.load(args.cube)
+    else:
+        writes = [rw for rw in args.rw if rw not in READ_ONLY_RW]
+        if writes and not args.allow_writes:
+            parser.error(f"--rw {','.join(writes)} overwrites data on the VFs, pass --allow-writes to run it")
+        devices = discover_devices()
+        if not devices:
+            sys.exit("❌ no devices found")
+        grid = {axis: getattr(args, axis) for axis in AXES}
+        grid["iodepth"] = sorted(grid["iodepth"])
+        cube = ResultCube(grid, devices)
+        points = int(np.prod(cube.shape[:4]))
+        print(f"🧪 {points} points × {len(devices)} VFs, about "
+              f"{points * (args.runtime + args.ramp) / 60:.0f} min")
+        try:
+            asyncio.run(run_sweep(cube, base_args(PROFILES[args.profile]["fio_args"], args.allow_writes),
+                                  fio_command(args.profile), args.runtime, args.ramp, args.output))
+        except KeyboardInterrupt:
+            print(f"\n⏹️ Interrupted, {cube.completed()} points saved to {args.output}")
+        print(f"💾 Saved result cube to {args.output}")
+    print_report(cube)
+    if args.plot:
+        write_plot(cube, args.plot)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from fio_publish import atomic_write
+from latency import BUCKET_VALUES_NS, FIO_IO_U_PLAT_NR, percentiles_from_counts
+from sample_store import DEFAULT_STORE_PATH, SAMPLE_DTYPE, SampleStore
+
+# Percentiles fio prints in clat_ns.percentile by default
+FIO_PERCENTILES = (1.0, 5.0, 10.0, 20.0, 30.0, 40.0, 50.0, 60.0, 70.0, 80.0, 90.0, 95.0,
+                   99.0, 99.5, 99.9, 99.95, 99.99)
+
+# Latency samples drawn to shape each synthetic histogram
+LATENCY_DRAWS = 20_000
+
+# Which directions a --rw pattern exercises
+RW_DIRECTIONS = {
+    "read": ("read",), "randread": ("read",),
+    "write": ("write",), "randwrite": ("write",),
+    "trim": ("trim",), "randtrim": ("trim",),
+    "rw": ("read", "write"), "readwrite": ("read", "write"), "randrw": ("read", "write"),
+    "trimwrite": ("trim", "write"), "randtrimwrite": ("trim", "write"),
+}
+
+
+# Bucket counts of total_ios lognormal latencies, shaped from a bounded
+# number of draws so huge I/O counts stay cheap
+def latency_counts(rng, total_ios, median_ns, sigma):
+    counts = np.zeros(FIO_IO_U_PLAT_NR, dtype=np.int64)
+    if total_ios <= 0:
+        return counts
+    draws = rng.lognormal(np.log(median_ns), sigma, min(total_ios, LATENCY_DRAWS))
+    idx = np.clip(np.searchsorted(BUCKET_VALUES_NS, draws, side="right") - 1, 0, FIO_IO_U_PLAT_NR - 1)
+    shape = np.bincount(idx, minlength=FIO_IO_U_PLAT_NR) / len(draws)
+    return rng.multinomial(total_ios, shape)
+
+
+def _stats(min_ns, max_ns, mean_ns, stddev_ns, n):
+    return {"min": int(min_ns), "max": int(max_ns), "mean": float(mean_ns), "stddev": float(stddev_ns), "N": int(n)}
+
+
+# One direction section of a fio job as fio prints it, from the clat bucket
+# counts of every I/O the job completed in runtime_ms
+def direction_section(counts, runtime_ms, bs=4096, json_plus=False):
+    total_ios = int(counts.sum())
+    io_bytes = total_ios * bs
+    seconds = runtime_ms / 1000 if runtime_ms else 1
+
+    clat = {"min": 0, "max": 0, "mean": 0.0, "stddev": 0.0, "N": total_ios}
+    if total_ios:
+        used = np.flatnonzero(counts)
+        values = BUCKET_VALUES_NS[used]
+        mean = float(np.dot(values, counts[used]) / total_ios)
+        stddev = float(np.sqrt(np.dot((values - mean) ** 2, counts[used]) / total_ios))
+        clat = _stats(values[0], values[-1], mean, stddev, total_ios)
+        clat["percentile"] = {f"{p:.6f}": int(v) for p, v in
+                              zip(FIO_PERCENTILES, percentiles_from_counts(counts, FIO_PERCENTILES))}
+        if json_plus:
+            clat["bins"] = dict(zip(map(str, values.tolist()), counts[used].tolist()))
+
+    slat_mean = clat["mean"] * 0.02
+    lat_mean = clat["mean"] + slat_mean
+    return {
+        "io_bytes": io_bytes,
+        "io_kbytes": io_bytes // 1024,
+        "bw_bytes": int(io_bytes / seconds),
+        "bw": int(io_bytes / seconds / 1024),
+        "iops": total_ios / seconds,
+        "runtime": int(runtime_ms) if total_ios else 0,
+        "total_ios": total_ios,
+        "short_ios": 0,
+        "drop_ios": 0,
+        "slat_ns": _stats(clat["min"] * 0.01, clat["max"] * 0.02, slat_mean, slat_mean * 0.3, total_ios),
+        "clat_ns": clat,
+        "lat_ns": _stats(clat["min"] * 1.01, clat["max"] * 1.02, lat_mean, clat["stddev"], total_ios),
+        "bw_min": 0,
+        "bw_max": 0,
+        "bw_agg": 100.0 if total_ios else 0.0,
+        "bw_mean": io_bytes / seconds / 1024,
+        "iops_min": 0,
+        "iops_max": 0,
+        "iops_mean": total_ios / seconds,
+        "iops_stddev": 0.0,
+        "iops_samples": int(seconds),
+    }
+
+
+# Direction section of a job running at `iops` for runtime_ms
+def synth_direction(rng, iops, runtime_ms, bs=4096, lat_median_ns=80_000, lat_sigma=0.35, json_plus=False):
+    counts = latency_counts(rng, int(iops * runtime_ms / 1000), lat_median_ns, lat_sigma)
+    return direction_section(counts, runtime_ms, bs, json_plus)
+
+
+# Share of the I/O each direction gets under an rw pattern (rwmixread
+# percent of a mixed workload goes to reads)
+def direction_shares(rw, rwmixread=50):
+    active = RW_DIRECTIONS.get(rw, ("read",))
+    if "read" in active and len(active) > 1:
+        return {d: (rwmixread if d == "read" else 100 - rwmixread) / 100 for d in active}
+    return {d: 1.0 / len(active) for d in active}
+
+
+# One entry of fio's "jobs" list around per-direction sections
+def job_entry(sections, runtime_ms, jobname="test", job_options=None, usr_cpu=5.0, sys_cpu=20.0):
+    job = {
+        "jobname": jobname,
+        "groupid": 0,
+        "error": 0,
+        "eta": 0,
+        "elapsed": int(runtime_ms / 1000) + 1,
+        "job options": dict(job_options or {"name": jobname}),
+    }
+    job.update(sections)
+    total_ios = sum(section["total_ios"] for section in sections.values())
+    job.update({
+        "job_runtime": int(runtime_ms),
+        "usr_cpu": float(usr_cpu),
+        "sys_cpu": float(sys_cpu),
+        "ctx": int(total_ios * 1.1),
+        "majf": 0,
+        "minf": 12,
+    })
+    return job
+
+
+# Top level of a fio JSON document
+def fio_document(jobs, now=None):
+    now = time.time() if now is None else now
+    return {
+        "fio version": "fio-3.36",
+        "timestamp": int(now),
+        "timestamp_ms": int(now * 1000),
+        "time": time.strftime("%a %b %d %H:%M:%S %Y", time.localtime(now)),
+        "global options": {},
+        "jobs": jobs,
+    }
+
+
+# A complete fio JSON document for one job. `iops` is split across the
+# directions the rw pattern uses (rwmixread percent goes to reads).
+def synth_fio_document(rng, iops=50_000, runtime_ms=3000, rw="randread", bs=4096, rwmixread=50,
+                       lat_median_ns=80_000, lat_sigma=0.35, json_plus=False, jobname="test",
+                       job_options=None, now=None):
+    shares = direction_shares(rw, rwmixread)
+    sections = {
+        direction: synth_direction(rng, iops * shares.get(direction, 0.0), runtime_ms, bs,
+                                   lat_median_ns, lat_sigma, json_plus)
+        for direction in ("read", "write", "trim")
+    }
+    options = job_options or {"name": jobname, "rw": rw, "bs": str(bs)}
+    job = job_entry(sections, runtime_ms, jobname, options, rng.uniform(2, 8), rng.uniform(10, 30))
+    return fio_document([job], now)
+
+
+# Per-VF mean IOPS: a spread of VF speeds around base_iops
+def vf_iops(rng, vf_count, base_iops=50_000, spread=0.3):
+    return base_iops * rng.uniform(1 - spread, 1 + spread, vf_count)
+
+
+# Write vf0.json ... vfN.json into directory, returns their paths
+def write_vf_files(directory, vf_count, rng=None, base_iops=50_000, runtime_ms=3000, json_plus=False,
+                   round_id=None):
+    rng = np.random.default_rng() if rng is None else rng
+    paths = []
+    for vf, iops in enumerate(vf_iops(rng, vf_count, base_iops)):
+        document = synth_fio_document(rng, iops, runtime_ms, json_plus=json_plus)
+        if round_id is not None:
+            document["round_id"] = round_id
+        path = os.path.join(directory, f"vf{vf}.json")
+        atomic_write(path, json.dumps(document))
+        paths.append(path)
+    return paths
+
+
+# Sample store records for `rounds` rounds of vf_count VFs, round-major like
+# the runners write them. Vectorized, so long histories are cheap to build.
+def synth_records(vf_count, rounds, interval=3.0, start=None, first_round=0, rng=None, base_iops=50_000):
+    rng = np.random.default_rng() if rng is None else rng
+    start = time.time() - rounds * interval if start is None else start
+    means = vf_iops(rng, vf_count, base_iops)
+    records = np.zeros(rounds * vf_count, dtype=SAMPLE_DTYPE)
+    round_index = np.repeat(np.arange(rounds), vf_count)
+    vf = np.tile(np.arange(vf_count), rounds)
+    iops = np.maximum(rng.normal(means[vf], means[vf] * 0.05), 0)
+    records["ts"] = start + round_index * interval + rng.uniform(0, interval * 0.1, len(records))
+    records["round_id"] = first_round + round_index
+    records["vf"] = vf
+    records["runtime_ms"] = int(interval * 1000)
+    records["total_ios"] = (iops * interval).astype(np.uint64)
+    records["iops"] = iops
+    records["bw_bytes"] = iops * 4096
+    records["lat_mean_ns"] = rng.lognormal(np.log(80_000), 0.1, len(records))
+    records["clat_p99_ns"] = records["lat_mean_ns"] * 2.5
+    read = records["read"]
+    for field in ("total_ios", "iops", "bw_bytes", "lat_mean_ns"):
+        read[field] = records[field]
+    read["clat_pct_ns"] = records["lat_mean_ns"][:, None] * np.array([0.9, 2.5, 4.0, 6.0])
+    return records
+
+
+# Append a synthetic history to the sample store at path
+def write_sample_store(path, vf_count, rounds, interval=3.0, rng=None, base_iops=50_000):
+    store = SampleStore(path)
+    try:
+        store.append(synth_records(vf_count, rounds, interval, rng=rng, base_iops=base_iops))
+    finally:
+        store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic fio results for testing the dashboard")
+    parser.add_argument("--vfs", type=int, default=4, help="number of VFs")
+    parser.add_argument("--rounds", type=int, default=0, help="history rounds to write to the sample store")
+    parser.add_argument("--dir", default=".", help="output directory")
+    parser.add_argument("--iops", type=float, default=50_000, help="mean IOPS per VF")
+    parser.add_argument("--interval", type=float, default=3.0, help="seconds between history rounds")
+    parser.add_argument("--json-plus", action="store_true", help="include clat_ns latency bins")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+    rng = np.random.default_rng(args.seed)
+    write_vf_files(args.dir, args.vfs, rng, args.iops, json_plus=args.json_plus)
+    print(f"✅ Wrote {args.vfs} vfN.json files to {args.dir}")
+    if args.rounds:
+        write_sample_store(os.path.join(args.dir, DEFAULT_STORE_PATH), args.vfs, args.rounds, args.interval,
+                           rng, args.iops)
+        print(f"✅ Appended {args.rounds} rounds of history to {DEFAULT_STORE_PATH}")
+
+
+if __name__ == "__main__":
+    main()
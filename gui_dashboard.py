@@ -1,17 +1,35 @@
 import os
-import json
+
+import numpy as np
 import pandas as pd
-import plotly.graph_objects as go
 import streamlit as st
-from streamlit_autorefresh import st_autorefresh
 from datetime import datetime
 
+from aggregator import API_HOST, API_PORT, cluster_status
+from anomaly import default_sinks
+from collector import Collector
+from dashboard_figures import (build_bar_figure, build_cluster_figure, build_cluster_trend_figure,
+                               cluster_node_frame, cluster_vf_frame, build_heatmap_figure, build_latency_figure, build_pie_figure,
+                               build_fairness_figure, build_trend_figure, busiest_direction, events_frame,
+                               fairness_frame, latency_frame, raw_data_frame, trend_groups)
+from fio_ingest import DIRECTIONS, PERCENTILES
+from live_updates import UPDATES_PORT, listener_failed, start_update_server, update_listener
+from metrics_exporter import MetricsExporter, start_exporter
+from rollup import tier_label
+from sample_store import DEFAULT_STORE_PATH
+from stats_engine import STAT_WINDOWS, select_rates
+from trend_stream import TrendStream
+
 # Constants
-VF_COUNT = 4
-VF_FILES = [f'vf{i}.json' for i in range(VF_COUNT)]
-MAX_HISTORY = 1000
+MAX_HISTORY = 100_000  # Raw samples kept, older history is served from the rollup tiers
+TREND_POINTS = 1000  # Latest samples in each snapshot (heatmap, live trend updates)
 COLORS = ['#081075', '#801d0b', '#08a608', '#f2dc49']
-DARK_COLORS = ['#081075', '#801d0b', '#08a608', '#f2dc49']
+DEFAULT_AGGREGATOR = f"{API_HOST}:{API_PORT}"
+VIEWS = ["Bar Chart", "Trend View", "Pie Chart", "Heatmap", "Latency", "Fairness", "Alerts", "Cluster"]  # Only the selected one is built
+# Averages the average mode can show: label -> (stats kind, window seconds, card caption)
+AVERAGES = {"Since start": ("cumulative", None, "Since session start")}
+AVERAGES.update({f"Last {tier_label(w)}": ("window", w, f"Last {tier_label(w)}, I/O-weighted") for w in STAT_WINDOWS})
+AVERAGES.update({f"EWMA {tier_label(w)}": ("ewma", w, f"EWMA, {tier_label(w)} time constant") for w in STAT_WINDOWS})
 
 # 🎨 Dark Theme Page Setup
 st.set_page_config(
@@ -86,9 +104,17 @@ with st.sidebar:
         </div>
     """, unsafe_allow_html=True)
 
-    refresh_rate = st.slider("🔄 Refresh rate (seconds)", 1, 10, 3)
+    refresh_rate = st.slider("🔄 Refresh rate (seconds)", 1, 10, 3,
+                             help="New fio results are shown as soon as they land where inotify is available; "
+                                  "otherwise, and for the Cluster view, the page refreshes at this rate")
     show_raw_data = st.checkbox("📝 Show raw data", False)
     show_avg_data = st.toggle("📊 Show Average Data (vs Current)", value=True)
+    average = st.selectbox("📐 Average over", list(AVERAGES), disabled=not show_avg_data,
+                           help="I/Os completed over seconds of runtime: since start, over a sliding window, "
+                                "or exponentially weighted")
+    top_n = st.slider("🔝 VFs drawn individually (rest grouped as Others)", 1, 32, 8)
+    aggregator = st.text_input("🌐 Cluster aggregator API", os.environ.get("VF_AGGREGATOR", DEFAULT_AGGREGATOR),
+                               help="host:port of `aggregator.py serve`, shown in the Cluster view")
 
     st.markdown("---")
     st.markdown("""
@@ -98,256 +124,299 @@ with st.sidebar:
         </div>
     """.format(datetime.now().strftime("%Y-%m-%d %H:%M:%S")), unsafe_allow_html=True)
 
-# Initialize state
-if "total_iops" not in st.session_state:
-    st.session_state.total_iops = [0.0] * VF_COUNT
-if "samples" not in st.session_state:
-    st.session_state.samples = [0] * VF_COUNT
-if "avg_history" not in st.session_state:
-    st.session_state.avg_history = []
-if "timestamps" not in st.session_state:
-    st.session_state.timestamps = []
-if "last_valid_iops" not in st.session_state:
-    st.session_state.last_valid_iops = [0.0] * VF_COUNT
-if "data_valid" not in st.session_state:
-    st.session_state.data_valid = [False] * VF_COUNT
-
-# Trigger auto-refresh
-st_autorefresh(interval=refresh_rate * 1000, key="datarefresh")
-
-
-# Safe division function
-def safe_divide(numerator, denominator):
-    return numerator / denominator if denominator != 0 else 0
-
-
-# IOPS file reader with enhanced error handling and last valid value tracking
-def read_iops(file_path, vf_index):
+
+# One collector per server process ingests the fio results for every
+# session; sessions only render the snapshots it publishes
+@st.cache_resource
+def get_collector():
+    collector = Collector(store_path=DEFAULT_STORE_PATH, history_capacity=MAX_HISTORY,
+                          snapshot_points=TREND_POINTS, event_sinks=default_sinks())
+    collector.poll()
+    collector.start()
+    # VF_METRICS_PORT also serves the collector's state to Prometheus
+    if os.environ.get("VF_METRICS_PORT"):
+        start_exporter(MetricsExporter(collector), port=int(os.environ["VF_METRICS_PORT"]))
+    return collector
+
+
+# Long-poll server pushing new snapshot versions to the pages, shared by
+# every session. None without inotify (the collector polls anyway) or when
+# the port is taken; pages then refresh on the timer.
+@st.cache_resource
+def get_update_server():
+    if not get_collector().watching:
+        return None
     try:
-        if not os.path.exists(file_path):
-            st.warning(f"⚠️ {file_path} does not exist")
-            return None
-        if os.path.getsize(file_path) == 0:
-            #st.warning(f"⚠️ {file_path} is empty")
-            print(f"⚠️ {file_path} is empty")
-            return None
-
-        with open(file_path) as f:
-            data = json.load(f)
-            if 'jobs' in data:
-                iops = data['jobs'][0]['read']['iops']
-            elif 'iops' in data:
-                iops = data['iops']
-            elif 'read' in data:
-                iops = data['read']['iops']
-            else:
-                st.warning(f"⚠️ No 'jobs', 'iops', or 'read' key found in {file_path}")
-                return None
-
-            if iops > 0:  # Only update last valid if we got a positive value
-                st.session_state.last_valid_iops[vf_index] = iops
-                st.session_state.data_valid[vf_index] = True
-            return iops
-
-    except Exception as e:
-        st.warning(f"⚠️ Error reading {file_path}: {str(e)}")
+        return start_update_server(get_collector(), port=int(os.environ.get("VF_UPDATES_PORT", UPDATES_PORT)))
+    except OSError as e:
+        print(f"⚠️ No live updates ({e}), refreshing on a timer")
         return None
 
 
-# Read current IOPS - returns None for invalid reads
-current_iops = []
-for i, f in enumerate(VF_FILES):
-    iops = read_iops(f, i)
-    if iops is not None:
-        current_iops.append(iops)
+# Initialize state
+if "figures" not in st.session_state:
+    st.session_state.figures = {}
+if "trend_stream" not in st.session_state:
+    st.session_state.trend_stream = TrendStream()
+if "events_seen" not in st.session_state:
+    st.session_state.events_seen = None
+
+
+# Figure of one view, only rebuilt when a new round arrived or the view
+# options changed; refreshes without new data just re-send the cached one
+def cached_figure(name, snapshot, build):
+    figure_key = (snapshot.version, show_avg_data, average, top_n)
+    cached = st.session_state.figures.get(name)
+    if cached is None or cached[0] != figure_key:
+        cached = (figure_key, build())
+        st.session_state.figures[name] = cached
+    return cached[1]
+
+
+# Average IOPS per VF as chosen in the sidebar, zero where a VF had no I/O
+def average_iops(snapshot):
+    kind, window, _ = AVERAGES[average]
+    if kind == "cumulative":
+        return snapshot.avg_iops
+    return np.nan_to_num(select_rates(snapshot.stats, kind, window).iops)
+
+
+def metric_cards(snapshot):
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.markdown(f"""
+            <div class="metric-card" style="padding: 10px; margin: 5px;">
+                <h4 style="color:#4A90E2; font-size:1.2rem; margin-bottom: 0.5rem;">Total Current IOPS</h4>
+                <h2 style="color:#4A90E2; font-size:2.5rem;margin: 0;">{sum(snapshot.current_iops):,.0f}</h2>
+                <p style="color:#B0B0B0; font-size:0.9rem; margin: 0;">Across all VFs</p>
+            </div>
+        """, unsafe_allow_html=True)
+
+    with col2:
+        st.markdown(f"""
+            <div class="metric-card" style="padding: 10px; margin: 5px;">
+                <h4 style="color:#00CC96; font-size:1.2rem; margin-bottom: 0.5rem;">Average Total IOPS</h4>
+                <h2 style="color:#00CC96; font-size:2rem; margin: 0;">{average_iops(snapshot).sum():,.0f}</h2>
+                <p style="color:#B0B0B0; font-size:0.9rem; margin: 0;">{AVERAGES[average][2]}</p>
+            </div>
+        """, unsafe_allow_html=True)
+
+    with col3:
+        st.markdown(f"""
+            <div class="metric-card" style="padding: 10px; margin: 5px;">
+                <h4 style="color:#AB63FA; font-size:1.2rem; margin-bottom: 0.5rem;">Active VFs</h4>
+                <h2 style="color:#AB63FA; font-size:2rem; margin: 0;">{snapshot.vf_count}</h2>
+                <p style="color:#B0B0B0; font-size:0.9rem; margin: 0;">Monitored instances</p>
+            </div>
+        """, unsafe_allow_html=True)
+
+
+def latency_view(snapshot):
+    latency = snapshot.latency
+    d = busiest_direction(latency)
+    if d is not None:
+        # Percentiles of the merged histograms - never averages of percentiles
+        st.markdown(f"**{DIRECTIONS[d].capitalize()} completion latency, all VFs merged**")
+        cols = st.columns(len(latency["percentiles"]))
+        for col, p, total, recent in zip(cols, latency["percentiles"],
+                                         latency["all_total"][d], latency["all_latest"][d]):
+            col.metric(f"p{p:g}", f"{total / 1000:,.1f} µs", f"{(recent - total) / 1000:+,.1f} µs latest round",
+                       delta_color="inverse")
+        st.plotly_chart(cached_figure("latency", snapshot, lambda: build_latency_figure(snapshot)),
+                        use_container_width=True)
+
+        st.dataframe(latency_frame(snapshot, d), use_container_width=True, hide_index=True)
     else:
-        # Use last valid value if available, otherwise skip
-        if st.session_state.data_valid[i]:
-            current_iops.append(st.session_state.last_valid_iops[i])
+        # Plain json results: fio's own per-VF percentiles, which can't be merged
+        rows = []
+        for label, metrics in zip(snapshot.vf_labels, snapshot.latest_metrics):
+            if metrics is None or not metrics["read"]["clat_percentiles"]:
+                continue
+            row = {"VF": label}
+            for p in PERCENTILES:
+                row[f"p{p:g} (µs)"] = metrics["read"]["clat_percentiles"].get(p, np.nan) / 1000
+            rows.append(row)
+        if rows:
+            st.info("Per-VF read percentiles of the latest round as reported by fio. "
+                    "Run fio with --output-format=json+ for exact percentiles merged across VFs and rounds.")
+            st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
         else:
-            current_iops.append(0.0)  # Fallback to 0 if no valid data yet
-
-# Only update running totals if we have valid data for all VFs
-if all(st.session_state.data_valid):
-    for i in range(VF_COUNT):
-        st.session_state.total_iops[i] += current_iops[i]
-        st.session_state.samples[i] += 1
-
-# Compute averages with safe division
-avg_iops = [
-    safe_divide(st.session_state.total_iops[i], st.session_state.samples[i])
-    for i in range(VF_COUNT)
-]
-
-# Append to history only if we have valid data
-if any(iops > 0 for iops in current_iops):
-    st.session_state.avg_history.append(avg_iops)
-    st.session_state.timestamps.append(datetime.now().strftime("%H:%M:%S"))
-    if len(st.session_state.avg_history) > MAX_HISTORY:
-        st.session_state.avg_history.pop(0)
-        st.session_state.timestamps.pop(0)
-
-# Prepare DataFrames with safe percentage calculation
-vf_labels = [f"VF{i}" for i in range(VF_COUNT)]
-total_avg_iops = sum(avg_iops)
-
-# Calculate percentages safely - only if we have valid data
-if total_avg_iops > 0:
-    percentages = [safe_divide(iops, total_avg_iops) * 100 for iops in avg_iops]
-else:
-    percentages = [0.0] * VF_COUNT
-
-# Main Metrics Display
-st.markdown("### 📊 Performance Summary")
-col1, col2, col3 = st.columns(3)
-with col1:
-    st.markdown(f"""
-        <div class="metric-card" style="padding: 10px; margin: 5px;">
-            <h4 style="color:#4A90E2;font-size:1.2rem; margin-bottom: 0.5rem;">Current Total IOPS</h4>
-            <h2 style="color:#4A90E2; font-size:2.5rem;margin: 0;">{sum(current_iops):,.0f}</h2>
-            <p style="color:#B0B0B0; font-size:0.9rem; margin: 0;">Across all VFs</p>
-        </div>
-    """, unsafe_allow_html=True)
+            st.warning("No latency data available yet")
+
+
+def format_value(value, spec, suffix=""):
+    if np.isnan(value):
+        return "—"
+    return "∞" if np.isinf(value) else f"{value:{spec}}{suffix}"
+
+
+# Cross-VF fairness: how evenly (or how close to the configured weights) the
+# device shares its IOPS, and how much each VF's latency suffers from the
+# others compared to running alone
+def fairness_view(collector, snapshot):
+    fairness = snapshot.fairness
+    if len(fairness["ts"]) == 0:
+        st.warning("No fairness data available yet")
+        return
+    latest = dict(zip(fairness["metrics"], fairness["series"][-1]))
+    cols = st.columns(4)
+    cols[0].metric("Jain's index", format_value(latest["jain"], ".3f"), help="1 = every VF gets its weighted share, "
+                   "1/n = one VF gets everything")
+    cols[1].metric("Max / min", format_value(latest["max_min"], ",.2f"),
+                   help="Busiest over least busy VF, weight-normalized")
+    cols[2].metric("Off-weight share", format_value(latest["weight_deviation"], ".1%"),
+                   help="IOPS that went to other VFs than the " +
+                        ("configured weights" if fairness["weighted"] else "equal split") + " would give them")
+    cols[3].metric("Worst latency inflation", format_value(latest["inflation_max"], ",.2f", "×"),
+                   help="Mean latency over the VF's solo baseline")
+    if not fairness["solo_configured"].any():
+        st.info("Latency inflation uses baselines learned while a VF ran alone. Run `python fairness.py solo` "
+                "for measured ones; per-VF weights go into `vf_weights.json`.")
+
+    def build():
+        vf_ts, vf_values = collector.fairness_series(TREND_POINTS)
+        return build_fairness_figure(fairness, snapshot.vf_labels, vf_ts, vf_values[:, :, 1], top_n)
+    st.plotly_chart(cached_figure("fairness", snapshot, build), use_container_width=True)
+    st.dataframe(fairness_frame(snapshot), use_container_width=True, hide_index=True)
+
+
+# Pop up anomaly events raised since the previous refresh of this session;
+# the ones already there when it opened are only listed in the Alerts view
+def toast_events(snapshot):
+    seen = st.session_state.events_seen
+    latest = snapshot.events[-1].ts if snapshot.events else 0.0
+    if seen is not None:
+        for event in [e for e in snapshot.events if e.ts > seen][-5:]:
+            st.toast(event.message, icon="✅" if event.cleared else "🚨")
+    st.session_state.events_seen = latest if seen is None else max(seen, latest)
+
+
+def alerts_view(snapshot):
+    if not snapshot.events:
+        st.success("No anomalies detected")
+        return
+    cols = st.columns(2)
+    cols[0].metric("Active alerts", int(snapshot.alerts_active.sum()))
+    cols[1].metric("Events", len(snapshot.events))
+    st.dataframe(events_frame(snapshot), use_container_width=True, hide_index=True)
+
+
+# Cluster-wide view from the aggregator the node agents push to
+def cluster_view(address):
+    cluster = cluster_status(address, timeout=2)
+    if cluster is None:
+        st.info(f"No aggregator answering at {address}. Start one with `python aggregator.py serve` and run "
+                f"`python node_agent.py <aggregator host>` next to the runner on every node.")
+        return
+
+    totals = cluster["totals"]
+    cols = st.columns(4)
+    cols[0].metric("Nodes connected", f"{totals['connected']} / {totals['nodes']}")
+    cols[1].metric("Cluster IOPS", f"{totals['current_iops']:,.0f}")
+    cols[2].metric("Average cluster IOPS", f"{totals['avg_iops']:,.0f}")
+    cols[3].metric("VFs", f"{totals['vfs']}")
+    if not cluster["nodes"]:
+        st.warning("No node agent has connected yet")
+        return
+
+    st.plotly_chart(build_cluster_figure(cluster), use_container_width=True)
+    trend = build_cluster_trend_figure(cluster)
+    if trend is not None:
+        st.plotly_chart(trend, use_container_width=True)
+    st.dataframe(cluster_node_frame(cluster), use_container_width=True, hide_index=True)
+    st.dataframe(cluster_vf_frame(cluster), use_container_width=True, hide_index=True)
+
+
+# Refresh timer of the live view: only needed when new data can't be pushed
+# to this page, or for the Cluster view whose data comes from remote nodes
+update_server = get_update_server()
+event_driven = update_server is not None and st.session_state.get("view") != "Cluster" and not listener_failed()
+
+
+# Only this fragment re-runs, on new data or the refresh timer; styles,
+# header, sidebar and footer around it are sent once per full run. Only the
+# selected view is built, and the trend chart only receives the points
+# added since the previous refresh.
+@st.fragment(run_every=None if event_driven else refresh_rate)
+def live_view():
+    collector = get_collector()
+    snapshot = collector.snapshot()
+    for message in snapshot.warnings:
+        st.warning(f"⚠️ {message}")
+
+    toast_events(snapshot)
+    metric_cards(snapshot)
 
-with col2:
-    st.markdown(f"""
-        <div class="metric-card" style="padding: 10px; margin: 5px;">
-            <h4 style="color:#00CC96; font-size:1.2rem; margin-bottom: 0.5rem;">Average Total IOPS</h4>
-            <h2 style="color:#00CC96; font-size:2rem; margin: 0;">{total_avg_iops:,.0f}</h2>
-            <p style="color:#B0B0B0; font-size:0.9rem; margin: 0;">Since session start</p>
-        </div>
-    """, unsafe_allow_html=True)
+    # Use average or current data based on toggle
+    display_data = average_iops(snapshot) if show_avg_data else snapshot.current_iops
+
+    st.markdown("### 📈 IOPS Distribution")
+    view = st.segmented_control("View", VIEWS, default=VIEWS[0], key="view",
+                                label_visibility="collapsed") or VIEWS[0]
+    trend = st.session_state.trend_stream
+    if view != "Trend View":
+        trend.forget()
+
+    if view == "Bar Chart":
+        st.plotly_chart(cached_figure("bar", snapshot,
+                                      lambda: build_bar_figure(snapshot, display_data, show_avg_data)),
+                        use_container_width=True)
+    elif view == "Trend View":
+        if len(snapshot.history_ts) == 0:
+            st.warning("No valid historical data available yet")
+        elif trend.render(collector, snapshot, display_data, show_avg_data, top_n):
+            st.caption(trend.description())
+        else:
+            def build():
+                window = collector.trend("avg_iops", trend_groups(display_data, top_n))
+                return build_trend_figure(snapshot, display_data, show_avg_data, top_n, window)
+            st.plotly_chart(cached_figure("trend", snapshot, build), use_container_width=True)
+    elif view == "Pie Chart":
+        fig = cached_figure("pie", snapshot, lambda: build_pie_figure(snapshot, display_data, top_n))
+        if fig is not None:
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.warning("No IOPS data available to display pie chart")
+    elif view == "Heatmap":
+        fig = cached_figure("heatmap", snapshot, lambda: build_heatmap_figure(snapshot, show_avg_data))
+        if fig is not None:
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.warning("No valid historical data available yet")
+    elif view == "Latency":
+        latency_view(snapshot)
+    elif view == "Fairness":
+        fairness_view(collector, snapshot)
+    elif view == "Alerts":
+        alerts_view(snapshot)
+    else:
+        cluster_view(aggregator)
 
-with col3:
-    st.markdown(f"""
-        <div class="metric-card" style="padding: 10px; margin: 5px;">
-            <h4 style="color:#AB63FA; font-size:1.2rem; margin-bottom: 0.5rem;">Active VFs</h4>
-            <h2 style="color:#AB63FA; font-size:2rem; margin: 0;">{VF_COUNT}</h2>
-            <p style="color:#B0B0B0; font-size:0.9rem; margin: 0;">Monitored instances</p>
-        </div>
-    """, unsafe_allow_html=True)
+    # Raw Data Section
+    if show_raw_data:
+        st.markdown("### 📝 Raw Data")
+        st.dataframe(raw_data_frame(snapshot), use_container_width=True)
 
-# Main Visualization Area - Modified to use the toggle
-st.markdown("### 📈 IOPS Distribution")
-tab1, tab2, tab3 = st.tabs(["Bar Chart", "Trend View", "Pie Chart"])
+    st.caption(f"Last update: {datetime.now().strftime('%H:%M:%S')}")
 
-with tab1:
-    fig = go.Figure()
+    # The listener reruns this fragment when a newer snapshot is published.
+    # Entering or leaving the Cluster view, or the listener failing, turns
+    # the refresh timer on or off, which takes one full run.
+    pushed = view != "Cluster" and update_server is not None and update_listener(update_server.server_port,
+                                                                                 snapshot.version)
+    if pushed != event_driven:
+        st.rerun()
 
-    # Use average or current data based on toggle
-    display_data = avg_iops if show_avg_data else current_iops
-
-    for i in range(VF_COUNT):
-        fig.add_trace(go.Bar(
-            x=[vf_labels[i]],
-            y=[display_data[i]],
-            name=vf_labels[i],
-            marker_color=DARK_COLORS[i],
-            text=[f"{display_data[i]:,.0f}<br>({percentages[i]:.1f}%)"] if show_avg_data else [
-                f"{display_data[i]:,.0f}"],
-            textposition='auto',
-            textfont=dict(size=20),
-            hovertemplate=f"<b>{vf_labels[i]}</b><br>{'Avg' if show_avg_data else 'Current'} IOPS: %{{y:,.0f}}<extra></extra>"
-        ))
-
-    fig.update_layout(
-        height=500,
-        template='plotly_dark',
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0)',
-        showlegend=False,
-        margin=dict(t=30, b=30),
-        yaxis_title="IOPS",
-        xaxis_title="Virtual Function",
-        font=dict(color='#E0E0E0')
-    )
-    st.plotly_chart(fig, use_container_width=True)
-
-with tab2:
-    if len(st.session_state.avg_history) > 0:
-        hist_df = pd.DataFrame(
-            st.session_state.avg_history,
-            columns=vf_labels,
-            index=st.session_state.timestamps
-        )
-
-        fig = go.Figure()
-        for i in range(VF_COUNT):
-            fig.add_trace(go.Scatter(
-                x=hist_df.index,
-                y=hist_df[vf_labels[i]],
-                name=vf_labels[i],
-                line=dict(color=DARK_COLORS[i], width=2.5),
-                mode='lines',
-                hovertemplate=f"<b>{vf_labels[i]}</b><br>Avg IOPS: %{{y:,.0f}}<extra></extra>"
-            ))
-
-            # Add current value as a separate trace if showing current data
-            if not show_avg_data:
-                fig.add_trace(go.Scatter(
-                    x=[hist_df.index[-1]],
-                    y=[current_iops[i]],
-                    name=f"{vf_labels[i]} (Current)",
-                    mode='markers',
-                    marker=dict(color=DARK_COLORS[i], size=10),
-                    hovertemplate=f"<b>{vf_labels[i]}</b><br>Current IOPS: %{{y:,.0f}}<extra></extra>"
-                ))
-
-        fig.update_layout(
-            height=500,
-            template='plotly_dark',
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            margin=dict(t=30, b=30),
-            yaxis_title="IOPS",
-            xaxis_title="Time",
-            hovermode="x unified"
-        )
-        st.plotly_chart(fig, use_container_width=True)
-    else:
-        st.warning("No valid historical data available yet")
-
-with tab3:
-    # Determine which data to show
-    pie_data = avg_iops if show_avg_data else current_iops
-    total_pie_data = sum(pie_data)
-
-    if total_pie_data > 0:
-        fig = go.Figure(go.Pie(
-            labels=vf_labels,
-            values=pie_data,
-            marker_colors=DARK_COLORS,
-            textinfo='percent+value',
-            texttemplate='%{label}<br>%{value:,.0f} IOPS<br>(%{percent})',
-            hole=.4
-        ))
-
-        fig.update_layout(
-            height=500,
-            showlegend=False,
-            margin=dict(t=30, b=30),
-            font=dict(color='#E0E0E0')
-        )
-        st.plotly_chart(fig, use_container_width=True)
-    else:
-        st.warning("No IOPS data available to display pie chart")
-
-# Raw Data Section
-if show_raw_data:
-    st.markdown("### 📝 Raw Data")
-    raw_data = {
-        "VF": vf_labels,
-        "Current IOPS": current_iops,
-        "Average IOPS": avg_iops,
-        "Percentage": [f"{p:.1f}%" for p in percentages]
-    }
-    st.dataframe(pd.DataFrame(raw_data), use_container_width=True)
+
+live_view()
 
 # Footer
 st.markdown("---")
 st.markdown("""
     <div style="text-align:center; color:#808080; margin-top:2rem;">
         <small>NVMe Performance Dashboard • Built with Streamlit</small><br>
-        <small>Data refreshes every {} seconds • Last update: {}</small>
+        <small>{}</small>
     </div>
-""".format(refresh_rate, datetime.now().strftime("%H:%M:%S")), unsafe_allow_html=True)
\ No newline at end of file
+""".format("Data updates as fio results land" if event_driven else f"Data refreshes every {refresh_rate} seconds"),
+            unsafe_allow_html=True)
+
@@ -1,79 +1,96 @@
 import streamlit as st
-import subprocess
+import pandas as pd
 import time
+from streamlit_autorefresh import st_autorefresh
+
+from runner_daemon import daemon_status, launch_daemon, send_command
+
+# fio workload this runner starts, see runner_daemon.PROFILES
+PROFILE = "quick"
 
 # Page setup
 st.set_page_config(page_title="FIO Parallel Benchmark Runner")
 
 st.title("🔁 Parallel NVMe VF Benchmark")
-st.markdown("Run FIO benchmarks **in parallel** for all 4 VFs. Use controls below to manage the loop.")
 
-VF_DEVICES = [
-    "/tmp/nvme0n1",
-    "/tmp/nvme0n2",
-    "/tmp/nvme0n3",
-    "/tmp/nvme0n4"
-]
+# fio runs in the background runner daemon; this page only sends control
+# calls and polls its status, so it never blocks and closing it doesn't
+# stop the benchmark.
+status = daemon_status()
+if status is None:
+    st.warning("The fio runner daemon is not running.")
+    if st.button("🛰️ Launch runner daemon"):
+        launch_daemon(PROFILE)
+        with st.spinner("Waiting for the runner daemon..."):
+            for _ in range(20):
+                time.sleep(0.25)
+                if daemon_status() is not None:
+                    break
+        st.rerun()
+    st.stop()
+
+st.markdown(f"Run FIO benchmarks **in parallel** for all {len(status['devices'])} VFs. Use controls below to manage the loop.")
 
-# Control state
-if "running" not in st.session_state:
-    st.session_state.running = False
-if "paused" not in st.session_state:
-    st.session_state.paused = False
+streaming = st.toggle("📡 Streaming mode (one long-running fio per VF, per-second samples)",
+                      value=status["mode"] == "stream", disabled=status["state"] != "idle")
 
-col1, col2, col3 = st.columns(3)
+# Send one control call and show the answer right away
+def control(command, **params):
+    global status
+    try:
+        status = send_command(command, **params)
+    except RuntimeError as e:
+        st.error(f"❌ {command} failed: {e}")
+
+col1, col2, col3, col4 = st.columns(4)
 
 with col1:
     if st.button("▶️ Start Testing"):
-        st.session_state.running = True
-        st.session_state.paused = False
+        control("start", mode="stream" if streaming else "rounds", profile=PROFILE)
 
 with col2:
-    if st.button("⏸️ Suspend"):
-        st.session_state.paused = True
+    if st.button("⏸️ Suspend", disabled=not status.get("pausable", True),
+                 help=None if status.get("pausable", True) else "fio runs through sudo; run the daemon as root"):
+        control("pause")
 
 with col3:
     if st.button("⏯️ Resume"):
-        st.session_state.paused = False
-
-status = st.empty()
-
-def run_fio_parallel():
-    processes = []
-    for idx, dev in enumerate(VF_DEVICES):
-        output_file = f"vf{idx}.json"
-        fio_cmd = [
-            "fio",
-            "--name=test",
-            f"--filename={dev}",
-            "--rw=randread",
-            "--bs=4k",
-            "--iodepth=32",
-            "--runtime=3",
-            "--time_based",
-            "--numjobs=1",
-            "--group_reporting",
-            "--size=1G",
-            "--output-format=json",
-            f"--output={output_file}"
-        ]
-        p = subprocess.Popen(fio_cmd)
-        processes.append(p)
-
-    # Wait for all FIO processes to complete
-    for p in processes:
-        p.wait()
-
-# Main loop
-if st.session_state.running:
-    while True:
-        if st.session_state.paused:
-            status.info("⏸️ Paused... waiting")
-            time.sleep(2)
-            continue
-
-        status.info("🚀 Running FIO on all VFs in parallel...")
-        run_fio_parallel()
-        status.success("✅ Completed one round of parallel FIO")
-
-        time.sleep(3)
+        control("resume")
+
+with col4:
+    if st.button("⏹️ Stop"):
+        control("stop")
+
+state = status["state"]
+if state == "running" and status["mode"] == "stream":
+    st.info(f"📡 Streaming FIO on all VFs... {status['stream_samples']} interval samples so far")
+elif state == "running":
+    st.info(f"🚀 Running FIO on all VFs in parallel... {status['jobs_done']} jobs done, {status['failures']} failed")
+elif state == "paused":
+    st.info(f"⏸️ Paused, {len(status['live_pids'])} fio processes frozen")
+elif state == "stopping":
+    st.info("⏹️ Stopping...")
+else:
+    st.info("💤 Idle")
+
+if status["last_error"]:
+    st.error(f"❌ {status['last_error']}")
+
+# Latest job per VF
+if status["recent"]:
+    latest = {}
+    for result in status["recent"]:
+        latest[result["vf"]] = result
+    rows = [{
+        "VF": f"VF{vf}",
+        "Device": result["device"],
+        "Round": result["round_id"],
+        "Attempts": result["attempts"],
+        "Elapsed (s)": result["elapsed"],
+        "Status": f"⚠️ {result['error']}" if result["error"] else "✅ ok",
+        "Finished": time.strftime("%H:%M:%S", time.localtime(result["finished_at"])),
+    } for vf, result in sorted(latest.items())]
+    st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
+# Poll the daemon for fresh status
+st_autorefresh(interval=2000, key="runner_status")
@@ -0,0 +1,108 @@
+import numpy as np
+
+
+# Fixed-capacity, preallocated history of per-VF metric samples.
+#
+# Storage is laid out as columns: a timestamp per sample plus a
+# (sample, vf, metric) value block. Every sample is written twice, at slot i
+# and at slot i + capacity, so the latest n samples are always one
+# contiguous slice. Appends are O(batch) and windows are NumPy views, never
+# copies, no matter how large the capacity is.
+class HistoryRing:
+    def __init__(self, capacity, vf_count, metrics=("avg_iops",), dtype=np.float64):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.vf_count = vf_count
+        self.metrics = tuple(metrics)
+        self._ts = np.zeros(2 * capacity, dtype=np.float64)
+        self._values = np.zeros((2 * capacity, vf_count, len(self.metrics)), dtype=dtype)
+        self._head = 0
+        self._size = 0
+        self.total_appended = 0
+
+    def __len__(self):
+        return self._size
+
+    # Index of a metric name in the value block
+    def metric_index(self, metric):
+        return self.metrics.index(metric)
+
+    # Append one sample or a batch of samples.
+    # ts is a scalar or an (n,) array, values has shape (vf_count, metrics)
+    # for one sample or (n, vf_count, metrics) for a batch. A single-metric
+    # ring also accepts plain per-VF vectors.
+    def append(self, ts, values):
+        ts = np.atleast_1d(np.asarray(ts, dtype=np.float64))
+        n = len(ts)
+        values = np.asarray(values, dtype=self._values.dtype).reshape(
+            n, self.vf_count, len(self.metrics))
+
+        # Only the newest `capacity` samples of an oversized batch survive
+        if n > self.capacity:
+            ts = ts[-self.capacity:]
+            values = values[-self.capacity:]
+            self.total_appended += n - self.capacity
+            n = self.capacity
+
+        slots = (self._head + np.arange(n)) % self.capacity
+        self._ts[slots] = ts
+        self._ts[slots + self.capacity] = ts
+        self._values[slots] = values
+        self._values[slots + self.capacity] = values
+
+        self._head = (self._head + n) % self.capacity
+        self._size = min(self._size + n, self.capacity)
+        self.total_appended += n
+
+    # Slice of the backing arrays that holds the latest n samples in order
+    def _span(self, n):
+        n = self._size if n is None else max(0, min(n, self._size))
+        end = self._head if self._head >= n else self._head + self.capacity
+        return slice(end - n, end)
+
+    # Latest n samples (all by default), oldest first, as (ts, values) views
+    def window(self, n=None):
+        span = self._span(n)
+        return self._ts[span], self._values[span]
+
+    # Samples with a timestamp >= since, assuming timestamps were appended in order
+    def window_since(self, since):
+        ts, values = self.window()
+        start = np.searchsorted(ts, since, side="left")
+        return ts[start:], values[start:]
+
+    # (ts, per-VF series) view of one metric over the latest n samples
+    def series(self, metric, n=None):
+        ts, values = self.window(n)
+        return ts, values[:, :, self.metric_index(metric)]
+
+    # Most recent sample as (ts, values), or None when empty
+    def last(self):
+        if self._size == 0:
+            return None
+        ts, values = self.window(1)
+        return ts[0], values[0]
+
+    # Bytes held by the backing arrays
+    def nbytes(self):
+        return self._ts.nbytes + self._values.nbytes
+
+    # Copy of this ring with room for a different number of VFs (and
+    # optionally a different capacity). The newest samples are kept; VFs that
+    # didn't exist yet read as zero.
+    def resized(self, vf_count, capacity=None):
+        capacity = self.capacity if capacity is None else capacity
+        ring = HistoryRing(capacity, vf_count, self.metrics, self._values.dtype)
+        ts, values = self.window(capacity)
+        keep = min(vf_count, self.vf_count)
+        padded = np.zeros((len(ts), vf_count, len(self.metrics)), dtype=values.dtype)
+        padded[:, :keep] = values[:, :keep]
+        if len(ts):
+            ring.append(ts, padded)
+        ring.total_appended = self.total_appended
+        return ring
+
+    def clear(self):
+        self._head = 0
+        self._size = 0
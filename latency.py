@@ -0,0 +1,133 @@
+import numpy as np
+
+from fio_ingest import DIRECTIONS
+
+# fio's latency histogram layout (stat.h): 29 groups of 64 buckets, where
+# every group doubles the bucket width. json+ output reports each non-empty
+# bucket keyed by its representative value in ns.
+FIO_IO_U_PLAT_BITS = 6
+FIO_IO_U_PLAT_VAL = 1 << FIO_IO_U_PLAT_BITS
+FIO_IO_U_PLAT_GROUP_NR = 29
+FIO_IO_U_PLAT_NR = FIO_IO_U_PLAT_GROUP_NR * FIO_IO_U_PLAT_VAL
+
+# Percentiles reported by the latency engine
+TAIL_PERCENTILES = (50.0, 99.0, 99.9, 99.99)
+
+
+# Vectorized port of fio's plat_idx_to_val(): the value fio prints for each
+# bucket index (the middle of the bucket, truncated to an integer)
+def _bucket_values():
+    idx = np.arange(FIO_IO_U_PLAT_NR, dtype=np.int64)
+    error_bits = np.maximum((idx >> FIO_IO_U_PLAT_BITS) - 1, 0)
+    base = np.left_shift(1, error_bits + FIO_IO_U_PLAT_BITS, dtype=np.int64)
+    k = idx % FIO_IO_U_PLAT_VAL
+    values = (base + (k + 0.5) * np.left_shift(1, error_bits, dtype=np.int64)).astype(np.int64)
+    return np.where(idx < (FIO_IO_U_PLAT_VAL << 1), idx, values)
+
+
+BUCKET_VALUES_NS = _bucket_values()
+
+# Upper bound of each group of FIO_IO_U_PLAT_VAL buckets in ns
+GROUP_UPPER_NS = np.left_shift(1, np.arange(FIO_IO_U_PLAT_GROUP_NR, dtype=np.int64) + FIO_IO_U_PLAT_BITS)
+
+
+# Dense bucket counts from a json+ "bins" mapping of {value_ns: count}
+def bins_to_counts(bins):
+    counts = np.zeros(FIO_IO_U_PLAT_NR, dtype=np.int64)
+    if not bins:
+        return counts
+    values = np.fromiter((int(v) for v in bins.keys()), dtype=np.int64, count=len(bins))
+    hits = np.fromiter(bins.values(), dtype=np.int64, count=len(bins))
+    # Values that don't sit exactly on a bucket land in the bucket below them
+    idx = np.searchsorted(BUCKET_VALUES_NS, values, side="right") - 1
+    np.add.at(counts, np.clip(idx, 0, FIO_IO_U_PLAT_NR - 1), hits)
+    return counts
+
+
+# Percentiles from bucket counts, computed the way fio does: the first bucket
+# whose cumulative count reaches p% of the total. Works on any number of
+# leading dimensions, returns ns with NaN where there are no samples.
+def percentiles_from_counts(counts, percentiles=TAIL_PERCENTILES):
+    counts = np.asarray(counts)
+    cumulative = np.cumsum(counts, axis=-1)
+    total = cumulative[..., -1:]
+    targets = total * (np.asarray(percentiles, dtype=np.float64) / 100.0)
+    idx = (cumulative[..., :, None] < targets[..., None, :]).sum(axis=-2)
+    values = BUCKET_VALUES_NS[np.minimum(idx, FIO_IO_U_PLAT_NR - 1)].astype(np.float64)
+    return np.where(total > 0, values, np.nan)
+
+
+# Exact latency percentiles across VFs and rounds.
+#
+# Percentiles can't be averaged, but fio's bucket counts add up. The engine
+# keeps, per VF and direction, the clat histogram of the latest round and the
+# sum over all rounds, so merging across VFs or over time is a vectorized sum
+# followed by one percentile lookup. Streaming fio reports cumulative
+# histograms; for those only the growth since the previous report of the same
+# stream is added.
+class LatencyEngine:
+    def __init__(self, vf_count):
+        self.vf_count = 0
+        self.total = np.zeros((0, len(DIRECTIONS), FIO_IO_U_PLAT_NR), dtype=np.int64)
+        self.latest = np.zeros_like(self.total)
+        self.has_bins = np.zeros(0, dtype=bool)
+        self._streams = []
+        self.resize(vf_count)
+
+    def resize(self, vf_count):
+        grow = vf_count - self.vf_count
+        if grow <= 0:
+            return
+        pad = np.zeros((grow, len(DIRECTIONS), FIO_IO_U_PLAT_NR), dtype=np.int64)
+        self.total = np.concatenate([self.total, pad])
+        self.latest = np.concatenate([self.latest, pad])
+        self.has_bins = np.concatenate([self.has_bins, np.zeros(grow, dtype=bool)])
+        self._streams += [(None, None)] * grow
+        self.vf_count = vf_count
+
+    # Fold one new fio result for a VF in. Returns False when the result
+    # carries no json+ bins.
+    def update(self, vf, metrics):
+        if all(metrics[d]["clat_bins"] is None for d in DIRECTIONS):
+            return False
+        counts = np.stack([bins_to_counts(metrics[d]["clat_bins"]) for d in DIRECTIONS])
+
+        stream_id = metrics.get("stream_id")
+        if stream_id is not None:
+            previous_id, previous = self._streams[vf]
+            self._streams[vf] = (stream_id, counts)
+            if previous_id == stream_id:
+                counts = np.maximum(counts - previous, 0)
+
+        self.latest[vf] = counts
+        self.total[vf] += counts
+        self.has_bins[vf] = True
+        return True
+
+    # Counts over all rounds per fio bucket group, (vf, direction, group),
+    # and the latency sums they stand for in ns, (vf, direction), taken at
+    # the bucket values. fio's buckets double in width every group, so group
+    # g holds exactly the latencies below 2**(g + 6) ns (GROUP_UPPER_NS).
+    def group_counts(self):
+        groups = self.total.reshape(self.vf_count, len(DIRECTIONS), FIO_IO_U_PLAT_GROUP_NR, FIO_IO_U_PLAT_VAL)
+        return groups.sum(axis=-1), self.total @ BUCKET_VALUES_NS.astype(np.float64)
+
+    # Percentile tables, all in ns:
+    #   vf_total  (vf, direction, P)  per VF over all rounds
+    #   vf_latest (vf, direction, P)  per VF, latest round
+    #   all_total (direction, P)      every VF merged over all rounds
+    #   all_latest (direction, P)     every VF merged, latest round of each
+    # plus the merged histograms for plotting the distribution.
+    def summary(self, percentiles=TAIL_PERCENTILES):
+        merged_total = self.total.sum(axis=0)
+        merged_latest = self.latest.sum(axis=0)
+        return {
+            "percentiles": tuple(percentiles),
+            "has_bins": self.has_bins.copy(),
+            "vf_total": percentiles_from_counts(self.total, percentiles),
+            "vf_latest": percentiles_from_counts(self.latest, percentiles),
+            "all_total": percentiles_from_counts(merged_total, percentiles),
+            "all_latest": percentiles_from_counts(merged_latest, percentiles),
+            "merged_total_counts": merged_total,
+            "samples": self.total.sum(axis=-1),
+        }
@@ -0,0 +1,165 @@
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+from fio_publish import atomic_write
+
+# Long-poll endpoint the browsers wait on. It has to be reachable from
+# wherever the dashboard is opened, like Streamlit's own port, and only
+# ever tells snapshot version numbers.
+UPDATES_HOST = "0.0.0.0"
+UPDATES_PORT = 9753
+
+# Longest a request is held before the browser asks again
+LONG_POLL_SECONDS = 25
+
+# Bump whenever _INDEX_HTML changes so browsers never mix old and new code
+COMPONENT_VERSION = 1
+
+# Zero-height component holding one long-poll request to the update server.
+# When the collector publishes a snapshot newer than the one on the page it
+# sets its component value, which reruns only the fragment it sits in.
+# After a few failed requests in a row (port blocked, https page) it
+# reports failure and the page goes back to its refresh timer.
+_INDEX_HTML = """<!doctype html>
+<html>
+<head><meta charset="utf-8"></head>
+<body>
+<script>
+const RETRY_MS = 2000;
+const MAX_FAILURES = 3;
+let shown = null;
+let url = null;
+let polling = false;
+
+function send(type, data) {
+  window.parent.postMessage(Object.assign({isStreamlitMessage: true, type: type}, data), "*");
+}
+
+function tell(value) {
+  send("streamlit:setComponentValue", {value: value, dataType: "json"});
+}
+
+async function poll() {
+  let failures = 0;
+  while (failures < MAX_FAILURES) {
+    try {
+      const response = await fetch(url + "?version=" + shown, {cache: "no-store"});
+      const data = await response.json();
+      failures = 0;
+      if (data.version !== shown) {
+        shown = data.version;
+        tell({version: shown});
+      }
+    } catch (error) {
+      failures += 1;
+      await new Promise((resolve) => setTimeout(resolve, RETRY_MS));
+    }
+  }
+  tell({failed: true});
+}
+
+window.addEventListener("message", (event) => {
+  if (!event.data || event.data.type !== "streamlit:render") {
+    return;
+  }
+  const args = event.data.args;
+  shown = args.version;
+  url = window.location.protocol + "//" + window.location.hostname + ":" + args.port + "/wait";
+  if (!polling) {
+    polling = true;
+    send("streamlit:setFrameHeight", {height: 0});
+    poll();
+  }
+});
+send("streamlit:componentReady", {apiVersion: 1});
+</script>
+</body>
+</html>
+"""
+
+_component = None
+
+
+def _component_dir():
+    directory = os.path.join(tempfile.gettempdir(), f"vf-live-updates-{COMPONENT_VERSION}")
+    index = os.path.join(directory, "index.html")
+    if not os.path.exists(index):
+        os.makedirs(directory, exist_ok=True)
+        atomic_write(index, _INDEX_HTML, fsync=False)
+    return directory
+
+
+def _get_component():
+    global _component
+    if _component is None:
+        _component = components.declare_component("live_updates", path=_component_dir())
+    return _component
+
+
+# GET /wait?version=N answers {"version": ...} as soon as the collector's
+# snapshot version differs from N, or after LONG_POLL_SECONDS
+class UpdateHandler(BaseHTTPRequestHandler):
+    collector = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/wait":
+            self.send_error(404, f"unknown endpoint {url.path}")
+            return
+        try:
+            version = int(parse_qs(url.query).get("version", [""])[0])
+        except ValueError:
+            version = None
+        snapshot = self.collector.wait_for_update(version, LONG_POLL_SECONDS)
+        body = json.dumps({"version": snapshot.version}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Keep the terminal quiet, every open page polls
+    def log_message(self, format, *args):
+        pass
+
+
+# Serve /wait from a background thread; returns the server. Raises OSError
+# when the port is taken.
+def start_update_server(collector, host=UPDATES_HOST, port=UPDATES_PORT):
+    handler = type("Handler", (UpdateHandler,), {"collector": collector})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="live-updates", daemon=True).start()
+    return server
+
+
+# True once the browser reported it can't reach the update server. Kept
+# apart from the component value, which Streamlit drops while the listener
+# isn't drawn, so a page doesn't keep retrying.
+def listener_failed(key="live_updates"):
+    value = st.session_state.get(key)
+    if isinstance(value, dict) and value.get("failed"):
+        st.session_state[f"{key}_failed"] = True
+    return st.session_state.get(f"{key}_failed", False)
+
+
+# Put the listener on the page, inside the fragment that should rerun on
+# new data. Returns False when it can't push to this browser, the caller
+# then refreshes on a timer instead.
+def update_listener(port, version, key="live_updates"):
+    if listener_failed(key):
+        return False
+    try:
+        _get_component()(key=key, default=None, port=port, version=version)
+    except OSError:
+        return False
+    return True
@@ -0,0 +1,268 @@
+import argparse
+import gzip
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from anomaly import EVENT_KINDS
+from collector import Collector
+from fio_ingest import DIRECTIONS
+from latency import GROUP_UPPER_NS
+from runner_daemon import DEFAULT_PORT as RUNNER_PORT, daemon_status
+from sample_store import DEFAULT_STORE_PATH
+
+# Scrape endpoint address; next to the aggregator's 9750 and 9751
+EXPORTER_HOST = "127.0.0.1"
+EXPORTER_PORT = 9752
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Seconds between runner daemon status polls
+RUNNER_POLL_INTERVAL = 5.0
+
+# States a runner daemon reports
+RUNNER_STATES = ("idle", "running", "paused", "stopping")
+
+# Histogram bucket bounds in seconds: fio's bucket groups, each twice as
+# wide as the one before, so the bounds are powers of two with no loss
+LE_SECONDS = GROUP_UPPER_NS / 1e9
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _number(value):
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value) if value != int(value) or abs(value) >= 1e15 else str(int(value))
+
+
+# OpenMetrics text for a collector snapshot and runner status, built as one
+# list of lines
+class _Exposition:
+    def __init__(self):
+        self.lines = []
+
+    def family(self, name, kind, help_text):
+        self.lines += [f"# TYPE {name} {kind}", f"# HELP {name} {help_text}"]
+
+    def sample(self, name, value, labels=""):
+        self.lines.append(f"{name}{labels} {_number(value)}")
+
+    def text(self):
+        return "\n".join(self.lines + ["# EOF"]) + "\n"
+
+
+# OpenMetrics exposition of the collector's state.
+#
+# The text is built from the snapshots the collector already publishes, at
+# most once per snapshot version (and runner status change), and kept ready
+# both plain and gzip-compressed. A scrape only hands out those bytes, so
+# it costs the same whatever the number of VFs or scrapers; nothing is
+# re-parsed. The runner daemon's status is polled in the background.
+class MetricsExporter:
+    def __init__(self, collector, runner_port=RUNNER_PORT):
+        self.collector = collector
+        self.runner_port = runner_port
+        self._runner = None
+        self._runner_version = 0
+        self._key = None
+        self._payload = (b"", b"")
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        if runner_port:
+            threading.Thread(target=self._poll_runner, name="exporter-runner", daemon=True).start()
+
+    def _poll_runner(self):
+        while not self._stop.is_set():
+            status = daemon_status(port=self.runner_port)
+            if status is not None:
+                status.pop("live_pids", None)
+                status.pop("recent", None)
+            if status != self._runner:
+                self._runner = status
+                self._runner_version += 1
+            self._stop.wait(RUNNER_POLL_INTERVAL)
+
+    def stop(self):
+        self._stop.set()
+
+    # (plain, gzip) bytes of the current exposition
+    def payload(self):
+        snapshot = self.collector.snapshot()
+        key = (snapshot.version, self._runner_version)
+        with self._lock:
+            if key != self._key:
+                text = self.render(snapshot, self._runner).encode()
+                self._payload = (text, gzip.compress(text, compresslevel=5))
+                self._key = key
+            return self._payload
+
+    def render(self, snapshot, runner):
+        out = _Exposition()
+        vfs = [str(vf) for vf in range(snapshot.vf_count)]
+
+        out.family("vf_fio_vfs", "gauge", "VFs known to the collector")
+        out.sample("vf_fio_vfs", snapshot.vf_count)
+        out.family("vf_fio_last_update_timestamp_seconds", "gauge", "When the collector last ingested new data")
+        out.sample("vf_fio_last_update_timestamp_seconds", snapshot.updated_at)
+
+        out.family("vf_fio_current_iops", "gauge", "Latest valid IOPS of the VF, all directions")
+        for vf, value in zip(vfs, snapshot.current_iops):
+            out.sample("vf_fio_current_iops", value, _labels(vf=vf))
+        out.family("vf_fio_average_iops", "gauge", "I/O-weighted average IOPS of the VF since collection started")
+        for vf, value in zip(vfs, snapshot.avg_iops):
+            out.sample("vf_fio_average_iops", value, _labels(vf=vf))
+        out.family("vf_fio_rounds", "counter", "fio rounds or stream samples ingested for the VF")
+        for vf, value in zip(vfs, snapshot.samples):
+            out.sample("vf_fio_rounds_total", value, _labels(vf=vf))
+
+        # Latest fio result per direction, for directions that saw any I/O
+        families = (("vf_fio_iops", "IOPS of the latest fio result", "iops", 1),
+                    ("vf_fio_bandwidth_bytes_per_second", "Bandwidth of the latest fio result", "bw_bytes", 1),
+                    ("vf_fio_latency_mean_seconds", "Mean total latency of the latest fio result", "lat_mean_ns",
+                     1e-9))
+        active = [(vf, d, metrics[d]) for vf, metrics in zip(vfs, snapshot.latest_metrics) if metrics is not None
+                  for d in DIRECTIONS if metrics[d]["total_ios"] or metrics[d]["iops"]]
+        for name, help_text, field, scale in families:
+            out.family(name, "gauge", help_text)
+            for vf, direction, metrics in active:
+                out.sample(name, metrics[field] * scale, _labels(vf=vf, direction=direction))
+
+        self._histograms(out, snapshot, vfs)
+        self._fairness(out, snapshot, vfs)
+
+        out.family("vf_fio_alerts_active", "gauge", "Anomaly conditions currently raised, per kind")
+        for kind, count in zip(EVENT_KINDS, snapshot.alerts_active.sum(axis=0)):
+            out.sample("vf_fio_alerts_active", count, _labels(kind=kind))
+
+        self._runner_state(out, runner)
+        return out.text()
+
+    # Completion latency since collection started, from the json+ bins
+    def _histograms(self, out, snapshot, vfs):
+        if not snapshot.latency["has_bins"].any():
+            return
+        counts, sums = self.collector.latency_histograms()
+        cumulative = np.cumsum(counts, axis=-1)
+        name = "vf_fio_completion_latency_seconds"
+        out.family(name, "histogram", "Completion latency from fio's json+ histogram since collection started")
+        bounds = [_number(le) for le in LE_SECONDS]
+        for v, vf in enumerate(vfs[:len(counts)]):
+            for d, direction in enumerate(DIRECTIONS):
+                total = cumulative[v, d, -1]
+                if total == 0:
+                    continue
+                for le, count in zip(bounds, cumulative[v, d]):
+                    out.lines.append(f'{name}_bucket{{vf="{vf}",direction="{direction}",le="{le}"}} {count}')
+                labels = _labels(vf=vf, direction=direction)
+                out.lines.append(f'{name}_bucket{{vf="{vf}",direction="{direction}",le="+Inf"}} {total}')
+                out.sample(f"{name}_count", total, labels)
+                out.sample(f"{name}_sum", sums[v, d] / 1e9, labels)
+
+    def _fairness(self, out, snapshot, vfs):
+        fairness = snapshot.fairness
+        if len(fairness["ts"]) == 0:
+            return
+        latest = dict(zip(fairness["metrics"], fairness["series"][-1]))
+        for name, metric, help_text in (
+                ("vf_fio_fairness_jain_index", "jain", "Jain's fairness index of the weight-normalized IOPS"),
+                ("vf_fio_fairness_max_min_ratio", "max_min", "Largest over smallest weight-normalized IOPS"),
+                ("vf_fio_fairness_weight_deviation_ratio", "weight_deviation",
+                 "Share of the IOPS that went to other VFs than the weights give them")):
+            out.family(name, "gauge", help_text)
+            out.sample(name, latest[metric])
+        out.family("vf_fio_latency_inflation_ratio", "gauge", "Mean latency of the VF over its solo baseline")
+        for vf, value in zip(vfs, fairness["inflation"]):
+            if not np.isnan(value):
+                out.sample("vf_fio_latency_inflation_ratio", value, _labels(vf=vf))
+
+    def _runner_state(self, out, runner):
+        out.family("vf_fio_runner_up", "gauge", "Whether the runner daemon answers")
+        out.sample("vf_fio_runner_up", runner is not None)
+        if runner is None:
+            return
+        out.family("vf_fio_runner_state", "stateset", "State of the runner daemon")
+        for state in RUNNER_STATES:
+            out.sample("vf_fio_runner_state", runner["state"] == state, _labels(vf_fio_runner_state=state))
+        out.family("vf_fio_runner", "info", "Runner daemon mode and profile")
+        out.sample("vf_fio_runner_info", 1, _labels(mode=runner["mode"] or "", profile=runner["profile"] or ""))
+        out.family("vf_fio_runner_jobs", "counter", "fio jobs finished by the runner daemon since it started")
+        out.sample("vf_fio_runner_jobs_total", runner["jobs_done"])
+        out.family("vf_fio_runner_failures", "counter", "fio jobs that failed after every retry")
+        out.sample("vf_fio_runner_failures_total", runner["failures"])
+        out.family("vf_fio_runner_stream_samples", "counter", "Samples the streaming runners appended")
+        out.sample("vf_fio_runner_stream_samples_total", runner["stream_samples"])
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    exporter = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404, f"unknown endpoint {self.path}, scrape /metrics")
+            return
+        plain, compressed = self.exporter.payload()
+        body = compressed if "gzip" in self.headers.get("Accept-Encoding", "") else plain
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        if body is compressed:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Keep the terminal quiet, scrapers call constantly
+    def log_message(self, format, *args):
+        pass
+
+
+# Serve /metrics from a background thread; returns the server
+def start_exporter(exporter, host=EXPORTER_HOST, port=EXPORTER_PORT):
+    handler = type("Handler", (MetricsHandler,), {"exporter": exporter})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenMetrics endpoint for the VF fio results")
+    parser.add_argument("--dir", default=".", help="directory of vfN.json and the sample store")
+    parser.add_argument("--host", default=EXPORTER_HOST, help="address to listen on, 0.0.0.0 for remote scrapers")
+    parser.add_argument("--port", type=int, default=EXPORTER_PORT)
+    parser.add_argument("--runner-port", type=int, default=RUNNER_PORT, help="runner daemon port, 0 to skip it")
+    args = parser.parse_args()
+
+    collector = Collector(store_path=os.path.join(args.dir, DEFAULT_STORE_PATH), result_dir=args.dir,
+                          event_sinks=[])
+    collector.poll()
+    collector.start()
+    exporter = MetricsExporter(collector, args.runner_port)
+    server = start_exporter(exporter, args.host, args.port)
+    print(f"📡 Serving OpenMetrics on http://{args.host}:{args.port}/metrics ({collector.vf_count} VFs)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        exporter.stop()
+        collector.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import argparse
+import asyncio
+import random
+import socket
+import time
+
+from cluster_protocol import (ACK, DEFAULT_PORT, ERROR, HELLO, WELCOME, ProtocolError, decode_ack, decode_json,
+                              encode_batch, encode_json, read_frame)
+from sample_store import DEFAULT_STORE_PATH, SampleReader
+
+# Records per batch, and how long new records wait to fill one
+BATCH_RECORDS = 8192
+BATCH_INTERVAL = 0.5
+
+# Batches sent but not yet acknowledged before the agent stops reading
+WINDOW = 8
+
+# Seconds to connect and be welcomed, and to get an ack with a full window
+CONNECT_TIMEOUT = 10
+ACK_TIMEOUT = 30
+
+# Reconnect backoff bounds in seconds, doubled after every failed attempt
+RECONNECT_MIN = 0.5
+RECONNECT_MAX = 30.0
+
+# Seconds between progress lines
+STATUS_INTERVAL = 60
+
+
+# Ships the local sample store to the aggregator.
+#
+# The store itself is the send buffer: the agent tails it and streams every
+# record in order, so nothing is held in memory and nothing is lost while
+# the aggregator is away. On (re)connect the aggregator says how many of
+# the node's records it already has and the agent resumes right there.
+# At most `window` batches are in flight; a slow aggregator stalls the
+# agent's reads (and TCP's own flow control its writes), never the runner.
+class NodeAgent:
+    def __init__(self, host, port=DEFAULT_PORT, node=None, store_path=DEFAULT_STORE_PATH,
+                 batch_records=BATCH_RECORDS, batch_interval=BATCH_INTERVAL, window=WINDOW):
+        self.host = host
+        self.port = port
+        self.node = node or socket.gethostname()
+        self.batch_records = batch_records
+        self.batch_interval = batch_interval
+        self.window = window
+        self._reader = SampleReader(store_path)
+        self.sent = 0
+        self.acked = 0
+        self.connected = False
+        self.connects = 0
+        self._warned = False
+        self._reported_at = 0.0
+
+    # Run until cancelled, reconnecting with backoff whenever the link drops
+    async def run(self):
+        delay = RECONNECT_MIN
+        while True:
+            try:
+                await self._session()
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ProtocolError) as e:
+                if self.connected:
+                    delay = RECONNECT_MIN
+                # One line per outage, not one per attempt
+                if not self._warned:
+                    self._warned = True
+                    print(f"⚠️ {self.node}: aggregator {self.host}:{self.port} unavailable ({e}), retrying")
+            finally:
+                self.connected = False
+            await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+            delay = min(delay * 2, RECONNECT_MAX)
+
+    def _records(self):
+        return self._reader.records()
+
+    async def _session(self):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), CONNECT_TIMEOUT)
+        acks = None
+        try:
+            records = self._records()
+            version = self._reader.version
+            writer.write(encode_json(HELLO, {"node": self.node, "format_version": version,
+                                             "record_size": self._reader.dtype.itemsize,
+                                             "records": len(records)}))
+            await writer.drain()
+            kind, payload = await asyncio.wait_for(read_frame(reader), CONNECT_TIMEOUT)
+            if kind == ERROR:
+                raise ProtocolError(decode_json(payload).get("error", "rejected"))
+            if kind != WELCOME:
+                raise ProtocolError(f"expected a welcome, got frame type {kind}")
+            self.sent = self.acked = int(decode_json(payload)["offset"])
+            self.connected = True
+            self.connects += 1
+            self._warned = False
+            print(f"🔗 {self.node}: connected to {self.host}:{self.port}, resuming at record {self.sent}")
+
+            acked = asyncio.Event()
+            acks = asyncio.ensure_future(self._read_acks(reader, acked))
+            while True:
+                if self.sent - self.acked >= self.window * self.batch_records:
+                    acked.clear()
+                    if not await self._wait(acks, acked, ACK_TIMEOUT):
+                        raise ProtocolError(f"no ack for {ACK_TIMEOUT}s")
+                    continue
+
+                records = self._records()
+                if self._reader.version != version:
+                    # The store appeared after the hello, in another format
+                    raise ProtocolError("sample store format changed, reconnecting")
+                self._report(len(records))
+                pending = records[self.sent:]
+                if len(pending) == 0:
+                    await self._wait(acks, None, self.batch_interval)
+                    continue
+                batch = pending[:self.batch_records]
+                writer.write(encode_batch(self.sent, batch))
+                await writer.drain()
+                self.sent += len(batch)
+                # A partial batch means the agent caught up: let records accumulate
+                if len(batch) < self.batch_records:
+                    await self._wait(acks, None, self.batch_interval)
+        finally:
+            if acks is not None:
+                acks.cancel()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (OSError, asyncio.CancelledError):
+                pass
+
+    # Sleep up to timeout, waking early when event is set. Raises the ack
+    # reader's error if the connection died meanwhile. Returns False on timeout.
+    async def _wait(self, acks, event, timeout):
+        waiter = asyncio.ensure_future(event.wait()) if event is not None else None
+        try:
+            done, _ = await asyncio.wait([acks] + ([waiter] if waiter else []), timeout=timeout,
+                                         return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if waiter is not None:
+                waiter.cancel()
+        if acks in done:
+            acks.result()
+            raise ProtocolError("aggregator closed the connection")
+        return bool(done)
+
+    async def _read_acks(self, reader, event):
+        while True:
+            kind, payload = await read_frame(reader)
+            if kind == ACK:
+                self.acked = decode_ack(payload)
+                event.set()
+            elif kind == ERROR:
+                raise ProtocolError(decode_json(payload).get("error", "aggregator error"))
+            else:
+                raise ProtocolError(f"unexpected frame type {kind}")
+
+    def _report(self, total):
+        now = time.time()
+        if now - self._reported_at >= STATUS_INTERVAL:
+            self._reported_at = now
+            print(f"📡 {self.node}: {self.acked} records delivered, {total - self.acked} behind")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ship this host's fio samples to a cluster aggregator")
+    parser.add_argument("aggregator", help="aggregator address, host or host:port")
+    parser.add_argument("--node", default=None, help="node name (default: hostname)")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="sample store written by the runner")
+    parser.add_argument("--batch", type=int, default=BATCH_RECORDS, help="records per batch")
+    parser.add_argument("--interval", type=float, default=BATCH_INTERVAL, help="seconds to fill a batch")
+    args = parser.parse_args()
+
+    host, _, port = args.aggregator.rpartition(":") if ":" in args.aggregator else (args.aggregator, "", "")
+    agent = NodeAgent(host, int(port or DEFAULT_PORT), args.node, args.store, args.batch, args.interval)
+    print(f"🛰️ {agent.node}: shipping {args.store} to {agent.host}:{agent.port}")
+    try:
+        asyncio.run(agent.run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import ctypes
+import ctypes.util
+import fnmatch
+import os
+import select
+import struct
+import time
+
+# inotify event bits, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# Header of every event read from the inotify fd: wd, mask, cookie, len
+_EVENT = struct.Struct("iIII")
+
+# Marks a wake-up whose file names were lost to a queue overflow
+OVERFLOW = ""
+
+
+def _inotify():
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+# Wakes whoever waits on it when a result file lands in one of the watched
+# directories, through Linux inotify.
+#
+# Files matching one of `patterns` count once they are complete: closed
+# after writing (fio --output) or renamed into place (atomic_write). Files
+# named in `appended`, such as the sample store that writers keep open,
+# count on every write. Everything else in the directories, temp files and
+# the collector's own events.jsonl included, never wakes anyone.
+class ResultWatcher:
+    def __init__(self, directories, patterns, appended=()):
+        self.patterns = tuple(patterns)
+        self.appended = frozenset(appended)
+        self._libc = _inotify()
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._wake_r, self._wake_w = os.pipe()
+        self._dirs = {}
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | (IN_MODIFY if self.appended else 0)
+        for directory in {os.path.realpath(d or ".") for d in directories}:
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), mask)
+            if wd < 0:
+                self.close()
+                raise OSError(ctypes.get_errno(), f"cannot watch {directory}")
+            self._dirs[wd] = directory
+
+    def _relevant(self, name, mask):
+        if name in self.appended:
+            return True
+        return not mask & IN_MODIFY and any(fnmatch.fnmatchcase(name, p) for p in self.patterns)
+
+    # Names of the relevant files that changed, waiting up to `timeout`
+    # seconds for the first one; empty on timeout or wake(). Events that
+    # arrive together are returned together.
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([self._fd, self._wake_r], [], [], remaining)
+            if self._wake_r in ready:
+                os.read(self._wake_r, 4096)
+                return self._drain() if self._fd in ready else set()
+            if not ready:
+                return set()
+            changed = self._drain()
+            if changed:
+                return changed
+
+    def _drain(self):
+        changed = set()
+        while True:
+            try:
+                buffer = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(buffer):
+                _, mask, _, length = _EVENT.unpack_from(buffer, offset)
+                name = os.fsdecode(buffer[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0"))
+                offset += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    changed.add(OVERFLOW)
+                elif self._relevant(name, mask):
+                    changed.add(name)
+
+    # Make a pending or the next wait() return right away
+    def wake(self):
+        os.write(self._wake_w, b"\0")
+
+    def close(self):
+        for fd in (self._fd, self._wake_r, self._wake_w):
+            if fd >= 0:
+                os.close(fd)
+        self._fd = self._wake_r = self._wake_w = -1
+
+
+# A ResultWatcher, or None where inotify is not available (not Linux, or
+# out of watches) and callers fall back to polling
+def open_watcher(directories, patterns, appended=()):
+    try:
+        return ResultWatcher(directories, patterns, appended)
+    except (OSError, AttributeError) as e:
+        print(f"⚠️ No inotify ({e}), polling for results instead")
+        return None
@@ -0,0 +1,261 @@
+import numpy as np
+
+from history_store import HistoryRing
+
+# Bucket widths of the rollup tiers in seconds
+ROLLUP_TIERS = (1, 10, 60, 600)
+
+# Statistics kept per bucket, VF and metric
+STATS = ("min", "mean", "max")
+
+# Most buckets a tier keeps: a day of 1 s buckets, over a year of 10 min ones
+TIER_CAPACITY = 86_400
+
+# Memory shared by all tiers; with many VFs every tier keeps fewer buckets
+ROLLUP_BUDGET_BYTES = 256 << 20
+
+# A source is only queried when the range holds at most this many samples
+# per requested point, bounding the cost of a query whatever the history length
+SOURCE_POINTS_FACTOR = 4
+
+
+# One resolution of the rolled-up history: fixed-width time buckets holding
+# the min/mean/max of every VF and metric.
+#
+# Closed buckets live in a HistoryRing (one "<metric>_<stat>" column per
+# metric and statistic), the bucket still filling is kept aside and merged
+# into as samples arrive. Samples older than the open bucket are folded
+# into it rather than reopening a closed one.
+class RollupTier:
+    def __init__(self, width, capacity, vf_count, metrics):
+        self.width = width
+        self.vf_count = vf_count
+        self.metrics = tuple(metrics)
+        self._ring = HistoryRing(capacity, vf_count, [f"{m}_{s}" for s in STATS for m in self.metrics])
+        # (bucket id, samples, min, sum, max) of the open bucket
+        self._open = None
+
+    def __len__(self):
+        return len(self._ring) + (self._open is not None)
+
+    # Fold a batch of samples in. ts is (n,), values (n, vf_count, metrics).
+    def add(self, ts, values):
+        ts = np.atleast_1d(np.asarray(ts, dtype=np.float64))
+        if len(ts) == 0:
+            return
+        values = np.asarray(values, dtype=np.float64).reshape(len(ts), self.vf_count, len(self.metrics))
+
+        ids = np.floor(ts / self.width).astype(np.int64)
+        if self._open is not None:
+            ids = np.maximum(ids, self._open[0])
+        ids = np.maximum.accumulate(ids)
+        starts = np.flatnonzero(np.append(True, ids[1:] != ids[:-1]))
+        ids = ids[starts]
+        counts = np.diff(np.append(starts, len(ts)))
+        lows = np.minimum.reduceat(values, starts, axis=0)
+        sums = np.add.reduceat(values, starts, axis=0)
+        highs = np.maximum.reduceat(values, starts, axis=0)
+
+        if self._open is not None:
+            open_id, open_count, open_low, open_sum, open_high = self._open
+            if ids[0] == open_id:
+                counts[0] += open_count
+                lows[0] = np.minimum(lows[0], open_low)
+                sums[0] += open_sum
+                highs[0] = np.maximum(highs[0], open_high)
+            else:
+                ids = np.append(open_id, ids)
+                counts = np.append(open_count, counts)
+                lows = np.concatenate([open_low[None], lows])
+                sums = np.concatenate([open_sum[None], sums])
+                highs = np.concatenate([open_high[None], highs])
+
+        if len(ids) > 1:
+            self._ring.append(ids[:-1] * self.width, self._columns(counts[:-1], lows[:-1], sums[:-1], highs[:-1]))
+        self._open = (ids[-1], counts[-1], lows[-1], sums[-1], highs[-1])
+
+    # Ring layout of a batch of buckets: min, mean and max blocks side by side
+    def _columns(self, counts, lows, sums, highs):
+        return np.concatenate([lows, sums / counts[:, None, None], highs], axis=-1)
+
+    # Start of the oldest bucket still held, or None when empty
+    def oldest(self):
+        if len(self._ring):
+            return self._ring.window()[0][0]
+        if self._open is not None:
+            return float(self._open[0] * self.width)
+        return None
+
+    # True if nothing from before `start` was ever evicted
+    def covers(self, start):
+        if self._ring.total_appended == len(self._ring):
+            return True
+        return start is not None and self.oldest() <= start
+
+    def _bounds(self, ts, start, end):
+        first = 0 if start is None else np.searchsorted(ts, np.floor(start / self.width) * self.width, side="left")
+        last = len(ts) if end is None else np.searchsorted(ts, end, side="right")
+        return first, last
+
+    def _open_in_range(self, start, end):
+        if self._open is None:
+            return False
+        bucket = self._open[0] * self.width
+        return (start is None or bucket + self.width > start) and (end is None or bucket <= end)
+
+    # Buckets overlapping [start, end] (None leaves that side open)
+    def count(self, start=None, end=None):
+        first, last = self._bounds(self._ring.window()[0], start, end)
+        return max(0, last - first) + self._open_in_range(start, end)
+
+    # (ts, low, mean, high) of one metric over [start, end]; ts are bucket
+    # starts, the statistics are (buckets, vf) arrays
+    def window(self, metric, start=None, end=None):
+        ts, values = self._ring.window()
+        first, last = self._bounds(ts, start, end)
+        m = self.metrics.index(metric)
+        columns = [values[first:last, :, i * len(self.metrics) + m] for i in range(len(STATS))]
+        ts = ts[first:last]
+        if self._open_in_range(start, end):
+            open_id, open_count, open_low, open_sum, open_high = self._open
+            ts = np.append(ts, open_id * self.width)
+            columns = [np.concatenate([column, stat[None, :, m]]) for column, stat in
+                       zip(columns, (open_low, open_sum / open_count, open_high))]
+        return (ts, *columns)
+
+    # Copy with room for a different number of VFs, VFs that didn't exist
+    # yet read as zero
+    def resized(self, vf_count, capacity=None):
+        tier = RollupTier(self.width, self._ring.capacity if capacity is None else capacity, vf_count,
+                          self.metrics)
+        tier._ring = self._ring.resized(vf_count, capacity)
+        if self._open is not None:
+            keep = min(vf_count, self.vf_count)
+            padded = []
+            for stat in self._open[2:]:
+                grown = np.zeros((vf_count, len(self.metrics)))
+                grown[:keep] = stat[:keep]
+                padded.append(grown)
+            tier._open = (self._open[0], self._open[1], *padded)
+        return tier
+
+
+# The raw history ring seen through the same interface as a rollup tier,
+# every sample being its own bucket
+class RawTier:
+    width = 0
+
+    def __init__(self, ring):
+        self._ring = ring
+
+    def __len__(self):
+        return len(self._ring)
+
+    def oldest(self):
+        return self._ring.window()[0][0] if len(self._ring) else None
+
+    def covers(self, start):
+        if self._ring.total_appended == len(self._ring):
+            return True
+        return start is not None and self.oldest() <= start
+
+    def _bounds(self, ts, start, end):
+        first = 0 if start is None else np.searchsorted(ts, start, side="left")
+        last = len(ts) if end is None else np.searchsorted(ts, end, side="right")
+        return first, last
+
+    def count(self, start=None, end=None):
+        first, last = self._bounds(self._ring.window()[0], start, end)
+        return max(0, last - first)
+
+    def window(self, metric, start=None, end=None):
+        ts, values = self._ring.series(metric)
+        first, last = self._bounds(ts, start, end)
+        values = values[first:last]
+        return ts[first:last], values, values, values
+
+
+# Human readable bucket width, e.g. "10 s" or "10 min"
+def tier_label(width):
+    if width >= 3600 and width % 3600 == 0:
+        return f"{width // 3600} h"
+    if width >= 60 and width % 60 == 0:
+        return f"{width // 60} min"
+    return f"{width:g} s"
+
+
+# Every rollup tier of one history, fed together
+class Rollups:
+    def __init__(self, vf_count, metrics, tiers=ROLLUP_TIERS, capacity=TIER_CAPACITY,
+                 budget_bytes=ROLLUP_BUDGET_BYTES):
+        self.vf_count = vf_count
+        self.metrics = tuple(metrics)
+        self.widths = tuple(tiers)
+        self.capacity = capacity
+        self.budget_bytes = budget_bytes
+        per_tier = self.tier_capacity(vf_count)
+        self.tiers = [RollupTier(width, per_tier, vf_count, self.metrics) for width in self.widths]
+
+    # Buckets every tier can hold within the budget for vf_count VFs
+    def tier_capacity(self, vf_count):
+        # Every bucket is stored twice (see HistoryRing)
+        bucket_bytes = 2 * 8 * (1 + max(vf_count, 1) * len(STATS) * len(self.metrics))
+        return max(1, min(self.capacity, self.budget_bytes // len(self.widths) // bucket_bytes))
+
+    def add(self, ts, values):
+        for tier in self.tiers:
+            tier.add(ts, values)
+
+    def resized(self, vf_count):
+        rollups = Rollups(vf_count, self.metrics, self.widths, self.capacity, self.budget_bytes)
+        per_tier = rollups.tier_capacity(vf_count)
+        rollups.tiers = [tier.resized(vf_count, per_tier) for tier in self.tiers]
+        return rollups
+
+
+# Source to draw [start, end] from at about `points` points: the finest one
+# that still holds the whole range without more than SOURCE_POINTS_FACTOR
+# samples per point, else the coarsest one holding the range, else the
+# coarsest. sources go from finest to coarsest.
+def choose_source(sources, start, end, points):
+    sources = [source for source in sources if len(source)]
+    if not sources:
+        return None
+    covering = [source for source in sources if source.covers(start)]
+    for source in covering:
+        if source.count(start, end) <= SOURCE_POINTS_FACTOR * points:
+            return source
+    return covering[-1] if covering else sources[-1]
+
+
+# Min-max downsampling to about `points` points per series.
+#
+# ts is (n,), low/mean/high are (n, series). Up to `points` samples the
+# means are returned as they are. Beyond that the samples are cut into
+# points / 2 bins and every bin contributes its lowest and highest value in
+# the order they occurred, so spikes and dips survive at any zoom level.
+# All series share the x positions (the bin start and middle).
+def minmax_downsample(ts, low, mean, high, points):
+    n = len(ts)
+    if n <= points:
+        return ts, mean
+    bins = max(1, points // 2)
+    edges = np.linspace(0, n, bins + 1).astype(np.intp)
+    starts = edges[:-1]
+    lows = np.minimum.reduceat(low, starts, axis=0)
+    highs = np.maximum.reduceat(high, starts, axis=0)
+
+    # Which extreme of each bin came first, per series
+    in_bin = np.repeat(np.arange(bins), np.diff(edges))
+    rows = np.arange(n)[:, None]
+    first_low = np.minimum.reduceat(np.where(low == lows[in_bin], rows, n), starts, axis=0)
+    first_high = np.minimum.reduceat(np.where(high == highs[in_bin], rows, n), starts, axis=0)
+    low_first = first_low <= first_high
+
+    x = np.empty(2 * bins)
+    x[0::2] = ts[starts]
+    x[1::2] = ts[(starts + edges[1:] - 1) // 2]
+    y = np.empty((2 * bins, low.shape[1]))
+    y[0::2] = np.where(low_first, lows, highs)
+    y[1::2] = np.where(low_first, highs, lows)
+    return x, y
@@ -0,0 +1,473 @@
+import argparse
+import gzip
+import hashlib
+import json
+import math
+import os
+import re
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from sample_format import record_from_fio
+
+# Archive database, next to the results it keeps
+DEFAULT_ARCHIVE_PATH = "fio_archive.sqlite"
+
+# Headline metrics of every result and whether a higher value is better
+METRICS = {
+    "iops": True,
+    "bw_bytes": True,
+    "lat_mean_ns": False,
+    "clat_p99_ns": False,
+}
+
+# A change is a regression when it is significant at ALPHA (two-sided
+# Welch's t-test) and worse than THRESHOLD relative to the baseline
+ALPHA = 0.05
+THRESHOLD = 0.05
+
+# Exit codes of compare: 1 is a regression, 2 means nothing to compare
+EXIT_REGRESSION = 1
+EXIT_NO_DATA = 2
+
+# Job options that only name the job or its target, left out of the
+# configuration a result is compared under
+_IDENTITY_OPTIONS = ("name", "filename", "output", "output-format", "status-interval")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run TEXT PRIMARY KEY,
+    started_at REAL NOT NULL,
+    host TEXT,
+    note TEXT,
+    baseline INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    run TEXT NOT NULL,
+    sha TEXT NOT NULL UNIQUE,
+    ts REAL NOT NULL,
+    host TEXT,
+    device TEXT,
+    vf INTEGER,
+    round_id INTEGER,
+    fio_version TEXT,
+    config TEXT NOT NULL,
+    rw TEXT,
+    bs TEXT,
+    iodepth INTEGER,
+    numjobs INTEGER,
+    options TEXT NOT NULL,
+    runtime_ms INTEGER,
+    iops REAL,
+    bw_bytes REAL,
+    lat_mean_ns REAL,
+    clat_p99_ns REAL,
+    usr_cpu REAL,
+    sys_cpu REAL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY REFERENCES results(id),
+    fio_json BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_run ON results(run, config);
+CREATE INDEX IF NOT EXISTS results_ts ON results(ts);
+CREATE INDEX IF NOT EXISTS results_device ON results(device, ts);
+CREATE INDEX IF NOT EXISTS results_config ON results(config, ts);
+CREATE INDEX IF NOT EXISTS results_fio_version ON results(fio_version, ts);
+"""
+
+# Filters query() accepts, column -> SQL condition
+_FILTERS = {
+    "run": "run = ?",
+    "device": "device = ?",
+    "vf": "vf = ?",
+    "fio_version": "fio_version = ?",
+    "config": "config = ?",
+    "rw": "rw = ?",
+    "bs": "bs = ?",
+    "iodepth": "iodepth = ?",
+    "numjobs": "numjobs = ?",
+    "since": "ts >= ?",
+    "until": "ts < ?",
+}
+
+# One metric of one configuration (and device) compared between two runs
+Comparison = namedtuple("Comparison", ["config", "label", "device", "metric", "baseline", "candidate",
+                                       "change", "p_value", "verdict"])
+
+# mean, standard deviation and count of a sample
+Sample = namedtuple("Sample", ["mean", "std", "n"])
+
+
+def run_name(now=None):
+    return time.strftime("run-%Y%m%d-%H%M%S", time.localtime(now))
+
+
+# All job options of a result, the global section overridden by the job's
+def job_options(data):
+    options = dict(data.get("global options") or {})
+    jobs = data.get("jobs") or [{}]
+    options.update(jobs[0].get("job options") or {})
+    return options
+
+
+# Short stable id of the job options that shape a result, identical for the
+# same workload on any device
+def config_id(options):
+    shaping = {key: value for key, value in options.items() if key not in _IDENTITY_OPTIONS}
+    return hashlib.sha1(json.dumps(shaping, sort_keys=True).encode()).hexdigest()[:12]
+
+
+# "randread 4k qd32 ×1" of a result row or options dict
+def config_label(row):
+    return f"{row['rw'] or '?'} {row['bs'] or '?'} qd{row['iodepth'] or '?'} ×{row['numjobs'] or 1}"
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# Regularized incomplete beta function I_x(a, b), continued fraction
+# (Numerical Recipes' betacf), enough for t-test p-values without SciPy
+def _betainc(a, b, x):
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    if x > (a + 1) / (a + b + 2):
+        return 1.0 - _betainc(b, a, 1 - x)
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log1p(-x)) / a
+    c, d = 1.0, 1.0 - (a + b) * x / (a + 1)
+    d = 1.0 / (d if abs(d) > 1e-300 else 1e-300)
+    result = d
+    for m in range(1, 300):
+        for numerator in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                          -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+            d = 1.0 + numerator * d
+            d = 1.0 / (d if abs(d) > 1e-300 else 1e-300)
+            c = 1.0 + numerator / c
+            c = c if abs(c) > 1e-300 else 1e-300
+            result *= c * d
+        if abs(c * d - 1.0) < 1e-12:
+            break
+    return front * result
+
+
+# Two-sided p-value of Welch's t-test between two samples, None when either
+# has fewer than two values
+def welch_p_value(baseline, candidate):
+    if baseline.n < 2 or candidate.n < 2:
+        return None
+    spread = baseline.std ** 2 / baseline.n + candidate.std ** 2 / candidate.n
+    if spread == 0:
+        return 1.0 if baseline.mean == candidate.mean else 0.0
+    t = (candidate.mean - baseline.mean) / math.sqrt(spread)
+    df = spread ** 2 / ((baseline.std ** 2 / baseline.n) ** 2 / (baseline.n - 1) +
+                        (candidate.std ** 2 / candidate.n) ** 2 / (candidate.n - 1))
+    return _betainc(df / 2, 0.5, df / (df + t * t))
+
+
+def _sample(values):
+    values = np.asarray(values, dtype=np.float64)
+    return Sample(float(values.mean()), float(values.std(ddof=1)) if len(values) > 1 else 0.0, len(values))
+
+
+# Judge one metric: regression, improvement, or "" for no significant change
+def verdict(metric, baseline, candidate, alpha=ALPHA, threshold=THRESHOLD):
+    change = (candidate.mean - baseline.mean) / baseline.mean if baseline.mean else 0.0
+    p_value = welch_p_value(baseline, candidate)
+    if p_value is None or p_value >= alpha or abs(change) < threshold:
+        return change, p_value, ""
+    better = (change > 0) == METRICS[metric]
+    return change, p_value, "improvement" if better else "regression"
+
+
+# Every fio result of every round, kept.
+#
+# Results are stored gzip-compressed in SQLite next to an indexed row of
+# what they are (run, device, VF, fio version, workload, timestamp) and
+# their headline metrics, so queries and comparisons only touch the small
+# rows and never decompress a document. The documents live in their own
+# table to keep the rows densely packed. A result archived twice (same
+# content) is stored once.
+#
+# A run is one session of rounds, named run-YYYYMMDD-HHMMSS by default;
+# one run can be marked as the baseline later runs are compared with.
+# The archive is safe to use from the runner's asyncio thread and the
+# control thread at once.
+class RunArchive:
+    def __init__(self, path=DEFAULT_ARCHIVE_PATH):
+        self.path = path
+        self.run = None
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self.host = socket.gethostname()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # Begin a new run; later results go to it
+    def start_run(self, run=None, note=""):
+        self.run = run or run_name()
+        with self._lock, self._db:
+            self._db.execute("INSERT OR IGNORE INTO runs (run, started_at, host, note) VALUES (?, ?, ?, ?)",
+                             (self.run, time.time(), self.host, note))
+        return self.run
+
+    # Archive one fio JSON document. Returns its id, or None if it was
+    # archived before or could not be stored; archiving never fails a run.
+    def add(self, data, vf=None, device=None, round_id=None, run=None):
+        run = run or self.run or self.start_run()
+        try:
+            raw = json.dumps(data, sort_keys=True).encode()
+            sha = hashlib.sha256(raw).hexdigest()
+            record = record_from_fio(data, vf or 0, round_id)[0]
+            options = job_options(data)
+            row = {
+                "run": run,
+                "sha": sha,
+                "ts": float(record["ts"]),
+                "host": self.host,
+                "device": device or options.get("filename"),
+                "vf": vf,
+                "round_id": data.get("round_id", round_id),
+                "fio_version": data.get("fio version"),
+                "config": config_id(options),
+                "rw": options.get("rw") or options.get("readwrite"),
+                "bs": options.get("bs") or options.get("blocksize"),
+                "iodepth": _int_or_none(options.get("iodepth", 1)),
+                "numjobs": _int_or_none(options.get("numjobs", 1)),
+                "options": json.dumps(options, sort_keys=True),
+                "runtime_ms": int(record["runtime_ms"]),
+            }
+            row.update({name: float(record[name]) for name in METRICS})
+            row.update(usr_cpu=float(record["usr_cpu"]), sys_cpu=float(record["sys_cpu"]))
+            with self._lock, self._db:
+                self._db.execute("INSERT OR IGNORE INTO runs (run, started_at, host) VALUES (?, ?, ?)",
+                                 (run, row["ts"], self.host))
+                cursor = self._db.execute(
+                    f"INSERT OR IGNORE INTO results ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+                    tuple(row.values()))
+                if cursor.rowcount == 0:
+                    return None
+                self._db.execute("INSERT INTO documents (id, fio_json) VALUES (?, ?)",
+                                 (cursor.lastrowid, gzip.compress(raw, compresslevel=6)))
+                return cursor.lastrowid
+        except (sqlite3.Error, OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Could not archive the VF{vf} result: {e}")
+            return None
+
+    # The fio JSON document of an archived result
+    def document(self, result_id):
+        with self._lock:
+            row = self._db.execute("SELECT fio_json FROM documents WHERE id = ?", (result_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"no archived result {result_id}")
+        return json.loads(gzip.decompress(row["fio_json"]))
+
+    # Result rows matching every given filter (see _FILTERS), newest first
+    def query(self, limit=100, **filters):
+        unknown = set(filters) - set(_FILTERS)
+        if unknown:
+            raise ValueError(f"unknown filters {sorted(unknown)}")
+        given = {name: value for name, value in filters.items() if value is not None}
+        where = " AND ".join(_FILTERS[name] for name in given) or "1"
+        with self._lock:
+            return self._db.execute(f"SELECT * FROM results WHERE {where} ORDER BY ts DESC LIMIT ?",
+                                    (*given.values(), limit)).fetchall()
+
+    # Runs with their result count and time span, newest first
+    def runs(self, limit=20):
+        with self._lock:
+            return self._db.execute("""
+                SELECT runs.run, runs.started_at, runs.host, runs.note, runs.baseline,
+                       COUNT(results.id) AS results, MIN(results.ts) AS first, MAX(results.ts) AS last,
+                       COUNT(DISTINCT results.config) AS configs, AVG(results.iops) AS iops
+                FROM runs LEFT JOIN results ON results.run = runs.run
+                GROUP BY runs.run ORDER BY runs.started_at DESC LIMIT ?""", (limit,)).fetchall()
+
+    # Resolve "latest", "baseline" or a run name to a run name
+    def resolve(self, run):
+        with self._lock:
+            if run == "latest":
+                row = self._db.execute("SELECT run FROM runs ORDER BY started_at DESC LIMIT 1").fetchone()
+            elif run == "baseline":
+                row = self._db.execute("SELECT run FROM runs WHERE baseline = 1").fetchone()
+            else:
+                row = self._db.execute("SELECT run FROM runs WHERE run = ?", (run,)).fetchone()
+        if row is None:
+            raise KeyError(f"no run {run!r} in {self.path}" if run != "baseline" else
+                           f"no baseline run marked in {self.path}")
+        return row["run"]
+
+    def mark_baseline(self, run):
+        run = self.resolve(run)
+        with self._lock, self._db:
+            self._db.execute("UPDATE runs SET baseline = (run = ?)", (run,))
+        return run
+
+    # {(config, device or None): (row, {metric: values})} of one run
+    def _samples(self, run, by_device):
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT config, device, rw, bs, iodepth, numjobs, {', '.join(METRICS)} FROM results WHERE run = ?",
+                (run,)).fetchall()
+        groups = {}
+        for row in rows:
+            key = (row["config"], row["device"] if by_device else None)
+            if key not in groups:
+                groups[key] = (row, {metric: [] for metric in METRICS})
+            for metric in METRICS:
+                groups[key][1][metric].append(row[metric])
+        return groups
+
+    # Every metric of every configuration both runs have, candidate against
+    # baseline. Each archived result is one observation.
+    def compare(self, candidate, baseline, by_device=False, alpha=ALPHA, threshold=THRESHOLD):
+        before = self._samples(self.resolve(baseline), by_device)
+        after = self._samples(self.resolve(candidate), by_device)
+        comparisons = []
+        for key in sorted(set(before) & set(after), key=lambda key: (config_label(after[key][0]), str(key[1]))):
+            row = after[key][0]
+            for metric in METRICS:
+                old, new = _sample(before[key][1][metric]), _sample(after[key][1][metric])
+                change, p_value, judged = verdict(metric, old, new, alpha, threshold)
+                comparisons.append(Comparison(key[0], config_label(row), key[1], metric, old, new,
+                                              change, p_value, judged))
+        return comparisons
+
+
+def _metric_value(metric, value):
+    if metric == "iops":
+        return f"{value:,.0f}"
+    if metric == "bw_bytes":
+        return f"{value / 1e6:,.1f} MB/s"
+    return f"{value / 1000:,.1f} µs"
+
+
+def print_comparisons(comparisons, candidate, baseline):
+    print(f"📊 {candidate} against baseline {baseline}")
+    current = None
+    for c in comparisons:
+        if (c.config, c.device) != current:
+            current = (c.config, c.device)
+            print(f"\n  {c.label}" + (f" on {c.device}" if c.device else "") + f"  [{c.config}]")
+        p_value = "   n/a" if c.p_value is None else f"{c.p_value:6.3f}"
+        mark = {"regression": "⚠️ regression", "improvement": "⬆️ improvement"}.get(c.verdict, "")
+        print(f"    {c.metric:<12} {_metric_value(c.metric, c.baseline.mean):>14} (n={c.baseline.n:<4}) → "
+              f"{_metric_value(c.metric, c.candidate.mean):>14} (n={c.candidate.n:<4}) "
+              f"{c.change:+7.1%}  p={p_value}  {mark}")
+
+
+def _time_arg(text):
+    try:
+        return float(text)
+    except ValueError:
+        return time.mktime(time.strptime(text.replace("T", " "), "%Y-%m-%d %H:%M:%S" if ":" in text else "%Y-%m-%d"))
+
+
+def _vf_number(path):
+    match = re.search(r"vf(\d+)", os.path.basename(path))
+    return int(match.group(1)) if match else None
+
+
+def _when(ts):
+    return "—" if ts is None else time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive of every fio result, with regression comparison")
+    parser.add_argument("--archive", default=DEFAULT_ARCHIVE_PATH, help="archive database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="archive fio JSON result files (vfN.json)")
+    add.add_argument("files", nargs="+")
+    add.add_argument("--run", default=None, help="run to add them to (default: a new run)")
+    add.add_argument("--note", default="")
+    runs = commands.add_parser("runs", help="list runs")
+    runs.add_argument("--limit", type=int, default=20)
+    query = commands.add_parser("query", help="list archived results")
+    for name in ("run", "device", "fio_version", "rw", "bs", "config"):
+        query.add_argument(f"--{name.replace('_', '-')}", dest=name, default=None)
+    for name in ("vf", "iodepth", "numjobs"):
+        query.add_argument(f"--{name}", type=int, default=None)
+    query.add_argument("--since", type=_time_arg, default=None, help="epoch seconds or YYYY-MM-DD[ HH:MM:SS]")
+    query.add_argument("--until", type=_time_arg, default=None)
+    query.add_argument("--limit", type=int, default=50)
+    query.add_argument("--json", action="store_true", help="print rows as JSON lines")
+    show = commands.add_parser("show", help="print the fio JSON of an archived result")
+    show.add_argument("id", type=int)
+    baseline = commands.add_parser("baseline", help="mark a run as the baseline")
+    baseline.add_argument("run", help="run name or 'latest'")
+    compare = commands.add_parser("compare", help="compare a run with the baseline; exits 1 on a regression")
+    compare.add_argument("run", nargs="?", default="latest", help="run name or 'latest' (default)")
+    compare.add_argument("--baseline", default="baseline", help="baseline run (default: the marked one)")
+    compare.add_argument("--by-device", action="store_true", help="compare each device separately")
+    compare.add_argument("--alpha", type=float, default=ALPHA, help="significance level")
+    compare.add_argument("--threshold", type=float, default=THRESHOLD,
+                         help="relative change that counts, e.g. 0.05 for 5%%")
+    args = parser.parse_args()
+
+    archive = RunArchive(args.archive)
+    try:
+        if args.command == "add":
+            run = archive.start_run(args.run, args.note)
+            added = 0
+            for path in args.files:
+                with open(path) as f:
+                    added += archive.add(json.load(f), vf=_vf_number(path)) is not None
+            print(f"✅ {added} of {len(args.files)} results archived in {run}")
+        elif args.command == "runs":
+            for row in archive.runs(args.limit):
+                mark = " ⭐ baseline" if row["baseline"] else ""
+                iops = "" if row["iops"] is None else f", mean {row['iops']:,.0f} IOPS"
+                print(f"{row['run']}  {_when(row['first'])} – {_when(row['last'])}  {row['results']} results, "
+                      f"{row['configs']} configs{iops}{mark}" + (f"  {row['note']}" if row["note"] else ""))
+        elif args.command == "query":
+            filters = {name: getattr(args, name) for name in _FILTERS}
+            for row in archive.query(limit=args.limit, **filters):
+                if args.json:
+                    print(json.dumps(dict(row)))
+                else:
+                    print(f"{row['id']:>8}  {_when(row['ts'])}  {row['run']}  {row['device']}  {config_label(row):<24}"
+                          f"{row['iops']:>12,.0f} IOPS  p99 {row['clat_p99_ns'] / 1000:>10,.1f} µs  "
+                          f"fio {row['fio_version']}")
+        elif args.command == "show":
+            print(json.dumps(archive.document(args.id), indent=2))
+        elif args.command == "baseline":
+            print(f"⭐ {archive.mark_baseline(args.run)} is the baseline")
+        else:
+            candidate, baseline_run = archive.resolve(args.run), archive.resolve(args.baseline)
+            comparisons = archive.compare(candidate, baseline_run, args.by_device, args.alpha, args.threshold)
+            if not comparisons:
+                print(f"❌ {candidate} and {baseline_run} have no configuration in common", file=sys.stderr)
+                sys.exit(EXIT_NO_DATA)
+            print_comparisons(comparisons, candidate, baseline_run)
+            regressions = [c for c in comparisons if c.verdict == "regression"]
+            if regressions:
+                print(f"\n⚠️ Regressions: {len(regressions)}")
+                sys.exit(EXIT_REGRESSION)
+            print("\n✅ No regressions")
+    except KeyError as e:
+        print(f"❌ {e.args[0]}", file=sys.stderr)
+        sys.exit(EXIT_NO_DATA)
+    finally:
+        archive.close()
+
+
+if __name__ == "__main__":
+    main()
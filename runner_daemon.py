@@ -0,0 +1,438 @@
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fio_orchestrator import PAUSE_NEEDS_ROOT, FioOrchestrator, pausable
+from fio_publish import RoundSequence
+from fio_stream import StreamingFio
+from run_archive import DEFAULT_ARCHIVE_PATH, RunArchive
+from sample_store import DEFAULT_STORE_PATH, SampleStore
+from vf_discovery import discover_devices
+
+# Control API address; only ever bound to the loopback interface
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Seconds a control call waits for the daemon
+CONTROL_TIMEOUT = 10
+
+# Seconds the daemon waits on its loop before it answers with the status so
+# far (e.g. "stopping"), inside CONTROL_TIMEOUT so the caller gets the reply
+CALL_TIMEOUT = 8
+
+# How many finished jobs the status keeps
+RECENT_RESULTS = 50
+
+# Why start() is refused when sudo would ask for a password
+SUDO_NEEDS_PASSWORD = ("can't start: fio runs through sudo, which would ask for a password the detached "
+                       "daemon can't prompt for; run the runner daemon as root or allow passwordless sudo")
+
+# fio workloads the runners offer. Round mode runs `runtime`-second jobs with
+# `pause_between` seconds between them, streaming mode keeps one fio per VF.
+PROFILES = {
+    "quick": {
+        "fio_cmd": ["fio"],
+        "fio_args": [
+            "--name=test",
+            "--rw=randread",
+            "--bs=4k",
+            "--iodepth=32",
+            "--numjobs=1",
+            "--group_reporting",
+            "--size=1G",
+        ],
+        "runtime": 3,
+        "pause_between": 3,
+    },
+    "throughput": {
+        "fio_cmd": ["sudo", "fio"],
+        "fio_args": [
+            "--direct=1",
+            "--rw=randread",
+            "--bs=128k",
+            "--ioengine=libaio",
+            "--iodepth=64",
+            "--numjobs=4",
+            "--group_reporting",
+            "--name=throughput-test-job",
+            "--eta-newline=1",
+            "--readonly",
+        ],
+        "runtime": 10,
+        "pause_between": 3,
+    },
+}
+
+
+# fio command line for a profile. FIO_BIN replaces it (sudo included), e.g.
+# FIO_BIN=./fake_fio.py to run against the simulator instead of real fio.
+# Running as root, sudo is dropped: fio is then our own child and pausing
+# can signal it directly.
+def fio_command(profile, environ=os.environ):
+    if environ.get("FIO_BIN"):
+        command = shlex.split(environ["FIO_BIN"])
+    else:
+        command = list(PROFILES[profile]["fio_cmd"])
+    if command[0] == "sudo" and os.geteuid() == 0:
+        command = command[1:]
+    return command
+
+
+# Whether fio can start without a password prompt. The daemon has no
+# terminal (launch_daemon detaches it), so sudo must not need to ask.
+def sudo_ready(fio_cmd):
+    if os.path.basename(fio_cmd[0]) != "sudo":
+        return True
+    try:
+        return subprocess.run(["sudo", "-n", "true"], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL, timeout=CONTROL_TIMEOUT).returncode == 0
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+
+
+# Background fio runner.
+#
+# All fio work happens on an asyncio loop in a daemon thread, so control
+# calls return immediately. Round mode drives a FioOrchestrator, streaming
+# mode keeps one StreamingFio per VF alive. Pausing sends SIGSTOP to every
+# live fio process (and holds back new jobs), resuming sends SIGCONT, so a
+# paused run continues exactly where it stopped.
+class RunnerDaemon:
+    def __init__(self, profile="quick", devices=None, result_dir="."):
+        self.profile = profile
+        self.devices = list(devices) if devices is not None else discover_devices()
+        self.result_dir = result_dir
+        self.rounds = RoundSequence(result_dir)
+        self.store = SampleStore(os.path.join(result_dir, DEFAULT_STORE_PATH))
+        self.archive = RunArchive(os.path.join(result_dir, DEFAULT_ARCHIVE_PATH))
+        self.state = "idle"
+        self.mode = None
+        self.started_at = None
+        self.jobs_done = 0
+        self.failures = 0
+        self.recent = []
+        self.last_error = None
+        self._orchestrator = None
+        self._streams = []
+        self._task = None
+        self._lock = threading.Lock()
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="fio-runner", daemon=True)
+        self._thread.start()
+
+    def output_file(self, vf):
+        return os.path.join(self.result_dir, f"vf{vf}.json")
+
+    # Run a coroutine on the daemon loop and wait for its result. Raises
+    # concurrent.futures.TimeoutError when that takes over CALL_TIMEOUT, the
+    # coroutine carries on regardless.
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(CALL_TIMEOUT)
+
+    def start(self, mode="rounds", profile=None):
+        if mode not in ("rounds", "stream"):
+            raise ValueError(f"unknown mode {mode!r}")
+        if profile is not None and profile not in PROFILES:
+            raise ValueError(f"unknown profile {profile!r}")
+        if self.state == "idle" and not sudo_ready(fio_command(profile or self.profile)):
+            raise ValueError(SUDO_NEEDS_PASSWORD)
+        return self._call(self._start(mode, profile))
+
+    def stop(self):
+        return self._call(self._stop())
+
+    # Raises ValueError when the profile's fio runs through sudo and this
+    # daemon isn't root, fio couldn't actually be frozen
+    def pause(self):
+        if self.state == "running" and not pausable(fio_command(self.profile)):
+            raise ValueError(PAUSE_NEEDS_ROOT)
+        return self._call(self._pause())
+
+    def resume(self):
+        return self._call(self._resume())
+
+    async def _start(self, mode, profile):
+        if self.state != "idle":
+            return self.status()
+        if profile is not None:
+            self.profile = profile
+        config = PROFILES[self.profile]
+        self.mode = mode
+        self.state = "running"
+        self.started_at = time.time()
+        self.last_error = None
+        self._streams = []
+        if mode == "rounds":
+            # Every round's results are kept in the archive under a new run
+            self.archive.start_run(note=f"profile {self.profile}")
+            self._orchestrator = FioOrchestrator(
+                self.devices, config["fio_args"], fio_cmd=fio_command(self.profile), runtime=config["runtime"],
+                rounds=self.rounds, store=self.store, output_pattern=self.output_file("{vf}"),
+                pause_between=config["pause_between"], archive=self.archive)
+            self._task = asyncio.ensure_future(self._run_rounds(self._orchestrator))
+        else:
+            self._streams = [
+                StreamingFio(vf, device, config["fio_args"], self.output_file(vf), self.store,
+                             fio_cmd=fio_command(self.profile))
+                for vf, device in enumerate(self.devices)
+            ]
+            self._task = asyncio.ensure_future(self._run_streams(self._streams))
+        return self.status()
+
+    async def _run_rounds(self, orchestrator):
+        try:
+            async for result in orchestrator.results():
+                self._record(result)
+        except Exception as e:
+            self.last_error = str(e)
+        finally:
+            self._finish()
+
+    # Keep every stream alive, restarting any fio that exited
+    async def _run_streams(self, streams):
+        loop = asyncio.get_event_loop()
+        try:
+            while True:
+                if self.state == "running":
+                    for stream in streams:
+                        if not stream.running():
+                            await loop.run_in_executor(None, stream.start)
+                await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self.last_error = str(e)
+        finally:
+            # Stop them side by side, each may take its kill grace
+            await asyncio.gather(*(loop.run_in_executor(None, stream.stop) for stream in streams))
+            self._finish()
+
+    def _record(self, result):
+        with self._lock:
+            self.jobs_done += 1
+            if result.error:
+                self.failures += 1
+            self.recent.append({
+                "vf": result.vf,
+                "device": result.device,
+                "round_id": result.round_id,
+                "attempts": result.attempts,
+                "elapsed": round(result.elapsed, 3),
+                "error": result.error,
+                "finished_at": time.time(),
+            })
+            del self.recent[:-RECENT_RESULTS]
+
+    def _finish(self):
+        self.state = "idle"
+        self._orchestrator = None
+        self._task = None
+
+    async def _stop(self):
+        if self.state == "idle":
+            return self.status()
+        task = self._task
+        self.state = "stopping"
+        if self._orchestrator is not None:
+            self._orchestrator.stop()
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        return self.status()
+
+    async def _pause(self):
+        if self.state != "running":
+            return self.status()
+        self.state = "paused"
+        if self._orchestrator is not None:
+            self._orchestrator.pause()
+        for stream in self._streams:
+            stream.pause()
+        return self.status()
+
+    async def _resume(self):
+        if self.state != "paused":
+            return self.status()
+        self.state = "running"
+        if self._orchestrator is not None:
+            self._orchestrator.resume()
+        for stream in self._streams:
+            stream.resume()
+        return self.status()
+
+    def live_pids(self):
+        if self._orchestrator is not None:
+            return sorted(self._orchestrator.live)
+        return [stream.process.pid for stream in self._streams if self.mode == "stream" and stream.running()]
+
+    # JSON-serializable view of the runner for the control API
+    def status(self):
+        with self._lock:
+            recent = list(self.recent)
+        return {
+            "state": self.state,
+            "mode": self.mode,
+            "profile": self.profile,
+            "profiles": sorted(PROFILES),
+            "devices": self.devices,
+            "started_at": self.started_at,
+            "jobs_done": self.jobs_done,
+            "failures": self.failures,
+            "stream_samples": sum(stream.samples for stream in self._streams),
+            "archive_run": self.archive.run if self.mode == "rounds" else None,
+            "pausable": pausable(fio_command(self.profile)),
+            "live_pids": self.live_pids(),
+            "recent": recent,
+            "last_error": self.last_error,
+            "pid": os.getpid(),
+        }
+
+    def shutdown(self):
+        try:
+            self.stop()
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.store.close()
+            self.archive.close()
+
+
+# Control API:
+#   GET  /status
+#   POST /start   {"mode": "rounds" | "stream", "profile": name}
+#   POST /stop, /pause, /resume
+# Every call answers with the runner status as JSON.
+class ControlHandler(BaseHTTPRequestHandler):
+    daemon = None
+
+    def _reply(self, code, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/status":
+            self._reply(404, {"error": f"unknown endpoint {self.path}"})
+            return
+        self._reply(200, self.daemon.status())
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            params = json.loads(self.rfile.read(length) or b"{}")
+            command = self.path.strip("/")
+            if command == "start":
+                status = self.daemon.start(params.get("mode", "rounds"), params.get("profile"))
+            elif command in ("stop", "pause", "resume"):
+                status = getattr(self.daemon, command)()
+            else:
+                self._reply(404, {"error": f"unknown endpoint {self.path}"})
+                return
+        except ValueError as e:
+            self._reply(400, {"error": str(e)})
+            return
+        except concurrent.futures.TimeoutError:
+            # Still stopping (or starting) on the loop, the status shows it
+            self._reply(202, self.daemon.status())
+            return
+        self._reply(200, status)
+
+    # Keep the terminal quiet, the runners poll /status constantly
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(profile="quick", host=DEFAULT_HOST, port=DEFAULT_PORT, result_dir="."):
+    daemon = RunnerDaemon(profile, result_dir=result_dir)
+    handler = type("Handler", (ControlHandler,), {"daemon": daemon})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"🛰️ fio runner daemon listening on http://{host}:{port} ({len(daemon.devices)} VFs)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        daemon.shutdown()
+
+
+# Client side, used by the runner UIs
+
+
+def _url(path, host, port):
+    return f"http://{host}:{port}{path}"
+
+
+# Current runner status, or None when no daemon is listening
+def daemon_status(host=DEFAULT_HOST, port=DEFAULT_PORT):
+    try:
+        with urllib.request.urlopen(_url("/status", host, port), timeout=CONTROL_TIMEOUT) as response:
+            return json.load(response)
+    except (urllib.error.URLError, OSError, ValueError):
+        return None
+
+
+# Send a control command; returns the status the daemon answered with.
+# Raises RuntimeError with the daemon's message when it rejects the call.
+def send_command(command, host=DEFAULT_HOST, port=DEFAULT_PORT, **params):
+    request = urllib.request.Request(_url(f"/{command}", host, port), data=json.dumps(params).encode(),
+                                     headers={"Content-Type": "application/json"}, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=CONTROL_TIMEOUT) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(json.load(e).get("error", str(e)))
+
+
+# Start a daemon in the background, detached from the caller (a Streamlit
+# rerun or a closed browser tab doesn't take it down)
+def launch_daemon(profile="quick", port=DEFAULT_PORT, result_dir="."):
+    script = os.path.abspath(__file__)
+    log = open(os.path.join(result_dir, "runner_daemon.log"), "ab")
+    return subprocess.Popen([sys.executable, script, "serve", "--profile", profile, "--port", str(port),
+                             "--dir", result_dir],
+                            stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                            start_new_session=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Background fio runner with a local control API")
+    parser.add_argument("command", choices=["serve", "status", "start", "stop", "pause", "resume"])
+    parser.add_argument("--profile", choices=sorted(PROFILES), default=None)
+    parser.add_argument("--mode", choices=["rounds", "stream"], default="rounds")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--dir", default=".", help="directory for vfN.json and the sample store")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.profile or "quick", port=args.port, result_dir=args.dir)
+        return
+
+    try:
+        if args.command == "status":
+            status = daemon_status(port=args.port)
+            if status is None:
+                sys.exit(f"no runner daemon on port {args.port}")
+        elif args.command == "start":
+            status = send_command("start", port=args.port, mode=args.mode, profile=args.profile)
+        else:
+            status = send_command(args.command, port=args.port)
+    except (RuntimeError, urllib.error.URLError) as e:
+        sys.exit(f"❌ {e}")
+    print(json.dumps(status, indent=2))
+
+
+if __name__ == "__main__":
+    main()
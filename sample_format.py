@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import re
+import struct
+import sys
+import time
+
+import numpy as np
+
+from fio_ingest import DIRECTIONS, PERCENTILES, extract_metrics
+
+# File header: magic, format version, record size in bytes
+MAGIC = b"VFIOSMPL"
+HEADER = struct.Struct("<8sII")
+HEADER_SIZE = 64
+
+# Version written by this code; older files stay readable
+FORMAT_VERSION = 2
+
+# Per-direction block of a version 2 record. Rates and latencies are
+# float32, which keeps 7 significant digits, plenty for a dashboard.
+DIRECTION_DTYPE = np.dtype([
+    ("total_ios", "<u8"),
+    ("iops", "<f4"),
+    ("bw_bytes", "<f4"),
+    ("lat_mean_ns", "<f4"),
+    ("clat_pct_ns", "<f4", (len(PERCENTILES),)),   # completion latency at fio_ingest.PERCENTILES
+])
+
+RECORD_DTYPES = {
+    # One fixed-size record per VF per fio round, totals over all directions
+    1: np.dtype([
+        ("ts", "<f8"),
+        ("round_id", "<i8"),
+        ("vf", "<u4"),
+        ("runtime_ms", "<u4"),
+        ("total_ios", "<u8"),
+        ("iops", "<f8"),
+        ("bw_bytes", "<f8"),
+        ("lat_mean_ns", "<f8"),
+        ("clat_p99_ns", "<f8"),
+    ]),
+}
+# Version 2 keeps the version 1 fields up front and adds CPU usage and a
+# block per direction: 180 bytes where fio's JSON takes ~9 KB
+RECORD_DTYPES[2] = np.dtype(RECORD_DTYPES[1].descr + [
+    ("usr_cpu", "<f4"),
+    ("sys_cpu", "<f4"),
+] + [(direction, DIRECTION_DTYPE) for direction in DIRECTIONS])
+
+SAMPLE_DTYPE = RECORD_DTYPES[FORMAT_VERSION]
+
+
+def record_dtype(version):
+    try:
+        return RECORD_DTYPES[version]
+    except KeyError:
+        raise ValueError(f"unsupported sample format version {version}")
+
+
+def encode_header(version=FORMAT_VERSION):
+    return HEADER.pack(MAGIC, version, record_dtype(version).itemsize).ljust(HEADER_SIZE, b"\0")
+
+
+# (version, record dtype) of a file from its header bytes
+def decode_header(raw, path="<buffer>"):
+    if len(raw) < HEADER.size:
+        raise ValueError(f"{path} is not a sample store")
+    magic, version, record_size = HEADER.unpack(raw[:HEADER.size])
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a sample store")
+    dtype = record_dtype(version)
+    if record_size != dtype.itemsize:
+        raise ValueError(f"{path} has {record_size} byte records, version {version} uses {dtype.itemsize}")
+    return version, dtype
+
+
+def read_header(path):
+    with open(path, "rb") as f:
+        return decode_header(f.read(HEADER_SIZE), path)
+
+
+# Build one record from a metric set produced by fio_ingest.extract_metrics
+def make_record(vf, metrics, round_id=None, ts=None):
+    record = np.zeros(1, dtype=SAMPLE_DTYPE)
+    record["ts"] = time.time() if ts is None else ts
+    record["round_id"] = -1 if round_id is None else round_id
+    record["vf"] = vf
+    directions = [metrics[d] for d in DIRECTIONS]
+    total_ios = sum(d["total_ios"] for d in directions)
+    record["runtime_ms"] = max(d["runtime"] for d in directions)
+    record["total_ios"] = total_ios
+    record["iops"] = metrics["iops"]
+    record["bw_bytes"] = sum(d["bw_bytes"] for d in directions)
+    if total_ios:
+        record["lat_mean_ns"] = sum(d["lat_mean_ns"] * d["total_ios"] for d in directions) / total_ios
+    record["clat_p99_ns"] = max(d["clat_percentiles"].get(99.0, 0) for d in directions)
+    record["usr_cpu"] = metrics.get("usr_cpu", 0.0)
+    record["sys_cpu"] = metrics.get("sys_cpu", 0.0)
+    for name, d in zip(DIRECTIONS, directions):
+        block = record[name]
+        block["total_ios"] = d["total_ios"]
+        block["iops"] = d["iops"]
+        block["bw_bytes"] = d["bw_bytes"]
+        block["lat_mean_ns"] = d["lat_mean_ns"]
+        block["clat_pct_ns"] = [d["clat_percentiles"].get(p, 0) for p in PERCENTILES]
+    return record
+
+
+# The converter the runners use: one record from a parsed fio JSON document.
+# The timestamp defaults to the one fio stamped the document with.
+def record_from_fio(data, vf, round_id=None, ts=None):
+    metrics = extract_metrics(data)
+    if ts is None and metrics["timestamp_ms"]:
+        ts = metrics["timestamp_ms"] / 1000
+    if round_id is None:
+        round_id = metrics["round_id"]
+    return make_record(vf, metrics, round_id, ts)
+
+
+# Records as another format version: fields both versions have are copied
+# (nested direction blocks too), the rest reads as zero
+def convert_records(records, dtype):
+    records = np.asarray(records)
+    if records.dtype == dtype:
+        return records
+    out = np.zeros(len(records), dtype=dtype)
+    for name in dtype.names:
+        if name in records.dtype.names:
+            out[name] = records[name]
+    return out
+
+
+# Every complete record of a file as a read-only memory map in the file's
+# own format, no copy made. A torn trailing record is left out.
+def map_records(path):
+    version, dtype = read_header(path)
+    count = max(0, os.path.getsize(path) - HEADER_SIZE) // dtype.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=HEADER_SIZE, shape=(count,))
+
+
+def write_records(path, records, version=FORMAT_VERSION):
+    with open(path, "wb") as f:
+        f.write(encode_header(version))
+        f.write(convert_records(records, record_dtype(version)).tobytes())
+
+
+def _vf_number(path):
+    match = re.search(r"vf(\d+)", os.path.basename(path))
+    return int(match.group(1)) if match else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact binary fio sample records")
+    commands = parser.add_subparsers(dest="command", required=True)
+    convert = commands.add_parser("convert", help="convert fio JSON results (vfN.json) into a record file")
+    convert.add_argument("inputs", nargs="+")
+    convert.add_argument("-o", "--output", required=True)
+    upgrade = commands.add_parser("upgrade", help="rewrite a record file in the current format version")
+    upgrade.add_argument("input")
+    upgrade.add_argument("output")
+    info = commands.add_parser("info", help="show the format and size of a record file")
+    info.add_argument("input")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        records = []
+        for path in args.inputs:
+            with open(path) as f:
+                records.append(record_from_fio(json.load(f), _vf_number(path)))
+        write_records(args.output, np.concatenate(records))
+        source = sum(os.path.getsize(path) for path in args.inputs)
+        print(f"✅ {len(records)} records, {source:,} bytes of JSON -> {os.path.getsize(args.output):,} bytes")
+    elif args.command == "upgrade":
+        if os.path.abspath(args.input) == os.path.abspath(args.output):
+            sys.exit("❌ write the upgraded file next to the original, then replace it")
+        records = map_records(args.input)
+        write_records(args.output, records)
+        print(f"✅ {len(records)} records rewritten as format version {FORMAT_VERSION}")
+    else:
+        version, dtype = read_header(args.input)
+        records = map_records(args.input)
+        print(f"{args.input}: format version {version}, {dtype.itemsize} bytes per record, {len(records)} records")
+        if len(records):
+            print(f"  from {time.ctime(records['ts'].min())} to {time.ctime(records['ts'].max())}, "
+                  f"VFs {sorted(set(records['vf'].tolist()))[:16]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+
+from sample_format import (FORMAT_VERSION, HEADER_SIZE, SAMPLE_DTYPE, convert_records, decode_header,
+                           encode_header)
+
+# Default location of the shared sample log, next to the vfN.json results
+DEFAULT_STORE_PATH = "samples.vfs"
+
+
+# Append-only writer for the sample log.
+#
+# Records are fixed-size and every batch goes out in a single O_APPEND write,
+# so readers only ever have to ignore a trailing partial record.
+class SampleStore:
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size == 0:
+            os.write(self._fd, encode_header())
+            self.version, self.dtype = FORMAT_VERSION, SAMPLE_DTYPE
+        else:
+            # An existing store keeps its format, records are converted to it
+            with open(path, "rb") as f:
+                self.version, self.dtype = decode_header(f.read(HEADER_SIZE), path)
+
+    # Append one record or an array of records
+    def append(self, records):
+        records = convert_records(np.atleast_1d(records), self.dtype)
+        os.write(self._fd, np.ascontiguousarray(records).tobytes())
+
+    def close(self):
+        os.close(self._fd)
+
+
+# Zero-copy reader for the sample log.
+#
+# The file is memory-mapped, so every dashboard session (and every process)
+# reading the same store shares one copy of the data in the page cache.
+# Records come in the store's own format version (see sample_format), whose
+# fields are a superset of version 1's.
+class SampleReader:
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self.version, self.dtype = FORMAT_VERSION, SAMPLE_DTYPE
+        self._records = np.zeros(0, dtype=SAMPLE_DTYPE)
+        self._mapped_size = 0
+
+    # True once a writer has created the store
+    def exists(self):
+        return os.path.exists(self.path)
+
+    # All complete records as a read-only view, remapped only when the file grew
+    def records(self):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return self._records
+        if self._mapped_size == 0:
+            if size < HEADER_SIZE:
+                return self._records
+            with open(self.path, "rb") as f:
+                self.version, self.dtype = decode_header(f.read(HEADER_SIZE), self.path)
+            self._records = np.zeros(0, dtype=self.dtype)
+            self._mapped_size = HEADER_SIZE
+        count = max(0, size - HEADER_SIZE) // self.dtype.itemsize
+        if count != len(self._records):
+            self._records = np.memmap(self.path, dtype=self.dtype, mode="r",
+                                      offset=HEADER_SIZE, shape=(count,))
+            self._mapped_size = size
+        return self._records
+
+    # Records appended after the first `offset` ones, plus the new offset
+    def read_since(self, offset):
+        records = self.records()
+        return records[offset:], len(records)
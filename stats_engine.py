@@ -0,0 +1,204 @@
+from collections import namedtuple
+
+import numpy as np
+
+# Averaging windows offered by the dashboard, in seconds. Each is used both
+# as a sliding window and as an EWMA time constant.
+STAT_WINDOWS = (10, 60, 300, 900)
+
+# Sliding windows are kept in buckets of this many seconds
+BUCKET_SECONDS = 1.0
+
+# EWMA sums are rescaled before their weights grow past e**RESCALE_AT
+RESCALE_AT = 50.0
+
+# Rates of one averaging method, (vf,) arrays; NaN where a VF has no I/O in
+# the window yet
+Rates = namedtuple("Rates", [
+    "iops",           # I/Os completed / seconds of runtime
+    "bw_bytes",       # bytes moved / seconds of runtime
+    "lat_mean_ns",    # mean completion latency of those I/Os
+])
+
+# Quantities summed per VF; every rate is a ratio of two of them
+_IOS, _RUNTIME, _BYTES, _LATENCY = range(4)
+
+# Sliding sums are added to and subtracted from, an emptied window may keep
+# rounding residue; below these it counts as empty
+MIN_RUNTIME = 1e-6
+MIN_IOS = 0.5
+
+
+def _rates(sums):
+    ios, runtime, io_bytes, latency = (sums[..., i] for i in range(4))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return Rates(
+            iops=np.where(runtime > MIN_RUNTIME, ios / runtime, np.nan),
+            bw_bytes=np.where(runtime > MIN_RUNTIME, io_bytes / runtime, np.nan),
+            lat_mean_ns=np.where(ios > MIN_IOS, latency / ios, np.nan),
+        )
+
+
+# Per-sample quantities of a batch of sample store records: (4, n) with
+# I/Os, runtime seconds, bytes and the latency sum. Records without a
+# runtime can't be weighted and are left out.
+def _quantities(records):
+    runtime = records["runtime_ms"] / 1000.0
+    keep = np.flatnonzero(runtime > 0)
+    runtime = runtime[keep]
+    ios = records["total_ios"][keep].astype(np.float64)
+    quantities = np.stack([ios, runtime, records["bw_bytes"][keep] * runtime, records["lat_mean_ns"][keep] * ios])
+    return records["ts"][keep], records["vf"][keep].astype(np.intp), quantities
+
+
+# Streaming per-VF statistics over the sample store records.
+#
+# Rates are exact I/O-weighted ratios: the IOPS of a VF is the I/Os it
+# completed over the seconds it ran, not the mean of per-round IOPS, so
+# rounds of different length or size count for what they are. Three views
+# are kept, all updated in O(records + VFs) per batch whatever the history
+# length, vectorized across VFs:
+#
+#   cumulative  since the collector started
+#   window      the last W seconds, from a ring of 1 s buckets with running
+#               sums per window (buckets leaving a window are subtracted)
+#   ewma        exponentially decayed with time constant W; the decay is
+#               folded into the sample weights, e**(t / W), so out-of-order
+#               samples are fine and no per-sample state is needed
+#
+# plus the runtime-weighted mean and variance of the per-sample IOPS,
+# merged batch by batch with Welford's update (Chan et al.'s parallel
+# form), which stays accurate over arbitrarily long runs.
+class StatsEngine:
+    def __init__(self, vf_count, windows=STAT_WINDOWS, bucket=BUCKET_SECONDS):
+        self.windows = tuple(windows)
+        self.bucket = bucket
+        self._spans = [max(1, int(round(w / bucket))) for w in self.windows]
+        self._ring_size = max(self._spans)
+        self.vf_count = 0
+        self._cumulative = np.zeros((0, 4))
+        self._ring = np.zeros((self._ring_size, 0, 4))
+        self._window = np.zeros((len(self.windows), 0, 4))
+        self._ewma = np.zeros((len(self.windows), 0, 4))
+        self._ewma_origin = None
+        self._head = None  # Newest bucket id seen
+        self._weight = np.zeros(0)
+        self._mean = np.zeros(0)
+        self._m2 = np.zeros(0)
+        self.samples = np.zeros(0, dtype=np.int64)
+        self.resize(vf_count)
+
+    def resize(self, vf_count):
+        grow = vf_count - self.vf_count
+        if grow <= 0:
+            return
+        self._cumulative = np.concatenate([self._cumulative, np.zeros((grow, 4))])
+        self._ring = np.concatenate([self._ring, np.zeros((self._ring_size, grow, 4))], axis=1)
+        self._window = np.concatenate([self._window, np.zeros((len(self.windows), grow, 4))], axis=1)
+        self._ewma = np.concatenate([self._ewma, np.zeros((len(self.windows), grow, 4))], axis=1)
+        self._weight = np.concatenate([self._weight, np.zeros(grow)])
+        self._mean = np.concatenate([self._mean, np.zeros(grow)])
+        self._m2 = np.concatenate([self._m2, np.zeros(grow)])
+        self.samples = np.concatenate([self.samples, np.zeros(grow, dtype=np.int64)])
+        self.vf_count = vf_count
+
+    # (vf, 4) sums of the columns of (4, n) quantities per VF
+    def _per_vf(self, vf, quantities):
+        return np.stack([np.bincount(vf, weights=row, minlength=self.vf_count) for row in quantities], axis=-1)
+
+    # Fold a batch of sample store records in; VFs must fit vf_count
+    def add(self, records):
+        ts, vf, quantities = _quantities(records)
+        if len(ts) == 0:
+            return
+        self._cumulative += self._per_vf(vf, quantities)
+        self.samples += np.bincount(vf, minlength=self.vf_count)
+        self._add_variance(vf, quantities)
+        self._add_windows(ts, vf, quantities)
+        self._add_ewma(ts, vf, quantities)
+
+    # Welford: runtime-weighted mean and M2 of the per-sample IOPS
+    def _add_variance(self, vf, quantities):
+        weight = quantities[_RUNTIME]
+        value = quantities[_IOS] / weight
+        batch_weight = np.bincount(vf, weights=weight, minlength=self.vf_count)
+        seen = batch_weight > 0
+        batch_mean = np.divide(np.bincount(vf, weights=weight * value, minlength=self.vf_count), batch_weight,
+                               out=np.zeros(self.vf_count), where=seen)
+        batch_m2 = np.bincount(vf, weights=weight * (value - batch_mean[vf]) ** 2, minlength=self.vf_count)
+        total = self._weight + batch_weight
+        delta = batch_mean - self._mean
+        share = np.divide(batch_weight, total, out=np.zeros(self.vf_count), where=seen)
+        self._mean = np.where(seen, self._mean + delta * share, self._mean)
+        self._m2 = np.where(seen, self._m2 + batch_m2 + delta ** 2 * self._weight * share, self._m2)
+        self._weight = total
+
+    def _add_windows(self, ts, vf, quantities):
+        ids = np.floor(ts / self.bucket).astype(np.int64)
+        head = int(ids.max()) if self._head is None else max(self._head, int(ids.max()))
+        if self._head is None or head - self._head >= self._ring_size:
+            self._ring[:] = 0
+            self._window[:] = 0
+        elif head > self._head:
+            # Buckets that slide out of each window
+            for w, span in enumerate(self._spans):
+                first = max(self._head - span + 1, self._head - self._ring_size + 1)
+                last = min(head - span, self._head)
+                if last >= first:
+                    self._window[w] -= self._ring[np.arange(first, last + 1) % self._ring_size].sum(axis=0)
+            # Reused slots of the ring start empty
+            self._ring[np.arange(self._head + 1, head + 1) % self._ring_size] = 0
+        self._head = head
+
+        keep = np.flatnonzero(ids > head - self._ring_size)
+        if len(keep) == 0:
+            return
+        ids, vf, quantities = ids[keep], vf[keep], quantities[:, keep]
+        cells, slot = np.unique((ids % self._ring_size) * self.vf_count + vf, return_inverse=True)
+        ring = self._ring.reshape(-1, 4)
+        ring[cells] += np.stack([np.bincount(slot.ravel(), weights=row, minlength=len(cells))
+                                 for row in quantities], axis=-1)
+        for w, span in enumerate(self._spans):
+            inside = ids > head - span
+            self._window[w] += self._per_vf(vf[inside], quantities[:, inside])
+
+    def _add_ewma(self, ts, vf, quantities):
+        newest = float(ts.max())
+        if self._ewma_origin is None:
+            self._ewma_origin = newest
+        elif (newest - self._ewma_origin) / min(self.windows) > RESCALE_AT:
+            # Move the origin up before the weights overflow; rates are
+            # ratios of sums, so scaling all of them alike changes nothing
+            for w, window in enumerate(self.windows):
+                self._ewma[w] *= np.exp((self._ewma_origin - newest) / window)
+            self._ewma_origin = newest
+        for w, window in enumerate(self.windows):
+            weight = np.exp((ts - self._ewma_origin) / window)
+            self._ewma[w] += self._per_vf(vf, quantities * weight)
+
+    # Everything the dashboard shows, as plain arrays:
+    #   cumulative  Rates since start
+    #   window      {seconds: Rates} over the last `seconds` of data
+    #   ewma        {seconds: Rates} with that time constant
+    #   iops_mean, iops_std  runtime-weighted mean and spread of per-sample IOPS
+    #   samples     records folded in per VF
+    def summary(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.where(self._weight > 0, np.sqrt(self._m2 / self._weight), np.nan)
+        return {
+            "windows": self.windows,
+            "cumulative": _rates(self._cumulative),
+            "window": {window: _rates(self._window[w]) for w, window in enumerate(self.windows)},
+            "ewma": {window: _rates(self._ewma[w]) for w, window in enumerate(self.windows)},
+            "iops_mean": np.where(self._weight > 0, self._mean, np.nan),
+            "iops_std": std,
+            "samples": self.samples.copy(),
+        }
+
+
+# Rates of one averaging method from a summary: kind is "cumulative",
+# "window" or "ewma", window the seconds of the latter two
+def select_rates(summary, kind, window=None):
+    if kind == "cumulative":
+        return summary["cumulative"]
+    return summary[kind][window]
@@ -0,0 +1,280 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import plotly
+import streamlit as st
+import streamlit.components.v1 as components
+
+from collector import HISTORY_METRICS
+from dashboard_figures import build_trend_figure, from_local_datetime, to_local_datetimes, top_n_split
+from fio_publish import atomic_write
+from rollup import tier_label
+
+# Bump whenever _INDEX_HTML changes so browsers never mix old and new code
+COMPONENT_VERSION = 2
+
+# Points per line until the browser reports the chart width, and the range
+# a reported width is clamped to
+DEFAULT_POINTS = 1000
+MIN_POINTS = 200
+MAX_POINTS = 4000
+
+# Minimal Streamlit component speaking the iframe message protocol directly,
+# so it needs no frontend build. A reset draws the figure with
+# Plotly.react; every later render only carries the points added since the
+# previous one and appends them with Plotly.extendTraces. Through its
+# component value the iframe reports zooming and its width, and asks for a
+# fresh reset if it missed a render (it was re-created, or a message was
+# lost).
+_INDEX_HTML = """<!doctype html>
+<html>
+<head>
+<meta charset="utf-8">
+<script src="plotly.min.js"></script>
+<style>html, body { margin: 0; background: transparent; overflow: hidden; }</style>
+</head>
+<body>
+<div id="chart"></div>
+<script>
+const chart = document.getElementById("chart");
+let seq = null;
+let height = 0;
+let applying = false;
+let listening = false;
+// What the server is told: the seq to resync from, the zoomed time range
+// (null while following the live data) and the chart width in pixels
+const state = {resync: null, range: null, width: null};
+
+function send(type, data) {
+  window.parent.postMessage(Object.assign({isStreamlitMessage: true, type: type}, data), "*");
+}
+
+function tell(changes) {
+  Object.assign(state, changes);
+  send("streamlit:setComponentValue", {value: Object.assign({}, state), dataType: "json"});
+}
+
+function zoomed(event) {
+  if (applying) {
+    return;
+  }
+  if (event["xaxis.autorange"]) {
+    if (state.range !== null) {
+      tell({range: null});
+    }
+  } else if ("xaxis.range[0]" in event) {
+    tell({range: [event["xaxis.range[0]"], event["xaxis.range[1]"]]});
+  } else if (Array.isArray(event["xaxis.range"])) {
+    tell({range: event["xaxis.range"].slice(0, 2)});
+  }
+}
+
+function render(args) {
+  if (args.seq === seq) {
+    return;
+  }
+  let drawn = null;
+  applying = true;
+  if (args.reset) {
+    drawn = Plotly.react(chart, args.figure.data, args.figure.layout, {responsive: true, displaylogo: false});
+    if (!listening) {
+      chart.on("plotly_relayout", zoomed);
+      listening = true;
+    }
+  } else if (args.base_seq === seq) {
+    if (args.x.length) {
+      Plotly.extendTraces(chart, {x: args.lines.map(() => args.x), y: args.y}, args.lines);
+    }
+    if (args.markers.length) {
+      Plotly.restyle(chart, {x: args.markers.map(() => [args.marker_x]), y: args.marker_y.map((v) => [v])},
+                     args.markers);
+    }
+  } else {
+    applying = false;
+    tell({resync: args.seq});
+    return;
+  }
+  Promise.resolve(drawn).then(() => { applying = false; });
+  seq = args.seq;
+  if (args.height !== height) {
+    height = args.height;
+    send("streamlit:setFrameHeight", {height: height});
+  }
+  const width = chart.clientWidth;
+  if (width && width !== args.points && width !== state.width) {
+    tell({width: width});
+  }
+}
+
+window.addEventListener("message", (event) => {
+  if (event.data && event.data.type === "streamlit:render") {
+    render(event.data.args);
+  }
+});
+send("streamlit:componentReady", {apiVersion: 1});
+</script>
+</body>
+</html>
+"""
+
+_component = None
+
+
+# Component files live next to a copy of the plotly.js bundled with the
+# plotly package, so nothing is fetched from the internet
+def _component_dir():
+    directory = os.path.join(tempfile.gettempdir(), f"vf-trend-stream-{COMPONENT_VERSION}-{plotly.__version__}")
+    index = os.path.join(directory, "index.html")
+    if not os.path.exists(index):
+        os.makedirs(directory, exist_ok=True)
+        bundle = os.path.join(os.path.dirname(plotly.__file__), "package_data", "plotly.min.js")
+        shutil.copyfile(bundle, os.path.join(directory, "plotly.min.js.tmp"))
+        os.replace(os.path.join(directory, "plotly.min.js.tmp"), os.path.join(directory, "plotly.min.js"))
+        atomic_write(index, _INDEX_HTML, fsync=False)
+    return directory
+
+
+def _get_component():
+    global _component
+    if _component is None:
+        _component = components.declare_component("trend_stream", path=_component_dir())
+    return _component
+
+
+# Per-session state of one streamed trend chart.
+#
+# Remembers what the browser already has: which traces (the view and the
+# top VFs), the timestamp of the last point sent and a sequence number, so
+# each refresh only ships the samples that arrived since. The top VFs are
+# only re-ranked on a reset, VFs trading places don't redraw the chart. A reset draws the whole run, or
+# the zoomed range, from the collector's history and rollup tiers at about
+# one point per pixel; while following the live data new raw samples are
+# appended until the chart holds twice its point budget and is redrawn.
+class TrendStream:
+    def __init__(self):
+        self.view = None
+        self.top = None
+        self.last_ts = None
+        self.seq = 0
+        self.resync = None
+        self.x_range = None
+        self.points = DEFAULT_POINTS
+        self.sent = 0
+        self.tier = None
+        self.downsampled = False
+
+    # Take in the browser's component value; returns True if it asked for
+    # a reset
+    def handle(self, value):
+        if not isinstance(value, dict):
+            return False
+        resync = value.get("resync")
+        force_reset = resync is not None and resync != self.resync
+        self.resync = resync
+
+        x_range = value.get("range")
+        try:
+            self.x_range = tuple(sorted(from_local_datetime(v) for v in x_range)) if x_range else None
+        except (TypeError, ValueError):
+            self.x_range = None
+
+        width = value.get("width")
+        if isinstance(width, (int, float)) and width > 0:
+            self.points = int(min(MAX_POINTS, max(MIN_POINTS, width)))
+        return force_reset
+
+    # Component arguments for the current snapshot: a full figure when the
+    # view changed, the zoom changed or the browser asked for one, otherwise
+    # just new points. Returns None while there is no history.
+    def update(self, collector, snapshot, display_data, show_avg_data, top_n, force_reset=False):
+        ts = snapshot.history_ts
+        if len(ts) == 0:
+            return None
+
+        view = (snapshot.vf_count, top_n, show_avg_data, self.x_range, self.points)
+        reset = (force_reset or view != self.view or self.last_ts is None or self.last_ts < ts[0]
+                 or self.sent > 2 * self.points)
+        if reset:
+            self.top = top_n_split(display_data, top_n)[0]
+        top = self.top
+        rest = np.setdiff1d(np.arange(snapshot.vf_count), top)
+        groups = [[i] for i in top] + ([list(rest)] if len(rest) else [])
+
+        # Trace layout of build_trend_figure(): a line per top VF, each
+        # followed by its current-value marker unless averages are shown,
+        # and a final Others line
+        lines, markers = [], []
+        for i in range(len(top)):
+            per_vf = 1 if show_avg_data else 2
+            lines.append(i * per_vf)
+            if not show_avg_data:
+                markers.append(i * per_vf + 1)
+        if len(rest):
+            lines.append(len(top) * (1 if show_avg_data else 2))
+
+        base_seq = self.seq
+        args = {
+            "base_seq": base_seq,
+            "reset": reset,
+            "lines": lines,
+            "markers": markers,
+            "marker_x": str(np.datetime_as_string(to_local_datetimes(ts[-1:]))[0]),
+            "marker_y": [float(snapshot.current_iops[i]) for i in top] if markers else [],
+            "points": self.points,
+            "height": 500,
+            "x": [],
+            "y": [],
+        }
+        if reset:
+            start, end = self.x_range or (None, None)
+            window = collector.trend("avg_iops", groups, start, end, self.points)
+            figure = build_trend_figure(snapshot, display_data, show_avg_data, top_n, window, self.x_range)
+            args["figure"] = json.loads(figure.to_json())
+            self.sent = len(window.ts)
+            self.tier = window.tier
+            self.downsampled = window.downsampled
+            self.seq += 1
+        elif self.x_range is None:
+            # Zoomed views stay put, live ones get the new raw samples
+            new = slice(int(np.searchsorted(ts, self.last_ts, side="right")), len(ts))
+            if new.start < new.stop:
+                avg_series = snapshot.history[new, :, HISTORY_METRICS.index("avg_iops")]
+                args["x"] = [str(t) for t in np.datetime_as_string(to_local_datetimes(ts[new]))]
+                args["y"] = [np.nan_to_num(avg_series[:, group].sum(axis=1)).tolist() for group in groups]
+                self.sent += new.stop - new.start
+                self.seq += 1
+
+        args["seq"] = self.seq
+        self.view = view
+        self.last_ts = float(ts[-1])
+        return args
+
+    # Draw the chart; returns False when the component isn't available and
+    # the caller should fall back to a regular plotly chart
+    def render(self, collector, snapshot, display_data, show_avg_data, top_n, key="trend_stream"):
+        try:
+            component = _get_component()
+        except OSError:
+            return False
+
+        force_reset = self.handle(st.session_state.get(key))
+        args = self.update(collector, snapshot, display_data, show_avg_data, top_n, force_reset)
+        if args is not None:
+            component(key=key, default=None, **args)
+        return True
+
+    # What the chart currently shows, for a caption
+    def description(self):
+        source = "raw samples" if not self.tier else f"{tier_label(self.tier)} rollups"
+        if self.downsampled:
+            source += f", min-max downsampled to {self.points:,} points"
+        if self.x_range is None:
+            return f"Whole run from {source}, following live data. Zoom in for finer detail."
+        return f"Zoomed range from {source}. Double-click the chart to return to the live view."
+
+    # The browser dropped its chart (e.g. another view was selected)
+    def forget(self):
+        self.view = None
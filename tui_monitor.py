@@ -0,0 +1,268 @@
+import argparse
+import curses
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from collector import HISTORY_METRICS, Collector
+from fio_ingest import DIRECTIONS
+from rollup import tier_label
+from sample_store import DEFAULT_STORE_PATH
+from stats_engine import STAT_WINDOWS, select_rates
+
+# Seconds between collector polls and screen redraws; the monitor runs on
+# the system under test, so it stays idle in between
+REFRESH_INTERVAL = 2.0
+
+# History samples behind each sparkline, also the collector's snapshot size
+SPARK_POINTS = 120
+
+# Small history ring: the monitor only ever draws the latest samples
+HISTORY_CAPACITY = 10_000
+
+# Store records replayed before the first draw; the rest of the history is
+# caught up in the background
+TAIL_RECORDS = 50_000
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+# Averages the 'a' key cycles through, as in the dashboard's sidebar:
+# (kind, window, label)
+AVERAGES = [("cumulative", None, "since start")]
+AVERAGES += [("window", w, f"last {tier_label(w)}") for w in STAT_WINDOWS]
+AVERAGES += [("ewma", w, f"EWMA {tier_label(w)}") for w in STAT_WINDOWS]
+
+# Row orders the 's' key cycles through
+SORT_KEYS = ("vf", "current", "average", "latency")
+
+COLUMNS = f"{'VF':<7}{'Current':>11}{'Average':>11}{'Share':>8}{'Lat mean':>10}{'p99':>10}  Trend"
+
+
+# Average IOPS per VF, zero where a VF had no I/O
+def average_iops(snapshot, average):
+    kind, window, _ = AVERAGES[average]
+    if kind == "cumulative":
+        return snapshot.avg_iops
+    return np.nan_to_num(select_rates(snapshot.stats, kind, window).iops)
+
+
+# Per-VF latency in µs of the direction with the most I/O: mean of the
+# latest fio result, and p99 of the merged json+ histograms (NaN without)
+def vf_latency(snapshot):
+    mean = np.full(snapshot.vf_count, np.nan)
+    for vf, metrics in enumerate(snapshot.latest_metrics):
+        if metrics is None:
+            continue
+        busiest = max(DIRECTIONS, key=lambda d: metrics[d]["total_ios"])
+        if metrics[busiest]["total_ios"]:
+            mean[vf] = metrics[busiest]["lat_mean_ns"] / 1000
+
+    p99 = np.full(snapshot.vf_count, np.nan)
+    latency = snapshot.latency
+    if 99.0 in latency["percentiles"] and len(latency["samples"]):
+        count = len(latency["samples"])
+        busiest = latency["samples"].argmax(axis=1)
+        values = latency["vf_total"][np.arange(count), busiest, latency["percentiles"].index(99.0)] / 1000
+        p99[:count] = np.where(latency["has_bins"], values, np.nan)
+    return mean, p99
+
+
+# Unicode block sparkline of the latest values, scaled to their own range;
+# gaps without a sample stay blank
+def sparkline(values, width):
+    values = np.asarray(values, dtype=float)[-width:]
+    valid = ~np.isnan(values)
+    if not valid.any():
+        return ""
+    low, high = values[valid].min(), values[valid].max()
+    levels = np.zeros(len(values), dtype=int)
+    if high > low:
+        levels[valid] = np.minimum(((values[valid] - low) / (high - low) * len(SPARK_CHARS)).astype(int),
+                                   len(SPARK_CHARS) - 1)
+    return "".join(SPARK_CHARS[level] if ok else " " for level, ok in zip(levels, valid))
+
+
+def format_number(value, spec=",.0f"):
+    return "-" if np.isnan(value) else format(value, spec)
+
+
+# Row order of the VFs, busiest (or slowest) first
+def row_order(sort_key, current, average, latency):
+    if sort_key == "current":
+        return np.argsort(-current, kind="stable")
+    if sort_key == "average":
+        return np.argsort(-average, kind="stable")
+    if sort_key == "latency":
+        return np.argsort(-np.nan_to_num(latency, nan=-1.0), kind="stable")
+    return np.arange(len(current))
+
+
+# Header, table and footer lines of a snapshot, each line a (text, style)
+# pair with style one of "title", "alert" or None; a note goes under the title
+def screen_lines(snapshot, average, sort_key, spark_width, note=""):
+    current = snapshot.current_iops
+    averaged = average_iops(snapshot, average)
+    total = averaged.sum()
+    share = averaged / total * 100 if total > 0 else np.zeros(snapshot.vf_count)
+    mean_lat, p99 = vf_latency(snapshot)
+    history = snapshot.history[:, :, HISTORY_METRICS.index("iops")]
+    updated = datetime.fromtimestamp(snapshot.updated_at).strftime("%H:%M:%S")
+
+    lines = [(f"🚀 NVMe VF monitor  {snapshot.vf_count} VFs  current {current.sum():,.0f} IOPS  "
+              f"average {total:,.0f} IOPS ({AVERAGES[average][2]})  updated {updated}", "title")]
+    if note:
+        lines.append((note, None))
+    lines += [(f"⚠️ {message}", "alert") for message in snapshot.warnings]
+    lines.append((COLUMNS, "title"))
+    for vf in row_order(sort_key, current, averaged, p99 if not np.isnan(p99).all() else mean_lat):
+        lines.append((f"{snapshot.vf_labels[vf]:<7}{current[vf]:>11,.0f}{averaged[vf]:>11,.0f}"
+                      f"{share[vf]:>7.1f}%{format_number(mean_lat[vf]):>10}{format_number(p99[vf]):>10}  "
+                      f"{sparkline(history[:, vf], spark_width)}", None))
+
+    footer = []
+    fairness = snapshot.fairness
+    if len(fairness["ts"]):
+        latest = dict(zip(fairness["metrics"], fairness["series"][-1]))
+        footer.append((f"⚖️ Jain's index {format_number(latest['jain'], '.3f')}  "
+                       f"off-weight share {format_number(latest['weight_deviation'] * 100, '.1f')}%", None))
+    active = {}
+    for event in snapshot.events:
+        active[(event.vf, event.cleared or event.kind)] = event
+    raised = [event for event in active.values() if event.cleared is None]
+    count = int(snapshot.alerts_active.sum())
+    if count:
+        latest = f", latest: {raised[-1].message}" if raised else ""
+        footer.append((f"🚨 {count} active alert(s){latest}", "alert"))
+    return lines, footer
+
+
+# Plain-text dump for pipes, cron jobs and terminals without curses
+def print_once(collector, average, sort_key, note=""):
+    lines, footer = screen_lines(collector.snapshot(), average, sort_key, 40, note)
+    try:
+        for text, _ in lines + footer:
+            print(text)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # The reader (e.g. head) went away; keep Python's exit flush quiet
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
+
+class Monitor:
+    def __init__(self, collector, average=0, sort_key="vf", interval=REFRESH_INTERVAL):
+        self.collector = collector
+        self.average = average
+        self.sort_key = sort_key
+        self.interval = interval
+        self.scroll = 0
+        self.note = ""
+
+    def run(self, screen):
+        curses.curs_set(0)
+        curses.use_default_colors()
+        curses.init_pair(1, curses.COLOR_CYAN, -1)
+        curses.init_pair(2, curses.COLOR_RED, -1)
+        self.styles = {"title": curses.color_pair(1) | curses.A_BOLD, "alert": curses.color_pair(2), None: 0}
+        screen.timeout(int(self.interval * 1000))
+
+        polled_at = 0.0
+        while True:
+            # Keys wake the loop early; only poll once the interval passed
+            if time.monotonic() - polled_at >= self.interval:
+                self.collector.poll()
+                polled_at = time.monotonic()
+            self.draw(screen)
+            if not self.handle_key(screen.getch()):
+                return
+
+    def handle_key(self, key):
+        if key in (ord("q"), ord("Q"), 27):
+            return False
+        if key == ord("a"):
+            self.average = (self.average + 1) % len(AVERAGES)
+        elif key == ord("s"):
+            self.sort_key = SORT_KEYS[(SORT_KEYS.index(self.sort_key) + 1) % len(SORT_KEYS)]
+        elif key in (curses.KEY_DOWN, ord("j")):
+            self.scroll += 1
+        elif key in (curses.KEY_UP, ord("k")):
+            self.scroll -= 1
+        elif key == curses.KEY_NPAGE:
+            self.scroll += 20
+        elif key == curses.KEY_PPAGE:
+            self.scroll -= 20
+        elif key == curses.KEY_HOME:
+            self.scroll = 0
+        return True
+
+    def draw(self, screen):
+        height, width = screen.getmaxyx()
+        spark_width = max(0, width - len(COLUMNS) + len("Trend") - 1)
+        lines, footer = screen_lines(self.collector.snapshot(), self.average, self.sort_key, spark_width,
+                                     self.note)
+        header_rows = [i for i, (text, _) in enumerate(lines) if text == COLUMNS][0] + 1
+        footer.append((f"q quit  a average ({AVERAGES[self.average][2]})  s sort ({self.sort_key})  "
+                       f"↑↓ PgUp PgDn scroll", "title"))
+
+        # Scroll the VF rows only, header and footer stay put
+        rows = max(0, height - header_rows - len(footer))
+        self.scroll = max(0, min(self.scroll, len(lines) - header_rows - rows))
+        visible = lines[:header_rows] + lines[header_rows + self.scroll:header_rows + self.scroll + rows]
+
+        screen.erase()
+        for y, (text, style) in enumerate(visible[:height]):
+            self._put(screen, y, text, width, style)
+        for y, (text, style) in enumerate(footer[-height:], start=max(0, height - len(footer))):
+            self._put(screen, y, text, width, style)
+        screen.refresh()
+
+    def _put(self, screen, y, text, width, style):
+        try:
+            screen.addnstr(y, 0, text, width - 1, self.styles[style])
+        except curses.error:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Terminal monitor of the VF fio results, for use over SSH")
+    parser.add_argument("--dir", default=".", help="directory of vfN.json and the sample store")
+    parser.add_argument("--interval", type=float, default=REFRESH_INTERVAL, help="seconds between refreshes")
+    parser.add_argument("--sort", choices=SORT_KEYS, default="vf")
+    parser.add_argument("--once", action="store_true", help="print one plain-text table and exit")
+    args = parser.parse_args()
+
+    # The dashboard's collector owns alerting, this one only shows events
+    def new_collector():
+        return Collector(store_path=os.path.join(args.dir, DEFAULT_STORE_PATH), result_dir=args.dir,
+                         history_capacity=HISTORY_CAPACITY, snapshot_points=SPARK_POINTS, event_sinks=[])
+
+    # First draw from the tail of the store only
+    tail = new_collector()
+    tail.start_at_tail(TAIL_RECORDS)
+    tail.poll()
+    if args.once or not sys.stdout.isatty():
+        print_once(tail, 0, args.sort, f"ℹ️ Averages over the latest {TAIL_RECORDS:,} samples")
+        return
+
+    monitor = Monitor(tail, sort_key=args.sort, interval=args.interval)
+    monitor.note = f"⏳ Catching up on history, averages over the latest {TAIL_RECORDS:,} samples"
+
+    # Replay the whole store in the background, then take over
+    def catch_up():
+        full = new_collector()
+        full.poll()
+        monitor.collector = full
+        monitor.note = ""
+
+    threading.Thread(target=catch_up, name="tui-catch-up", daemon=True).start()
+    try:
+        curses.wrapper(monitor.run)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import glob
+import os
+import re
+
+# Result files written by the runners, one per VF
+RESULT_PATTERN = "vf*.json"
+
+# Devices the runners fall back to when nothing can be discovered
+DEFAULT_DEVICES = [
+    "/tmp/nvme0n1",
+    "/tmp/nvme0n2",
+    "/tmp/nvme0n3",
+    "/tmp/nvme0n4"
+]
+
+_NAMESPACE_RE = re.compile(r"^(nvme\d+)n\d+$")
+_RESULT_RE = re.compile(r"^vf(\d+)\.json$")
+
+
+# Sort key that orders nvme2n10 after nvme2n9
+def natural_key(name):
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name)]
+
+
+# VF result files in a directory as a dense list indexed by VF number.
+# vf0.json ... vfN.json map to slots 0..N; gaps stay in the list (as the
+# path the runner would write) so VF numbering never shifts.
+def discover_result_files(directory=".", pattern=RESULT_PATTERN):
+    indexes = {}
+    for path in glob.glob(os.path.join(directory, pattern)):
+        match = _RESULT_RE.match(os.path.basename(path))
+        if match:
+            indexes[int(match.group(1))] = path
+    if not indexes:
+        return []
+    return [indexes.get(i, os.path.join(directory, f"vf{i}.json")) for i in range(max(indexes) + 1)]
+
+
+# NVMe namespaces from sysfs, e.g. /dev/nvme3n1 for every /sys/block/nvme3n1.
+# With vf_only, only namespaces whose controller is an SR-IOV virtual
+# function (its PCI device has a physfn link) are returned. sysfs_root can
+# point at a fake tree for testing.
+def discover_namespaces(sysfs_root="/sys", vf_only=False, dev_root="/dev"):
+    block = os.path.join(sysfs_root, "block")
+    if not os.path.isdir(block):
+        return []
+
+    devices = []
+    for entry in sorted(os.listdir(block), key=natural_key):
+        match = _NAMESPACE_RE.match(entry)
+        if not match:
+            continue
+        if vf_only:
+            physfn = os.path.join(sysfs_root, "class", "nvme", match.group(1), "device", "physfn")
+            if not os.path.exists(physfn):
+                continue
+        devices.append(os.path.join(dev_root, entry))
+    return devices
+
+
+# Devices for the runners: an explicit glob (VF_DEVICE_GLOB), else the
+# namespaces found under VF_SYSFS_ROOT (e.g. /sys, VF_ONLY=1 to skip
+# physical functions), else the historical /tmp/nvme0nX test files. sysfs is
+# only scanned when asked for, so a runner never picks up real disks by
+# accident.
+def discover_devices(environ=os.environ):
+    pattern = environ.get("VF_DEVICE_GLOB")
+    if pattern:
+        return sorted(glob.glob(pattern), key=natural_key)
+    sysfs_root = environ.get("VF_SYSFS_ROOT")
+    if sysfs_root:
+        devices = discover_namespaces(sysfs_root, vf_only=environ.get("VF_ONLY") == "1")
+        if devices:
+            return devices
+    return list(DEFAULT_DEVICES)